@@ -1,10 +1,17 @@
+import startup # First, the startup is measured from its import
 from Qt import QtWidgets, QtCore
-import sys, utils, mainWIndow, graph
+import sys, utils, mainWIndow
 
 if __name__ == "__main__":
     #QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling)
+    # python __init__.py --measure-startup [project.browser]
+    startup.measuring = "--measure-startup" in sys.argv
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("-")]
+    startup.mark("imports")
     app = QtWidgets.QApplication(sys.argv)
     app.setStyleSheet(utils.css)
-    window = mainWIndow.MainWindow()
+    window = mainWIndow.MainWindow(project=arguments[0] if arguments else None)
+    if startup.measuring:
+        window.startupFinished.connect(app.quit)
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    sys.exit(app.exec_())
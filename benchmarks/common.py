@@ -0,0 +1,153 @@
+"""
+Helpers shared by the benchmark scripts.
+
+The benchmarks run under the offscreen Qt platform, so they can be launched
+on a machine without display:
+
+    python benchmarks/paintLod.py
+"""
+import os
+import sys
+import time
+import collections
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from Qt import QtWidgets
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+def application():
+    """
+    Return the running QApplication, create it if needed.
+    """
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication(sys.argv[:1])
+    return app
+
+
+def createView(width=1280, height=720):
+    import graph
+    view = graph.View()
+    view.resize(width, height)
+    return view
+
+
+def buildTree(view, count, fanout=20, visible=True):
+    """
+    Fill the view with a synthetic tree of count nodes, without touching the disk.
+
+    The nodes are created breadth first, so each node is connected to its
+    parent before having children of its own.
+
+    :param view: The graph.View to fill
+    :param count: Total number of BranchNode to create
+    :param fanout: Number of children of each node
+    :param visible: Expand every node
+    """
+    import nodalItems
+    root = view.addRoot(ROOT)
+    root.setPos(0, 0)
+    root._seekChildren = False
+    root._childrenVisibles = visible
+
+    rows = {}
+    queue = collections.deque([(root, 1)])
+    created = 0
+    while queue and created < count:
+        parent, depth = queue.popleft()
+        for i in range(fanout):
+            if created >= count:
+                break
+            row = rows.get(depth, 0)
+            rows[depth] = row + 1
+            node = view.createNode(nodalItems.BranchNode, args=[os.path.join(parent._path, "folder_%d" % created), "#5976b9"])
+            node.setPos(250*depth, 25*row)
+            node._seekChildren = False
+            node._childrenVisibles = visible
+            view.connectNodes(parent, node)
+            queue.append((node, depth + 1))
+            created += 1
+    return root
+
+
+def createTree(root, depth, width, files=3):
+    """
+    Create a tree of real folders on the disk: width folders per folder down
+    to depth, each with a few small files.
+
+    :return: The number of created folders
+    """
+    level = [root]
+    count = 0
+    for i in range(depth):
+        nextLevel = []
+        for folder in level:
+            for j in range(width):
+                path = os.path.join(folder, "folder_%d" % j)
+                os.mkdir(path)
+                for k in range(files):
+                    with open(os.path.join(path, "file_%d.txt" % k), "w") as f:
+                        f.write("x"*(k + 1)*100)
+                nextLevel.append(path)
+                count += 1
+        level = nextLevel
+    return count
+
+
+def timeit(func, repeat=5):
+    """
+    Call func repeat times and return the list of durations in seconds.
+    """
+    durations = []
+    for i in range(repeat):
+        start = clock()
+        func()
+        durations.append(clock() - start)
+    return durations
+
+
+def percentile(durations, percent):
+    """
+    Return the nearest-rank percentile of a list of durations.
+    """
+    durations = sorted(durations)
+    rank = int(round(percent/100.0*len(durations) + 0.5)) - 1
+    return durations[max(0, min(rank, len(durations) - 1))]
+
+
+def peakMemory():
+    """
+    Return the peak resident memory of the process in KB, None if it can't be read.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes on macOS, KB on Linux
+        return peak//1024 if sys.platform == "darwin" else peak
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)//1024
+    return None
+
+
+def report(name, durations):
+    durations = sorted(durations)
+    median = durations[len(durations)//2]
+    print("{0:<40} median {1:9.2f} ms   min {2:9.2f} ms".format(name, median*1000, durations[0]*1000))
@@ -0,0 +1,39 @@
+"""
+Compare the NumPy and the plain Python backends of the geometry module,
+for several numbers of connections.
+
+    python benchmarks/connectionGeometry.py [connectionCount ...]
+"""
+import random
+import sys
+import common
+import geometry
+
+SIZES = [16, 64, 1000, 10000, 100000]
+
+
+def randomConnections(count):
+    origins = [(random.uniform(-5000, 5000), random.uniform(-5000, 5000)) for i in range(count)]
+    targets = [(x + random.uniform(50, 300), y + random.uniform(-500, 500)) for x, y in origins]
+    # One connection out of ten leaves a RootNode
+    radii = [25 if i % 10 == 0 else 0 for i in range(count)]
+    return origins, targets, radii
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    if geometry.numpy is None:
+        print("NumPy is not installed, only the fallback is measured")
+    for count in sizes:
+        origins, targets, radii = randomConnections(count)
+        repeat = max(3, min(200, 100000 // count))
+        backends = [("python", False)]
+        if geometry.numpy is not None:
+            backends.append(("numpy", True))
+        for name, useNumpy in backends:
+            durations = common.timeit(lambda: geometry.connections(origins, targets, radii, useNumpy), repeat)
+            common.report("%6d connections  %s" % (count, name), durations)
+
+
+if __name__ == "__main__":
+    main()
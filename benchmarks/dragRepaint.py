@@ -0,0 +1,52 @@
+"""
+Measure the cost of one frame while dragging a single node, with the
+viewport update mode used by graph.View and with a full viewport update.
+
+    python benchmarks/dragRepaint.py [nodeCount ...]
+"""
+import sys
+import common
+from Qt import QtWidgets, QtCore
+
+SIZES = [1000, 10000]
+FRAMES = 60
+
+
+def dragFrames(app, view, node, frames=FRAMES):
+    """
+    Move the node by a few pixels and let the view repaint, once per frame.
+    """
+    durations = []
+    for i in range(frames):
+        start = common.clock()
+        node.moveBy(3 if i % 2 else -3, 2)
+        app.processEvents()
+        durations.append(common.clock() - start)
+    return durations
+
+
+def main():
+    app = common.application()
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    view = common.createView()
+    view.show()
+    for count in sizes:
+        view.clear()
+        root = common.buildTree(view, count)
+        # A leaf, so only one node and one connection move
+        node = root
+        while node.getChildrens():
+            node = node.getChildrens()[0]
+        view.fitInView(QtCore.QRectF(node.pos(), QtCore.QSizeF(600, 340)), QtCore.Qt.KeepAspectRatio)
+        app.processEvents()
+
+        defaultMode = view.viewportUpdateMode()
+        modes = [("graph.View mode", defaultMode), ("full viewport", QtWidgets.QGraphicsView.FullViewportUpdate)]
+        for name, mode in modes:
+            view.setViewportUpdateMode(mode)
+            dragFrames(app, view, node, 5)
+            common.report("%6d nodes  %s" % (count, name), dragFrames(app, view, node))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Measure the cost of one drag step of a node with a big subtree, for
+several tree sizes: the root of the tree, then its first child. The
+drag is wrapped in View.beginDrag()/endDrag() like a mouse drag, the cost
+of endDrag() is reported on its own.
+
+    python benchmarks/dragSubtree.py [nodeCount ...]
+"""
+import sys
+import common
+
+SIZES = [1000, 10000, 50000]
+STEPS = 20
+
+
+def dragSteps(app, view, node, steps=STEPS):
+    """
+    Move the node by a few pixels and let the view process the events, once per step.
+    Return the durations of the steps and the duration of the end of the drag.
+    """
+    durations = []
+    view.beginDrag(node)
+    for i in range(steps):
+        start = common.clock()
+        node.moveBy(3 if i % 2 else -3, 2)
+        app.processEvents()
+        durations.append(common.clock() - start)
+    start = common.clock()
+    view.endDrag()
+    app.processEvents()
+    return durations, common.clock() - start
+
+
+def main():
+    app = common.application()
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    view = common.createView()
+    view.show()
+    for count in sizes:
+        view.clear()
+        root = common.buildTree(view, count)
+        app.processEvents()
+
+        node = root.getChildrens()[0]
+        for name, dragged in [("root", root), ("first child (%d below)" % len(node.getChildrens(True)), node)]:
+            durations, end = dragSteps(app, view, dragged)
+            common.report("%6d nodes  %s" % (count, name), durations)
+            print("{0:<40} end of drag {1:9.2f} ms".format("", end*1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Measure the time needed to create the children of an expanded folder,
+for several folder sizes. The folders are not read from the disk, the
+paths are given directly to BaseNode._addFolders.
+
+    python benchmarks/expand.py [entryCount ...]
+"""
+import os
+import sys
+import common
+
+SIZES = [1000, 2000, 5000]
+
+
+def main():
+    common.application()
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    view = common.createView()
+    for count in sizes:
+        paths = [os.path.join(common.ROOT, "folder_%d" % i) for i in range(count)]
+
+        def expand():
+            view.clear()
+            root = view.addRoot(common.ROOT)
+            root._childrenVisibles = True
+            # Sent by batches, like the scanner does
+            for start in range(0, count, 64):
+                root._addFolders(paths[start:start+64])
+
+        durations = common.timeit(expand, 3)
+        common.report("%6d entries" % count, durations)
+        print("{0:<40} {1:9.1f} us per entry".format("", min(durations)*1e6/count))
+
+
+if __name__ == "__main__":
+    main()
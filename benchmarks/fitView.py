@@ -0,0 +1,43 @@
+"""
+Measure the cost of the bounding boxes used by the A (fit all) and F (fit
+selection) shortcuts, against QGraphicsScene.itemsBoundingRect(), for
+several tree sizes. The first call after a move computes the bounds of the
+moved subtree again, the next ones are read from the cache.
+
+    python benchmarks/fitView.py [nodeCount ...]
+"""
+import sys
+import common
+
+SIZES = [10000, 50000, 100000]
+
+
+def main():
+    app = common.application()
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    view = common.createView()
+    for count in sizes:
+        view.clear()
+        root = common.buildTree(view, count)
+        app.processEvents()
+        leaf = root
+        while leaf.getChildrens():
+            leaf = leaf.getChildrens()[-1]
+
+        common.report("%6d nodes  itemsBoundingRect" % count, common.timeit(view.scene().itemsBoundingRect, 3))
+        common.report("%6d nodes  fit all, first call" % count, common.timeit(view._getSceneBoundingbox, 1))
+        common.report("%6d nodes  fit all, cached" % count, common.timeit(view._getSceneBoundingbox, 20))
+
+        def moveAndFit():
+            leaf.moveBy(5, 5)
+            view._getSceneBoundingbox()
+        common.report("%6d nodes  fit all after a move" % count, common.timeit(moveAndFit, 20))
+
+        root.getChildrens()[0].setSelected(True)
+        leaf.setSelected(True)
+        common.report("%6d nodes  fit selection" % count, common.timeit(view._getSelectionBoundingbox, 20))
+        view.scene().clearSelection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Measure the time needed to paint the scene at several zoom levels,
+with and without the level of detail.
+
+    python benchmarks/paintLod.py [nodeCount ...]
+"""
+import sys
+import common
+from Qt import QtGui, QtCore
+import utils
+
+SIZES = [1000, 10000, 50000]
+ZOOMS = [1.0, 0.5, 0.2, 0.05]
+
+
+def paintScene(view, zoom, width=1280, height=720):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32_Premultiplied)
+    itemsArea = view.scene().itemsBoundingRect()
+    source = QtCore.QRectF(itemsArea.x(), itemsArea.y(), width/zoom, height/zoom)
+
+    def paint():
+        painter = QtGui.QPainter(image)
+        view.scene().render(painter, QtCore.QRectF(image.rect()), source)
+        painter.end()
+    return paint
+
+
+def main():
+    common.application()
+    nodeThreshold = utils.settings.lodNodeThreshold
+    connectionThreshold = utils.settings.lodConnectionThreshold
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    view = common.createView()
+    for count in sizes:
+        view.clear()
+        common.buildTree(view, count)
+        for zoom in ZOOMS:
+            paint = paintScene(view, zoom)
+
+            utils.settings.lodNodeThreshold = nodeThreshold
+            utils.settings.lodConnectionThreshold = connectionThreshold
+            common.report("%6d nodes  zoom %.2f  lod" % (count, zoom), common.timeit(paint, 3))
+
+            utils.settings.lodNodeThreshold = 0
+            utils.settings.lodConnectionThreshold = 0
+            common.report("%6d nodes  zoom %.2f  full" % (count, zoom), common.timeit(paint, 3))
+
+        utils.settings.lodNodeThreshold = nodeThreshold
+        utils.settings.lodConnectionThreshold = connectionThreshold
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Measure the pre-indexing of a synthetic tree of folders, read by 1, 4 and
+one process per CPU, then the expansion of every folder from the filled
+listing cache against listing them from the disk.
+
+    python benchmarks/preindexTree.py [depth] [fanout]
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import common
+
+import dirCache
+import preindex
+import scanner
+
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    fanout = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    root = tempfile.mkdtemp()
+    try:
+        count = common.createTree(root, depth, fanout)
+        print("%d folders, %d CPU" % (count, multiprocessing.cpu_count()))
+
+        for processes in sorted(set([1, 4, multiprocessing.cpu_count()])):
+            pool = preindex.createPool(processes)
+            try:
+                common.report("%2d processes  crawl" % processes, common.timeit(lambda: preindex.crawl(root, pool, depth, count + 1), 3))
+            finally:
+                pool.terminate()
+                pool.join()
+        common.report(" 0 processes  crawl in thread", common.timeit(lambda: preindex.crawl(root, None, depth, count + 1), 3))
+
+        entries = preindex.crawl(root, None, depth, count + 1)
+        fileName = os.path.join(root, "index.jsonl.gz")
+        common.report("write the index file", common.timeit(lambda: preindex.write(root, entries, fileName), 3))
+        common.report("read the index file", common.timeit(lambda: preindex.read(root, fileName), 3))
+        print("index file: %d bytes" % os.path.getsize(fileName))
+
+        paths = [entry[0] for entry in entries]
+        common.report("list every folder from the disk", common.timeit(lambda: [list(scanner.listDirectories(path)) for path in paths], 3))
+        cache = dirCache.DirectoryCache(os.path.join(root, "listingCache.json"), maxEntries=count + 1)
+        preindex.feed(entries, cache)
+        common.report("list every folder from the cache", common.timeit(lambda: [cache.listDirectories(path) for path in paths], 3))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
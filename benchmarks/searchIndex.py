@@ -0,0 +1,38 @@
+"""
+Measure the filter engine on a synthetic index of folder names: the time
+to store and index the names, then the time to the first batch of results
+and to all the results of each kind of query.
+
+    python benchmarks/searchIndex.py [pathCount]
+"""
+import random
+import sys
+import common
+
+import search
+
+WORDS = ["render", "cache", "texture", "shot", "asset", "comp", "final", "anim", "light",
+         "model", "rig", "fx", "out", "tmp", "data", "src", "lib", "build", "docs"]
+QUERIES = ["texture_v12", "ren", "fi", "*_v0?7_*", "[!r]ig_123*", "~rndtx9", "~zzq"]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    random.seed(1)
+    paths = []
+    for i in range(count):
+        words = [random.choice(WORDS) for j in range(random.randint(1, 3))]
+        paths.append("/project/seq%02d/%s_v%03d_%d" % (i % 50, "_".join(words), random.randint(0, 999), i))
+
+    index = search.PathIndex()
+    common.report("%d paths  add" % count, common.timeit(lambda: index.add(paths), 1))
+    common.report("%d paths  index" % count, common.timeit(index.update, 1))
+
+    for text in QUERIES:
+        mode, pattern = search.parseQuery(text)
+        common.report("%-12s first results" % text, common.timeit(lambda: next(index.search(mode, pattern), []), 5))
+        common.report("%-12s all results" % text, common.timeit(lambda: list(index.search(mode, pattern)), 3))
+
+
+if __name__ == "__main__":
+    main()
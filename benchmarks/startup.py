@@ -0,0 +1,53 @@
+"""
+Measure the startup of the application on a synthetic project: the time to
+the first frame, to the visible part of the project shown with the event
+loop free (interactive), and to the whole project loaded, as printed by
+__init__.py --measure-startup.
+
+    python benchmarks/startup.py [nodeCount] [repeat]
+"""
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import common
+
+import dirCache
+import persistence
+
+
+def createProject(fileName, count):
+    common.application()
+    view = common.createView()
+    common.buildTree(view, count)
+    view.currentProject = fileName
+    view.save()
+    persistence.writer.flush()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    folder = tempfile.mkdtemp()
+    dirCache.listingCache.path = os.path.join(folder, "listingCache.json")
+    try:
+        fileName = os.path.join(folder, "startup.browser")
+        createProject(fileName, count)
+
+        steps = {}
+        for i in range(repeat):
+            output = subprocess.check_output([sys.executable, os.path.join(common.ROOT, "__init__.py"), "--measure-startup", fileName],
+                                             universal_newlines=True)
+            for step, duration in re.findall(r"STARTUP: (.+?)\s+([\d.]+) ms", output):
+                steps.setdefault(step, []).append(float(duration)/1000)
+        for step in ["imports", "first frame", "interactive", "loaded"]:
+            if step in steps:
+                common.report("%d nodes  %s" % (count, step), steps[step])
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Run the benchmarks of the graph engine on a synthetic tree of folders and
+report them as JSON: the latency percentiles of each case, its throughput
+and the peak memory of the process once it's done.
+
+The results can be compared with a baseline file saved on the same
+machine, the run fails when a case is slower than its baseline by more
+than the tolerance:
+
+    python benchmarks/suite.py --update-baseline
+    python benchmarks/suite.py --baseline benchmarks/baseline.json
+
+    python benchmarks/suite.py [--width 8] [--depth 3] [--repeat 20] [--cases expand,drag]
+                               [--output results.json] [--baseline file] [--tolerance 0.25]
+"""
+from collections import OrderedDict
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import common
+
+from Qt import QtCore, QtGui
+import Qt
+import dirCache
+import persistence
+import utils
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+NOISE = 0.0005 # Differences under 0.5 ms are never regressions
+
+# Name -> function(suite) returning (durations in seconds, number of items processed, unit)
+cases = OrderedDict()
+
+
+def case(name):
+    def register(func):
+        cases[name] = func
+        return func
+    return register
+
+
+class Suite(object):
+    """
+    The view shared by the cases, and the synthetic tree it shows.
+    """
+    def __init__(self, folder, width, depth, repeat):
+        self.app = common.application()
+        self.folder = folder
+        self.repeat = repeat
+        self.tree = os.path.join(folder, "tree")
+        os.mkdir(self.tree)
+        self.folders = common.createTree(self.tree, depth, width)
+        self.view = common.createView()
+        self.view.show()
+        self.root = None
+
+    def wait(self, condition):
+        while condition():
+            self.app.processEvents()
+
+    def nodes(self):
+        return len(self.view.model.descendants(self.root._id, True))
+
+    def expand(self, node):
+        """Expand a node and list its sub folders, return the time until they are all shown.
+        """
+        view = self.view
+        start = common.clock()
+        node._childrenVisibles = True
+        node.materializeChildren()
+        if node._seekChildren:
+            node._fillData()
+        node.updateChildrenVisibility()
+        self.wait(lambda: node._loading or view.layouter.pendingJobs())
+        return common.clock() - start
+
+    def expandAll(self):
+        """Show the whole tree, breadth first, return the duration of each expansion.
+        """
+        view = self.view
+        view.clear()
+        dirCache.listingCache.clear()
+        self.root = view.addRoot(self.tree)
+        durations = []
+        level = [self.root]
+        while level:
+            nextLevel = []
+            for node in level:
+                durations.append(self.expand(node))
+                nextLevel.extend(node.getChildrens())
+            level = nextLevel
+        return durations
+
+
+@case("expand")
+def expand(suite):
+    durations = suite.expandAll()
+    return durations, suite.nodes(), "nodes/s"
+
+
+@case("saveLoad")
+def saveLoad(suite):
+    view = suite.view
+    fileName = os.path.join(suite.folder, "project.browser")
+    durations = []
+    for i in range(max(1, suite.repeat//4)):
+        count = suite.nodes()
+        start = common.clock()
+        view.currentProject = fileName
+        view.save()
+        view.load(fileName)
+        view.finishLoading()
+        suite.app.processEvents()
+        durations.append(common.clock() - start)
+        suite.root = view._rootsList[0]
+    return durations, count*len(durations), "nodes/s"
+
+
+@case("drag")
+def drag(suite):
+    view = suite.view
+    node = suite.root
+    durations = []
+    view.beginDrag(node)
+    for i in range(suite.repeat):
+        start = common.clock()
+        node.moveBy(3 if i % 2 else -3, 2)
+        suite.app.processEvents()
+        durations.append(common.clock() - start)
+    view.endDrag()
+    suite.app.processEvents()
+    return durations, suite.nodes()*len(durations), "nodes/s"
+
+
+def _renderer(suite, background):
+    view = suite.view
+    image = QtGui.QImage(view.viewport().size(), QtGui.QImage.Format_ARGB32_Premultiplied)
+    rect = view.mapToScene(view.viewport().rect()).boundingRect()
+
+    def render():
+        painter = QtGui.QPainter(image)
+        if background:
+            view.scene().drawBackground(painter, rect)
+        else:
+            view.scene().render(painter, QtCore.QRectF(image.rect()), rect)
+        painter.end()
+    return render
+
+
+@case("drawBackground")
+def drawBackground(suite):
+    suite.view.fitRect(suite.view._getSceneBoundingbox())
+    durations = common.timeit(_renderer(suite, True), suite.repeat)
+    return durations, len(durations), "frames/s"
+
+
+@case("paint")
+def paint(suite):
+    suite.view.fitRect(suite.view._getSceneBoundingbox())
+    durations = common.timeit(_renderer(suite, False), suite.repeat)
+    return durations, len(durations), "frames/s"
+
+
+@case("fitView")
+def fitView(suite):
+    view = suite.view
+    leaf = suite.root
+    while leaf.getChildrens():
+        leaf = leaf.getChildrens()[-1]
+
+    def moveAndFit():
+        # The move drops the cached bounds of the ancestors of the leaf
+        leaf.moveBy(5, 5)
+        view.fitRect(view._getSceneBoundingbox())
+    durations = common.timeit(moveAndFit, suite.repeat)
+    return durations, len(durations), "fits/s"
+
+
+def summarize(durations, items, unit):
+    total = sum(durations)
+    return OrderedDict([
+        ("samples", len(durations)),
+        ("p50_ms", common.percentile(durations, 50)*1000),
+        ("p90_ms", common.percentile(durations, 90)*1000),
+        ("p99_ms", common.percentile(durations, 99)*1000),
+        ("min_ms", min(durations)*1000),
+        ("max_ms", max(durations)*1000),
+        ("mean_ms", total/len(durations)*1000),
+        ("throughput", items/total if total else None),
+        ("unit", unit),
+        ("peak_memory_kb", common.peakMemory()),
+    ])
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the cases next to their baseline, return the names of the regressed ones.
+    """
+    regressions = []
+    print("{0:<16} {1:>12} {2:>12} {3:>8}".format("case", "baseline p50", "p50", "ratio"))
+    for name, result in results["cases"].items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference is None:
+            print("{0:<16} {1:>12} {2:>12.2f}".format(name, "-", result["p50_ms"]))
+            continue
+        ratio = result["p50_ms"]/reference["p50_ms"] if reference["p50_ms"] else 1.0
+        regressed = ratio > 1 + tolerance and (result["p50_ms"] - reference["p50_ms"])/1000.0 > NOISE
+        print("{0:<16} {1:>12.2f} {2:>12.2f} {3:>7.2f}x{4}".format(name, reference["p50_ms"], result["p50_ms"], ratio, "  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    if results["params"] != baseline.get("params"):
+        print("WARNING: The baseline was measured with other parameters: {0}".format(baseline.get("params")))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the graph engine")
+    parser.add_argument("--width", type=int, default=8, help="Number of sub folders per folder")
+    parser.add_argument("--depth", type=int, default=3, help="Depth of the tree of folders")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of samples of the repeated cases")
+    parser.add_argument("--cases", default=",".join(cases), help="Comma separated cases to run, among " + ", ".join(cases))
+    parser.add_argument("--output", help="Write the results to this JSON file instead of the standard output")
+    parser.add_argument("--baseline", help="Compare the results with this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Slowdown of the median accepted before a regression")
+    parser.add_argument("--update-baseline", nargs="?", const=DEFAULT_BASELINE, help="Save the results as the baseline")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    # Nothing is written in the settings and the caches of the user
+    utils.settings.path = os.path.join(folder, "settings.json")
+    dirCache.listingCache.path = os.path.join(folder, "listingCache.json")
+    recentProjects = list(utils.settings.recentProjects)
+    try:
+        suite = Suite(folder, args.width, args.depth, args.repeat)
+        results = OrderedDict([
+            ("version", 1),
+            ("python", platform.python_version()),
+            ("qt", Qt.__binding__ + " " + Qt.__qt_version__),
+            ("platform", platform.platform()),
+            ("params", OrderedDict([("width", args.width), ("depth", args.depth), ("repeat", args.repeat)])),
+            ("cases", OrderedDict()),
+        ])
+        # Expand first, the other cases run on the expanded tree
+        names = [name for name in cases if name in args.cases.split(",")]
+        if "expand" not in names:
+            suite.expandAll()
+        for name in names:
+            durations, items, unit = cases[name](suite)
+            results["cases"][name] = summarize(durations, items, unit)
+            print("{0:<16} p50 {1:9.2f} ms   p99 {2:9.2f} ms".format(name, results["cases"][name]["p50_ms"], results["cases"][name]["p99_ms"]), file=sys.stderr)
+    finally:
+        utils.settings.recentProjects = recentProjects
+        persistence.writer.flush()
+        shutil.rmtree(folder, ignore_errors=True)
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.update_baseline:
+        with open(args.update_baseline, "w") as f:
+            f.write(text)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+import os
+import json
+import threading
+import utils, scanner
+
+
+class DirectoryCache(object):
+    """
+    Keep the list of the sub folders of the already listed folders.
+
+    An entry is valid as long as the mtime and the inode of the folder did not
+    change, so an unchanged folder is never listed twice, even between two
+    sessions. The least recently used entries are evicted once the cache is
+    bigger than maxEntries.
+    """
+    def __init__(self, path=None, maxEntries=50000):
+        if path is None:
+            path = os.path.join(os.path.dirname(utils.settings.path), "listingCache.json")
+        self.path = path
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # path -> [mtime, inode, [folder names]]
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False # True when the entries changed since the file was read or written
+
+    def signature(self, path):
+        """
+        Return the (mtime, inode) used to check if a folder changed.
+        """
+        stat = os.stat(path)
+        return stat.st_mtime, stat.st_ino
+
+    def get(self, path):
+        """
+        Return the full paths of the sub folders of path if the cached entry
+        is still valid, None otherwise.
+        """
+        self.load()
+        try:
+            mtime, inode = self.signature(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is None or entry[0] != mtime or entry[1] != inode:
+                self.misses += 1
+                if entry is not None:
+                    self._dirty = True
+                return None
+            # Put it back at the end, it's now the most recently used
+            self._entries[path] = entry
+            self.hits += 1
+        return [os.path.join(path, name) for name in entry[2]]
+
+    def set(self, path, folders, signature=None):
+        """
+        Store the sub folders of path.
+
+        :param path: The listed folder
+        :param folders: Full paths of the sub folders
+        :param signature: (mtime, inode) of the folder taken before the listing
+        """
+        if signature is None:
+            try:
+                signature = self.signature(path)
+            except OSError:
+                return
+        names = [os.path.basename(folder) for folder in folders]
+        with self._lock:
+            self._entries.pop(path, None)
+            self._entries[path] = [signature[0], signature[1], names]
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._dirty = True
+
+    def invalidate(self, path):
+        with self._lock:
+            if self._entries.pop(path, None) is not None:
+                self._dirty = True
+
+    def listDirectories(self, path, isCancelled=None):
+        """
+        Return the full paths of the sub folders of path, from the cache when
+        possible or by listing the folder.
+        """
+        folders = self.get(path)
+        if folders is not None:
+            return folders
+
+        signature = self.signature(path)
+        folders = []
+        for folder in scanner.listDirectories(path, isCancelled):
+            folders.append(folder)
+        if isCancelled is None or not isCancelled():
+            self.set(path, folders, signature)
+        return folders
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "hitRate": float(self.hits)/total if total else 0.0,
+        }
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    def load(self):
+        """
+        Read the cache file. Only done once, the first time the cache is used.
+        """
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not os.path.exists(self.path):
+                return
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except (IOError, OSError, ValueError):
+                print("WARNING: Unable to read the listing cache, it will be rebuilt")
+                return
+            if data.get("version") != 1:
+                return
+            for path, entry in data["entries"]:
+                self._entries[path] = entry
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+
+    def isDirty(self):
+        """
+        Return True if the entries changed since the last save, save() does nothing otherwise.
+        """
+        return self._dirty
+
+    def save(self):
+        """
+        Write the cache file if something changed since the last save.
+        """
+        if not self._dirty:
+            return
+        with self._lock:
+            data = {"version": 1, "entries": list(self._entries.items())}
+            self._dirty = False
+        try:
+            utils.atomicWrite(self.path, lambda f: json.dump(data, f))
+        except BaseException:
+            # Written again by the next save
+            self._dirty = True
+            raise
+
+
+# Variables
+listingCache = DirectoryCache()
@@ -1,16 +1,391 @@
-from Qt import QtWidgets
-import utils
+from Qt import QtWidgets, QtCore
+import os, datetime, bisect
+import utils, scanner, search
 
-class Panel(QtWidgets.QWidget):
+# Columns of the file tree
+NAME = 1
+SIZE = 2
+DATE = 3
+
+
+class FolderModel(QtCore.QAbstractTableModel):
+    """
+    Sub folders of a folder, listed in background by a scanner.Scanner.
+
+    The rows are given to the views by pages, through canFetchMore() and
+    fetchMore(), so a folder with hundreds of thousands of sub folders is
+    shown as soon as its first page is listed. No object is created per
+    row: the cells are read from the list of paths, and from the
+    sizes.Aggregator, when they are painted.
+    """
+    PathRole = QtCore.Qt.UserRole # Full path of the folder of a row
+    headers = ["", "Name", "Size", "Date"]
+
+    loaded = QtCore.Signal(str)
+
+    def __init__(self, parent=None, scanner=None, sizes=None, pageSize=256, sortInterval=500):
+        """
+        Args:
+            parent (QObject, optional): Parent of the model. Defaults to None.
+            scanner (scanner.Scanner, optional): Lists the folders in background. Defaults to None, to list them right away.
+            sizes (sizes.Aggregator, optional): Gives the sizes of the folders. Defaults to None.
+            pageSize (int, optional): Number of rows given to the views at once. Defaults to 256.
+            sortInterval (int, optional): Minimum time in milliseconds between two sorts of all the paths, while the sizes or the paths come. Defaults to 500.
+        """
+        super(FolderModel, self).__init__(parent)
+        self.scanner = scanner
+        self.sizes = sizes
+        self.pageSize = pageSize
+        self._folder = None # Folder whose sub folders are listed
+        self._paths = [] # Sub folders found so far, only the first _count are rows
+        self._rows = {} # Path of a sub folder -> its index in _paths
+        self._rowsDirty = False # True when paths have been inserted in the middle of _paths since _rows was built
+        self._keys = [] # Sort value of each path of _paths, while a sort column is set
+        self._tailSorted = True # False when the paths after the rows given to the views are not sorted yet
+        self._count = 0 # Number of rows given to the views
+        self._wanted = pageSize # Number of rows the views asked for, -1 for all of them
+        self._job = None # Running scanner job
+        self._sortColumn = -1 # Column the paths are sorted by, -1 for the listing order
+        self._sortOrder = QtCore.Qt.AscendingOrder
+        self._sortTimer = QtCore.QTimer(self) # Sorts all the paths again, at most once per interval
+        self._sortTimer.setSingleShot(True)
+        self._sortTimer.setInterval(sortInterval)
+        self._sortTimer.timeout.connect(self._sort)
+
+    def folder(self):
+        return self._folder
+
+    def isLoading(self):
+        return self._job is not None
+
+    def setFolder(self, path):
+        """Start to list the sub folders of a folder, None to show nothing.
+        """
+        if self.scanner is not None:
+            self.scanner.cancel(self._job)
+        self._job = None
+        self.beginResetModel()
+        self._folder = path
+        self._paths = []
+        self._rows = {}
+        self._rowsDirty = False
+        self._keys = []
+        self._tailSorted = True
+        self._count = 0
+        self._wanted = self.pageSize
+        self._sortTimer.stop()
+        self.endResetModel()
+        if path is None:
+            return
+
+        if self.scanner is None:
+            try:
+                self._addPaths(list(scanner.listDirectories(path)))
+            except OSError as error:
+                print("ERROR: Unable to list {0}: {1}".format(path, error))
+            self.loaded.emit(path)
+        else:
+            self._job = self.scanner.scan(path, self._addPaths, self._scanFinished)
+
+    def refresh(self):
+        """List the current folder again.
+        """
+        self.setFolder(self._folder)
+
+    def path(self, row):
+        return self._paths[row]
+
+    def row(self, path):
+        """Return the row of a sub folder, -1 if it has not been given to the views yet.
+        """
+        row = self._rowIndex().get(path, -1)
+        return row if row < self._count else -1
+
+    def fetchAll(self):
+        """Give all the sub folders to the views, the ones listed later included.
+        Needed to filter or sort the whole folder.
+        """
+        self._wanted = -1
+        self._expose()
+
+    def updateSizes(self, paths):
+        """Repaint the size and the date of the given sub folders.
+        """
+        rowIndex = self._rowIndex()
+        rows = [rowIndex[path] for path in paths if path in rowIndex]
+        rows = [row for row in rows if row < self._count]
+        if not rows:
+            return
+        # One signal for the whole range, cheaper than one per row
+        self.dataChanged.emit(self.index(min(rows), SIZE), self.index(max(rows), DATE))
+        if self._sortColumn in (SIZE, DATE) and not self._sortTimer.isActive():
+            # The sizes come by many small batches, the rows move at most once per interval
+            self._sortTimer.start()
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        """Sort all the sub folders, the ones listed later are inserted at their place.
+        A column of -1 keeps the listing order from now on.
+        """
+        if column == self._sortColumn and order == self._sortOrder:
+            # The paths listed since the last sort are already at their place
+            return
+        self._sortColumn = column
+        self._sortOrder = order
+        if column >= 0:
+            self._sort()
+        else:
+            self._keys = []
+            self._sortTimer.stop()
+
+    def sortKey(self, column):
+        """Return the function giving the sort value of a path in a column.
+        """
+        if column == NAME:
+            return lambda path: os.path.basename(path).lower()
+        total = self.sizes.total if self.sizes is not None else lambda path: None
+        index = 0 if column == SIZE else 3
+        def key(path):
+            value = total(path)
+            return -1 if value is None else value[index]
+        return key
+
+    def _sort(self):
+        if self._sortColumn < 0:
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        persistentPaths = [self._paths[index.row()] for index in persistent]
+
+        # A single sort of the list, instead of calling data() for each comparison
+        key = self.sortKey(self._sortColumn)
+        keyed = sorted(((key(path), path) for path in self._paths), key=lambda item: item[0],
+                       reverse=self._sortOrder == QtCore.Qt.DescendingOrder)
+        self._keys = [item[0] for item in keyed]
+        self._paths = [item[1] for item in keyed]
+        self._rows = dict((path, row) for row, path in enumerate(self._paths))
+        self._rowsDirty = False
+        self._tailSorted = True
+
+        self.changePersistentIndexList(persistent, [self.index(self._rows[path], index.column()) for path, index in zip(persistentPaths, persistent)])
+        self.layoutChanged.emit()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._count
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path = self._paths[index.row()]
+        column = index.column()
+        if role == self.PathRole:
+            return path
+
+        if column == NAME:
+            if role == QtCore.Qt.DisplayRole:
+                return os.path.basename(path)
+            return None
+
+        if column == SIZE and role == QtCore.Qt.TextAlignmentRole:
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        if column not in (SIZE, DATE) or role not in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+            return None
+
+        total = self.sizes.total(path) if self.sizes is not None else None
+        if role == QtCore.Qt.ToolTipRole:
+            if total is None or column != SIZE:
+                return None
+            return "{0} files in {1} folders".format(total[1], total[2])
+        if total is None:
+            return "..." if column == SIZE else ""
+        if column == SIZE:
+            return utils.formatSize(total[0])
+        return datetime.datetime.fromtimestamp(total[3]).strftime("%Y-%m-%d %H:%M")
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._count < len(self._paths)
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return
+        if self._wanted != -1:
+            self._wanted = self._count + self.pageSize
+        self._expose()
+
+    def _expose(self):
+        last = len(self._paths)
+        if self._wanted != -1:
+            last = min(last, self._wanted)
+        if last <= self._count:
+            return
+        if not self._tailSorted:
+            self._sortTail()
+        self.beginInsertRows(QtCore.QModelIndex(), self._count, last - 1)
+        self._count = last
+        self.endInsertRows()
+
+    def _addPaths(self, paths):
+        if self._sortColumn >= 0 and self._wanted != -1:
+            self._insertSorted(paths)
+        else:
+            key = self.sortKey(self._sortColumn) if self._sortColumn >= 0 else None
+            for path in paths:
+                if path in self._rows:
+                    continue
+                self._rows[path] = len(self._paths)
+                self._paths.append(path)
+                if key is not None:
+                    self._keys.append(key(path))
+            if key is not None and not self._sortTimer.isActive():
+                # All the rows are given to the views, inserting them one by one would
+                # cost a pass over the views for each of them: sort at most once per interval
+                self._sortTimer.start()
+        # Only the rows already asked for are shown, the others wait for fetchMore()
+        self._expose()
+
+    def _insertSorted(self, paths):
+        """Insert a batch of paths at their place among the rows given to the views, instead of
+        sorting everything again. The other paths are only sorted once more rows are asked for.
+        """
+        key = self.sortKey(self._sortColumn)
+        descending = self._sortOrder == QtCore.Qt.DescendingOrder
+        for path in paths:
+            if path in self._rows:
+                continue
+            value = key(path)
+            row = self._bisect(value, descending)
+            if row >= self._count:
+                self._rows[path] = len(self._paths)
+                self._keys.append(value)
+                self._paths.append(path)
+                self._tailSorted = False
+                continue
+
+            # Among the rows given to the views, the last one goes back to the unsorted paths
+            self._rows[path] = row
+            self._rowsDirty = True
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self._keys.insert(row, value)
+            self._paths.insert(row, path)
+            self._count += 1
+            self.endInsertRows()
+            if self._count > self._wanted:
+                self.beginRemoveRows(QtCore.QModelIndex(), self._count - 1, self._count - 1)
+                self._count -= 1
+                self.endRemoveRows()
+                self._tailSorted = False
+
+    def _sortTail(self):
+        """Sort the paths not given to the views yet, they all come after the rows.
+        """
+        count = self._count
+        keyed = sorted(zip(self._keys[count:], self._paths[count:]), key=lambda item: item[0],
+                       reverse=self._sortOrder == QtCore.Qt.DescendingOrder)
+        self._keys[count:] = [item[0] for item in keyed]
+        self._paths[count:] = [item[1] for item in keyed]
+        self._rowsDirty = True
+        self._tailSorted = True
+
+    def _bisect(self, value, descending):
+        """Return the row of a sort value among the rows given to the views.
+        """
+        if not descending:
+            return bisect.bisect_right(self._keys, value, 0, self._count)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high)//2
+            if value > self._keys[middle]:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def _rowIndex(self):
+        """Return the dict path -> row, built again if paths have been inserted in the middle.
+        """
+        if self._rowsDirty:
+            self._rows = dict((path, row) for row, path in enumerate(self._paths))
+            self._rowsDirty = False
+        return self._rows
+
+    def _scanFinished(self, job):
+        self._job = None
+        if self._sortTimer.isActive():
+            self._sortTimer.stop()
+            self._sort()
+        self.loaded.emit(job.path)
+
+
+class FolderProxy(QtCore.QSortFilterProxyModel):
+    """
+    Filter the sub folders of a FolderModel by name. The sort is done by the
+    source model, which is much faster on big folders than comparing the
+    rows one pair at a time.
+    """
     def __init__(self, parent=None):
+        super(FolderProxy, self).__init__(parent)
+        self.setFilterKeyColumn(NAME)
+        self.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+
+    def setQuery(self, text):
+        """Show only the names matching a query of the search module: a substring, a glob or a ~fuzzy query.
+        """
+        pattern = search.regex(*search.parseQuery(text))
+        if hasattr(QtCore, "QRegularExpression"):
+            self.setFilterRegularExpression(QtCore.QRegularExpression(pattern, QtCore.QRegularExpression.CaseInsensitiveOption))
+        else:
+            self.setFilterRegExp(QtCore.QRegExp(pattern, QtCore.Qt.CaseInsensitive))
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+
+class Panel(QtWidgets.QWidget):
+    """
+    Show the sub folders of the selected node with their size and date.
+    The sizes come from a sizes.Aggregator, the panel never reads the disk.
+    """
+    # Columns of the file tree
+    NAME = NAME
+    SIZE = SIZE
+    DATE = DATE
+
+    folderActivated = QtCore.Signal(str)
+    filterChanged = QtCore.Signal(str)
+
+    def __init__(self, parent=None, sizes=None, scanner=None):
         super(Panel, self).__init__(parent)
+        self.sizes = sizes
+
+        # Models, the proxy sorts and filters the rows without copying them
+        self.model = FolderModel(self, scanner=scanner, sizes=sizes)
+        self.proxy = FolderProxy(self)
+        self.proxy.setSourceModel(self.model)
 
         # Widgets
         self.filterInput = QtWidgets.QLineEdit()
-        self.filterInput.setPlaceholderText("filter...")
+        self.filterInput.setPlaceholderText("filter: name, glob*, ~fuzzy")
         self.path = QtWidgets.QLineEdit()
-        self.fileTree = QtWidgets.QTreeWidget()
-        self.fileTree.setHeaderLabels(["", "Name", "Size", "Date"])
+        self.path.setReadOnly(True)
+        self.fileTree = QtWidgets.QTreeView()
+        self.fileTree.setRootIsDecorated(False)
+        # Needed to lay out only the visible rows
+        self.fileTree.setUniformRowHeights(True)
+        self.fileTree.setModel(self.proxy)
+        # Keep the listing order until a column is clicked
+        self.fileTree.header().setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+        self.fileTree.setSortingEnabled(True)
 
         # Layout
         self.mainLayout = QtWidgets.QVBoxLayout()
@@ -24,4 +399,68 @@ class Panel(QtWidgets.QWidget):
 
         self.setLayout(self.mainLayout)
 
+        # Connections
+        self.filterInput.textChanged.connect(self.applyFilter)
+        self.fileTree.header().sortIndicatorChanged.connect(self._sortChanged)
+        self.fileTree.activated.connect(self._rowActivated)
+        if self.sizes is not None:
+            self.sizes.totalsChanged.connect(self.updateSizes)
+
+    def folder(self):
+        return self.model.folder()
+
+    def setFolder(self, path):
+        """Show a folder, list its sub folders and start to compute their sizes.
+
+        Args:
+            path (str): The folder to show
+        """
+        previous = self.model.folder()
+        if self.sizes is not None and previous is not None and previous != path:
+            self.sizes.cancel(previous)
+        self.path.setText(path or "")
+        self.model.setFolder(path)
+        self._fetchAllIfNeeded()
+        if self.sizes is not None and path is not None:
+            self.sizes.aggregate(path)
+
+    def foldersChanged(self, paths):
+        """List the shown folder again if it changed on the disk.
+
+        Args:
+            paths (list): The folders that changed
+        """
+        if self.model.folder() in paths:
+            self.model.refresh()
+            self._fetchAllIfNeeded()
+
+    def selectPath(self, path):
+        """Select and show the row of a sub folder, if it has been listed.
+        """
+        row = self.model.row(path)
+        if row == -1:
+            return
+        index = self.proxy.mapFromSource(self.model.index(row, NAME))
+        if not index.isValid():
+            return
+        self.fileTree.setCurrentIndex(index)
+        self.fileTree.scrollTo(index)
+
+    def updateSizes(self, paths):
+        self.model.updateSizes(paths)
+
+    def applyFilter(self, text):
+        self._fetchAllIfNeeded()
+        self.proxy.setQuery(text)
+        self.filterChanged.emit(text)
+
+    def _fetchAllIfNeeded(self):
+        # Filtering or sorting only a page of the folder would be misleading
+        if self.filterInput.text() or self.fileTree.header().sortIndicatorSection() >= 0:
+            self.model.fetchAll()
+
+    def _sortChanged(self, section, order):
+        self._fetchAllIfNeeded()
 
+    def _rowActivated(self, index):
+        self.folderActivated.emit(self.proxy.data(index, FolderModel.PathRole))
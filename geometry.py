@@ -0,0 +1,109 @@
+"""
+Geometry of the connections, computed for many connections at once.
+
+The functions take sequences of points and return one result per point.
+They use NumPy when it is installed, and fall back on plain Python
+otherwise, with the same results. The NumPy results are arrays of shape
+(n, 2), the fallback results are lists of tuples.
+"""
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def attachPoints(origins, targets, radii, useNumpy=None):
+    """
+    Return the points at a distance radius from each origin, in the
+    direction of its target. Used for the connections leaving a RootNode,
+    which start on its circle.
+
+    :param origins: (x, y) centers
+    :param targets: (x, y) points to aim at
+    :param radii: Distance of each point from its origin, 0 keeps the origin
+    :param useNumpy: Force the backend, NumPy when available if None
+    """
+    if _numpy(useNumpy):
+        origins = numpy.asarray(origins, dtype=float).reshape(-1, 2)
+        targets = numpy.asarray(targets, dtype=float).reshape(-1, 2)
+        radii = numpy.asarray(radii, dtype=float).reshape(-1)
+        delta = targets - origins
+        norms = numpy.hypot(delta[:, 0], delta[:, 1])
+        # A target on its origin keeps the origin
+        scale = numpy.divide(radii, norms, out=numpy.zeros_like(norms), where=norms != 0)
+        return origins + delta*scale[:, None]
+
+    result = []
+    for (x, y), (tx, ty), radius in zip(origins, targets, radii):
+        dx = tx - x
+        dy = ty - y
+        norm = math.hypot(dx, dy)
+        if norm == 0 or radius == 0:
+            result.append((x, y))
+        else:
+            result.append((x + dx*radius/norm, y + dy*radius/norm))
+    return result
+
+
+def controlPoints(starts, ends, fromRoot, useNumpy=None):
+    """
+    Return the two control points of the cubic Bezier curve of each connection.
+
+    The curve leaves horizontally and arrives horizontally, the control
+    points are half way between the two ends. For a connection leaving a
+    RootNode, both control points are on the side of the end point.
+
+    :param starts: (x, y) start points
+    :param ends: (x, y) end points
+    :param fromRoot: True for each connection starting on a RootNode
+    :param useNumpy: Force the backend, NumPy when available if None
+    :return: The first and the second control points
+    """
+    if _numpy(useNumpy):
+        starts = numpy.asarray(starts, dtype=float).reshape(-1, 2)
+        ends = numpy.asarray(ends, dtype=float).reshape(-1, 2)
+        fromRoot = numpy.asarray(fromRoot, dtype=bool).reshape(-1)
+        middle = starts[:, 0] + (ends[:, 0] - starts[:, 0])*0.5
+        ctrl2 = numpy.column_stack((middle, ends[:, 1]))
+        ctrl1 = numpy.column_stack((middle, numpy.where(fromRoot, ends[:, 1], starts[:, 1])))
+        return ctrl1, ctrl2
+
+    ctrl1 = []
+    ctrl2 = []
+    for (x1, y1), (x2, y2), root in zip(starts, ends, fromRoot):
+        middle = x1 + (x2 - x1)*0.5
+        ctrl2.append((middle, y2))
+        ctrl1.append((middle, y2 if root else y1))
+    return ctrl1, ctrl2
+
+
+def connections(origins, targets, radii, useNumpy=None):
+    """
+    Compute everything needed to draw a set of connections.
+
+    :param origins: (x, y) output knob of each source node
+    :param targets: (x, y) input knob of each destination node
+    :param radii: Radius of the source node for the connections leaving a RootNode, 0 otherwise
+    :param useNumpy: Force the backend, NumPy when available if None
+    :return: starts, ctrl1, ctrl2, ends
+    """
+    if _numpy(useNumpy):
+        radii = numpy.asarray(radii, dtype=float).reshape(-1)
+        fromRoot = radii != 0
+        ends = numpy.asarray(targets, dtype=float).reshape(-1, 2)
+    else:
+        fromRoot = [radius != 0 for radius in radii]
+        ends = list(targets)
+    starts = attachPoints(origins, ends, radii, useNumpy)
+    ctrl1, ctrl2 = controlPoints(starts, ends, fromRoot, useNumpy)
+    return starts, ctrl1, ctrl2, ends
+
+
+def _numpy(useNumpy):
+    if useNumpy is None:
+        return numpy is not None
+    if useNumpy and numpy is None:
+        raise ImportError("NumPy is not installed")
+    return useNumpy
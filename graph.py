@@ -1,12 +1,17 @@
 from Qt import QtCore, QtGui, QtWidgets, QtSvg
-import nodalItems
-import utils, sys, os
+import nodalItems, nodeModel, scanner, dirCache, project, pathScheduler, layout, sizes, watcher, search, profiler, persistence
+import utils, theme, sys, os, math
 from hud import Hud
 import subprocess
 from collections import OrderedDict
+import contextlib
 import json
 
 class View(QtWidgets.QGraphicsView):
+    firstFrame = QtCore.Signal() # Sent once the view has painted for the first time
+    projectShown = QtCore.Signal() # Sent when the visible part of the loaded project is shown
+    projectLoaded = QtCore.Signal() # Sent when all the nodes of the loaded project are created
+
     def __init__(self):
         super(View, self).__init__()
         # CSSS
@@ -25,22 +30,63 @@ class View(QtWidgets.QGraphicsView):
         self.setRenderHint(QtGui.QPainter.Antialiasing)
         self.setDragMode(QtWidgets.QGraphicsView.RubberBandDrag)
         self.setRubberBandSelectionMode(QtCore.Qt.IntersectsItemShape)
-        self.setViewportUpdateMode(QtWidgets.QGraphicsView.FullViewportUpdate)
+        self.setViewportUpdateMode(QtWidgets.QGraphicsView.SmartViewportUpdate)
+        self.setCacheMode(QtWidgets.QGraphicsView.CacheBackground)
 
         self._connectionsItems = []
         self._rootsList = []
+        self.model = nodeModel.NodeModel() # The data of all the nodes, shown by the items
         self.rightClickNode = None
         self.currentProject = None
+        self._savedRevision = self.model.revision # Revision of the model last saved or loaded, see autosave()
+        self._loader = None # Create the nodes of the project being loaded
+        self._loadedNodes = {} # Id in the project file -> id in the model, while loading
+        self._loadRect = None # (left, top, right, bottom) of the area shown while loading, its nodes are created first
+        self._loadShown = set() # Ids of the loaded nodes whose ancestors are all expanded
+        self._deferredItems = [] # Ids of the loaded nodes outside of the shown area, created once the file is read
+        self._painted = False # True once the first frame is painted
+        self._batchDepth = 0 # Number of nested batch() blocks
+        self._batchNodes = OrderedDict() # Nodes connected during the batch, their visibility is updated at the end
+        self._dragIndexDisabled = False # True while a big subtree is dragged without scene index
 
         self.colors = ["#e74f4A", "#f08235", "#e1da18", "#84bc3b", "#5976b9", "#554696"]
 
         self.menu = None
 
         self.hud = Hud(self)
+        self.firstFrame.connect(self.hud.createDeferredWidgets, QtCore.Qt.QueuedConnection)
+
+        self.scanner = scanner.Scanner(self, cache=dirCache.listingCache)
+        self.pathScheduler = pathScheduler.PathScheduler(self)
+        self.layouter = layout.Layouter(self, utils.settings.layoutThreadThreshold)
+        self.sizes = sizes.Aggregator(self)
+        self.sizes.totalsChanged.connect(self._updateSizes)
+        self.watcher = watcher.Watcher(self, utils.settings.watchLimit, utils.settings.watchDebounce,
+                                       utils.settings.watchPollInterval, utils.settings.pollingPaths, utils.settings.watchMaxWait)
+        self.watcher.changed.connect(self._foldersChanged)
+        self.search = search.Search(parent=self) # Index of all the listed folders
+        self.search.resultsReady.connect(self._highlightResults)
+        self.scanner.listed.connect(self.search.add)
+        self.sizes.totalsChanged.connect(self.search.add)
+        self._highlighted = set() # Ids of the nodes matching the filter
+        self.preindexer = None # Created on first use, see getPreindexer()
+        if utils.settings.profileConnections:
+            self.pathScheduler.rateUpdated.connect(self._printPathRate)
+            self.pathScheduler.setProfiling(True)
+        profiler.current.traceWritten.connect(self._traceWritten)
+        persistence.writer.failed.connect(self._saveFailed)
+        self._autosaveTimer = QtCore.QTimer(self)
+        self._autosaveTimer.timeout.connect(self.autosave)
+        if utils.settings.autosaveInterval > 0:
+            self._autosaveTimer.start(int(utils.settings.autosaveInterval*1000))
 
         self._scene = Scene(self)
         self._scene.setSceneRect(-10000, -10000, 20000, 20000)
         self.setScene(self._scene)
+        if utils.settings.profileOverlay:
+            self.setProfiling(True)
+
+        theme.current.changed.connect(self.themeChanged)
 
         # Context Menu Buttons
         self.helpBtn = self.createMenuItem("Help", self,
@@ -59,6 +105,13 @@ class View(QtWidgets.QGraphicsView):
                 statusTip="Open in the explorer the path of the selected node",
                 triggered=self.openExplorerSelectedNode)
 
+        self.computeSizesBtn = self.createMenuItem("Compute sizes", self,
+                statusTip="Compute in background the size of the selected folders",
+                triggered=self.computeSelectedSizes)
+        self.preindexBtn = self.createMenuItem("Index the tree", self,
+                statusTip="Read in background the tree of the selected folders, so they are expanded and searched from memory",
+                triggered=self.preindexSelectedNodes)
+
         self.addSeedBtn = self.createMenuItem("Add Seed", self,
                 statusTip="Prompt a browser to load a seed in the software",
                 triggered=self.addRoot)
@@ -111,79 +164,495 @@ class View(QtWidgets.QGraphicsView):
             return 
         root_node = self.createNode(nodalItems.RootNode, args=[path, self.colors[len(self._rootsList)%len(self.colors)]])
         self._rootsList.append(root_node)
+        self.search.add([path])
+        if utils.settings.preindex:
+            self.getPreindexer().run(path)
         return root_node
 
+    def getPreindexer(self):
+        """Return the preindexer of the view, created the first time, so the
+        multiprocessing modules are only imported when a seed is indexed.
+
+        Returns:
+            preindex.Preindexer: The preindexer
+        """
+        if self.preindexer is None:
+            import preindex
+            self.preindexer = preindex.Preindexer(self, dirCache.listingCache, self.sizes.cache, utils.settings.preindexProcesses or None,
+                                                  utils.settings.preindexDepth, utils.settings.preindexBudget)
+            self.preindexer.progress.connect(self._preindexProgress)
+            self.preindexer.finished.connect(self._preindexFinished)
+        return self.preindexer
+
+    def themeChanged(self):
+        """Repaint everything with the new colors when the theme is reloaded.
+        """
+        nodalItems.BaseNode.themeChanged()
+        self.resetCachedContent()
+        self._scene.update()
+
     def clear(self):
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
+        self._loadedNodes = {}
+        self._loadShown = set()
+        self._deferredItems = []
+        self.scanner.cancelAll()
+        self.layouter.cancelAll()
+        self.sizes.cancelAll()
+        if self.preindexer is not None:
+            self.preindexer.cancelAll()
+        self.watcher.clear()
+        self.search.cancel()
+        self._highlighted = set()
+        self.endDrag()
+        self.pathScheduler.clear()
         self._scene.clear()
         self._rootsList = []
+        self._connectionsItems = []
+        self.model.clear()
+        self._savedRevision = self.model.revision
+
+    def _printPathRate(self, rate):
+        if rate:
+            print("PROFILE: {0:.0f} connection paths computed per second".format(rate))
+
+    def setProfiling(self, enabled):
+        """Show or hide the profiling overlay of the HUD, and measure the hot paths while it's shown.
+
+        Args:
+            enabled (bool): True to show the overlay
+        """
+        profiler.current.setEnabled(enabled)
+        self.pathScheduler.setProfiling(enabled or utils.settings.profileConnections)
+        self.hud.setProfiling(enabled)
+
+    def isProfiling(self):
+        return profiler.current.isEnabled()
+
+    def recordTrace(self, duration=None):
+        """Record the events of the hot paths during a few seconds, then write them to a trace file.
+
+        Args:
+            duration (float, optional): Duration of the trace in seconds. Defaults to the traceDuration setting.
+        """
+        if profiler.current.isTracing():
+            return
+        duration = utils.settings.traceDuration if duration is None else duration
+        fileName = profiler.current.startTrace(duration=duration)
+        print("PROFILE: Recording a trace of {0} seconds to {1}".format(duration, fileName))
+
+    def _traceWritten(self, fileName):
+        print("PROFILE: Trace written to {0}".format(fileName))
 
     def connectNodes(self, src_node, dst_node):
         connectionItem = self.createNode(nodalItems.ConnectionPath, args=[src_node, dst_node])
-        p1 = src_node._outputKnob
-        p2 = dst_node._inputKnob
         self._connectionsItems.append(connectionItem)
         src_node.addChildren(dst_node)
         return connectionItem
 
-    def createNode(self, classe, pos=None, args=[]):
-        new_node = classe(*args)
+    @contextlib.contextmanager
+    def batch(self):
+        """Group the creation of many nodes in one transaction.
+        Inside the block, the visibility of the new children is not propagated
+        node by node, it's done once per parent when the outermost block ends.
+
+        Example:
+            with view.batch():
+                view.createChildren(node, paths)
+        """
+        self._batchDepth += 1
+        try:
+            yield
+        finally:
+            self._batchDepth -= 1
+            if self._batchDepth == 0:
+                self._endBatch()
+
+    def isBatching(self):
+        return self._batchDepth > 0
+
+    def deferVisibility(self, node):
+        """Update the visibility of a new child and its descendants at the end of the batch.
+
+        Args:
+            node (nodalItems.BaseNode): A node that has just been connected to its parent
+        """
+        self._batchNodes[node._id] = node
+
+    def _endBatch(self):
+        nodes = self._batchNodes
+        self._batchNodes = OrderedDict()
+        for nodeId, node in nodes.items():
+            # Skip the nodes that are updated with one of their ancestors
+            if any(ancestor in nodes for ancestor in self.model.ancestors(nodeId)):
+                continue
+            parent = node._parent
+            node.setVisible(parent is None or (parent._childrenVisibles and parent.isVisible()))
+            node.updateChildrenVisibility()
+
+    def beginDrag(self, node):
+        """Prepare the scene before a node is dragged by the mouse.
+        Each moved item has to be removed and inserted again in the BSP index
+        of the scene, which is slower than not indexing them at all when a big
+        subtree moves. The index is disabled until endDrag().
+
+        Args:
+            node (nodalItems.BaseNode): The node about to be dragged
+        """
+        if self._dragIndexDisabled:
+            return
+        if len(self.model.descendants(node._id)) < utils.settings.dragIndexThreshold:
+            return
+        self.scene().setItemIndexMethod(QtWidgets.QGraphicsScene.NoIndex)
+        self._dragIndexDisabled = True
+
+    def endDrag(self):
+        """Build the scene index again after the drag of a big subtree.
+        """
+        if not self._dragIndexDisabled:
+            return
+        self._dragIndexDisabled = False
+        self.scene().setItemIndexMethod(QtWidgets.QGraphicsScene.BspTreeIndex)
+
+    def createChildren(self, parent, paths, colors=None, positions=None):
+        """Create many children of a node, with their connections, in one batch.
+
+        Args:
+            parent (nodalItems.BaseNode): The parent node
+            paths (list): The paths of the children
+            colors (list, optional): The background color of each child. Defaults to the parent color.
+            positions (list, optional): The (x, y) position of each child. Defaults to the parent position.
+
+        Returns:
+            list: The created nodalItems.BranchNode
+        """
+        result = []
+        with self.batch():
+            for i, path in enumerate(paths):
+                color = colors[i] if colors is not None else parent.bgColor
+                x, y = positions[i] if positions is not None else (parent.pos().x(), parent.pos().y())
+                # The node is added to the model at its final place, so the item
+                # is created without moving and without itemChange cascade
+                nodeId = self.model.add(path, parent._id, bgColor=color, x=x, y=y)
+                node = self.createItem(nodeId)
+                self.connectNodes(parent, node)
+                result.append(node)
+        return result
+
+    def createNode(self, classe, pos=None, args=[], kwargs=None):
+        kwargs = dict(kwargs or {})
+        if issubclass(classe, nodalItems.BaseNode):
+            kwargs.setdefault("model", self.model)
+        new_node = classe(*args, **kwargs)
         if pos is not None:
             new_node.setPos(pos)
         self._scene.addItem(new_node)
 
         return new_node  
 
+    def createItem(self, nodeId):
+        """Create the graphics item of a node that only exists in the model.
+
+        Args:
+            nodeId (int): Id of the node in the model
+
+        Returns:
+            nodalItems.BaseNode: The created item
+        """
+        classe = nodalItems.BranchNode
+        if self.model.parents[nodeId] == -1:
+            classe = nodalItems.RootNode
+        node = self.createNode(classe, args=[self.model.paths[nodeId]], kwargs={"nodeId": nodeId})
+        self._showSize(node)
+        self.watchNode(node)
+        if nodeId in self._highlighted:
+            node.setHighlighted(True)
+        return node
+
+    def removeNode(self, node):
+        """Remove a node and all its descendants from the scene and the model.
+
+        Args:
+            node (nodalItems.BaseNode): The node to remove
+        """
+        model = self.model
+        scene = self.scene()
+        connections = set()
+        for nodeId in model.descendants(node._id, True):
+            self.watcher.unwatch(model.paths[nodeId])
+            self._highlighted.discard(nodeId)
+            item = model.items[nodeId]
+            if item is None:
+                continue
+            item.cancelFillData()
+            connections.update(item._connections)
+            scene.removeItem(item)
+
+        for connection in connections:
+            # The connection to the parent is also listed by the parent
+            for end in (connection._srcNode, connection._dstNode):
+                if connection in end._connections:
+                    end._connections.remove(connection)
+            scene.removeItem(connection)
+        self._connectionsItems = [connection for connection in self._connectionsItems if connection not in connections]
+        if node in self._rootsList:
+            self._rootsList.remove(node)
+
+        parent = node._parent
+        model.remove(node._id)
+        if parent is not None:
+            parent.update()
+
+    def watchNode(self, node):
+        """Watch the folder of a node for changes while its children are shown.
+        The folder is registered from the event loop, with the others watched meanwhile.
+
+        Args:
+            node (nodalItems.BaseNode): A node just created, expanded or listed
+        """
+        if node._childrenVisibles and not node._seekChildren:
+            self.watcher.watchLater(node._path)
+
+    def watchSubtree(self, node):
+        """Watch a node just expanded and its descendants whose children are shown again.
+
+        Args:
+            node (nodalItems.BaseNode): The expanded node
+        """
+        model = self.model
+        stack = [node._id]
+        while stack:
+            nodeId = stack.pop()
+            flags = model.flags[nodeId]
+            if not flags & nodeModel.CHILDREN_VISIBLE:
+                continue
+            if not flags & nodeModel.SEEK_CHILDREN:
+                self.watcher.watchLater(model.paths[nodeId])
+            stack.extend(model.children[nodeId])
+
+    def unwatchSubtree(self, node):
+        """Stop watching a node just collapsed and all its descendants, they are hidden.
+
+        Args:
+            node (nodalItems.BaseNode): The collapsed node
+        """
+        model = self.model
+        for nodeId in model.descendants(node._id, True):
+            self.watcher.unwatch(model.paths[nodeId])
+
+    def _foldersChanged(self, paths):
+        for path in paths:
+            if not os.path.isdir(path):
+                # Removed with its parent, which changed too
+                continue
+            dirCache.listingCache.invalidate(path)
+            self.sizes.invalidate(path)
+            nodeId = self.model.find(path)
+            if nodeId is None or self.model.items[nodeId] is None:
+                self.watcher.unwatch(path)
+                continue
+            self.model.items[nodeId].refresh()
+
+    def filter(self, text):
+        """Highlight the nodes whose folder name matches a query, see the search module.
+        The matches come by batches, the previous query is cancelled.
+
+        Args:
+            text (str): The query, an empty text removes the highlight
+        """
+        model = self.model
+        for nodeId in self._highlighted:
+            if model.isValid(nodeId) and model.items[nodeId] is not None:
+                model.items[nodeId].setHighlighted(False)
+        self._highlighted = set()
+        self.search.query(text)
+
+    def _highlightResults(self, ids):
+        model = self.model
+        paths = self.search.index.paths
+        for pathId in ids:
+            nodeId = model.find(paths[pathId])
+            if nodeId is None:
+                continue
+            self._highlighted.add(nodeId)
+            if model.items[nodeId] is not None:
+                model.items[nodeId].setHighlighted(True)
+
     def openExplorerSelectedNode(self):
         os.startfile(self.scene().selectedItems()[0]._path)
 
-    def _getSelectionBoundingbox(self):
+    def layoutNode(self, node, name=None):
+        """Place the nodes shown under a node with a layout, the node keeps its position.
+        The layout of a big subtree is computed in a worker thread and applied when it's ready.
+
+        Args:
+            node (nodalItems.BaseNode): The node at the top of the subtree
+            name (str, optional): Name of a layout registered in the layout module. Defaults to settings.layout.
+        """
+        layoutItem = layout.create(name or utils.settings.layout)
+        if layoutItem is None:
+            return
+        self.layouter.run(layoutItem, layout.Tree(self.model, node._id), self._applyLayout)
+
+    def layoutSelectedNodes(self, name):
+        for item in self.scene().selectedItems():
+            if isinstance(item, nodalItems.BaseNode):
+                self.layoutNode(item, name)
+
+    def _applyLayout(self, tree, positions, reverted):
+        if not self.model.isValid(tree.rootId) or self.model.items[tree.rootId] is None:
+            return
+        # The top node may have been moved while the layout was computed
+        dx = self.model.x[tree.rootId] - tree.x
+        dy = self.model.y[tree.rootId] - tree.y
+        if dx or dy:
+            positions = dict((nodeId, (x + dx, y + dy)) for nodeId, (x, y) in positions.items())
+        self.applyPositions(positions, reverted)
+        self._makeRoom(tree.rootId)
+
+    def applyPositions(self, positions, reverted=None):
+        """Move many nodes at once, each one without moving its children.
+        The nodes under a collapsed node follow it.
+
+        Args:
+            positions (dict): Node id -> (x, y) new position
+            reverted (dict, optional): Node id -> True to have the input knob on the right. Defaults to None.
         """
-        Return the bounding box of the selection.
+        model = self.model
+        for nodeId, (x, y) in positions.items():
+            if not model.isValid(nodeId):
+                continue
+            node = model.items[nodeId]
+            if node is None:
+                continue
+            if reverted and nodeId in reverted:
+                node.setReverted(reverted[nodeId])
+            dx = x - node.x()
+            dy = y - node.y()
+            if not dx and not dy:
+                continue
+            node.setPosOnly(x, y)
+            if not node._childrenVisibles:
+                node.moveChildren(dx, dy)
+            node.updateConnections()
+
+    def _makeRoom(self, nodeId, gap=4):
+        """Push away the siblings overlapping a subtree that grew, then the
+        siblings of its ancestors, in the order of the children.
+
+        Args:
+            nodeId (int): The node at the top of the subtree
+            gap (int, optional): Vertical space kept between two subtrees. Defaults to 4.
+        """
+        model = self.model
+        branch = nodeId
+        parent = model.parents[branch]
+        while parent != -1:
+            siblings = [childId for childId in model.children[parent] if model.items[childId] is not None and model.items[childId].isVisible()]
+            if branch not in siblings:
+                # Hidden under a collapsed ancestor, the subtree takes no room
+                return
+            index = siblings.index(branch)
+            box = model.subtreeBounds(branch)
+
+            # The siblings after the subtree are pushed down, the ones before are pushed up
+            for direction, others in [(1, siblings[index + 1:]), (-1, reversed(siblings[:index]))]:
+                edge = box[3] if direction > 0 else box[1]
+                for sibling in others:
+                    siblingBox = model.subtreeBounds(sibling)
+                    # Not in front of the subtree, in another column
+                    if siblingBox[2] < box[0] or siblingBox[0] > box[2]:
+                        continue
+                    if direction > 0:
+                        shift = edge + gap - siblingBox[1]
+                    else:
+                        shift = siblingBox[3] + gap - edge
+                    if shift > 0:
+                        model.items[sibling].moveBy(0, direction*shift)
+                        siblingBox = model.subtreeBounds(sibling)
+                    edge = max(edge, siblingBox[3]) if direction > 0 else min(edge, siblingBox[1])
+
+            branch = parent
+            parent = model.parents[branch]
+
+    def computeSelectedSizes(self):
+        """Compute in background the size of the selected folders and of their sub folders.
         """
-        bbx_min = None
-        bbx_max = None
-        bby_min = None
-        bby_max = None
-        bbw = 0
-        bbh = 0
         for item in self.scene().selectedItems():
-            pos = item.scenePos()
-            x = pos.x()
-            y = pos.y()
-            w = x + item.boundingRect().width()
-            h = y + item.boundingRect().height()
-
-            # bbx min
-            if bbx_min is None:
-                bbx_min = x
-            elif x < bbx_min:
-                bbx_min = x
-            # end if
-
-            # bbx max
-            if bbx_max is None:
-                bbx_max = w
-            elif w > bbx_max:
-                bbx_max = w
-            # end if
-
-            # bby min
-            if bby_min is None:
-                bby_min = y
-            elif y < bby_min:
-                bby_min = y
-            # end if
-
-            # bby max
-            if bby_max is None:
-                bby_max = h
-            elif h > bby_max:
-                bby_max = h
-            # end if
-        # end if
-        bbw = bbx_max - bbx_min
-        bbh = bby_max - bby_min
-        return QtCore.QRectF(QtCore.QRect(bbx_min, bby_min, bbw, bbh))
+            if isinstance(item, nodalItems.BaseNode):
+                self.sizes.aggregate(item._path)
+
+    def _updateSizes(self, paths):
+        model = self.model
+        for path in paths:
+            nodeId = model.find(path)
+            if nodeId is not None and model.items[nodeId] is not None:
+                self._showSize(model.items[nodeId])
+
+    def preindexSelectedNodes(self):
+        for item in self.scene().selectedItems():
+            if isinstance(item, nodalItems.BaseNode):
+                self.getPreindexer().run(item._path, reuse=False)
+
+    def _preindexProgress(self, path, count, depth):
+        nodeId = self.model.find(path)
+        if nodeId is not None and self.model.items[nodeId] is not None:
+            self.model.items[nodeId].setToolTip("Indexing: {0} folders read, depth {1}".format(count, depth))
+
+    def _preindexFinished(self, path, paths):
+        self.search.add(paths)
+        nodeId = self.model.find(path)
+        if nodeId is not None and self.model.items[nodeId] is not None:
+            node = self.model.items[nodeId]
+            node.setToolTip("{0} folders indexed".format(len(paths)))
+            self._showSize(node)
+
+    def _showSize(self, node):
+        total = self.sizes.total(node._path)
+        if total is None:
+            return
+        size, files, folders, mtime = total
+        node.setToolTip("{0}\n{1} - {2} files in {3} folders".format(node._path, utils.formatSize(size), files, folders))
+
+    def _getSelectionBoundingbox(self):
+        """
+        Return the bounding box of the selected nodes and of the nodes shown under them,
+        None if nothing is selected.
+        """
+        selected = set(item._id for item in self.scene().selectedItems() if isinstance(item, nodalItems.BaseNode))
+        # A node under a selected node is already in its bounds
+        nodeIds = [nodeId for nodeId in selected if not any(parent in selected for parent in self.model.ancestors(nodeId))]
+        return self._boundsToRect(self.model.unionBounds(nodeIds))
+
+    def _getSceneBoundingbox(self):
+        """
+        Return the bounding box of all the shown nodes, None if the scene is empty.
+        """
+        return self._boundsToRect(self.model.unionBounds([node._id for node in self._rootsList]))
+
+    def _boundsToRect(self, box):
+        if box is None:
+            return None
+        return QtCore.QRectF(box[0], box[1], box[2] - box[0], box[3] - box[1])
+
+    def fitRect(self, rect, margin=40, maxZoom=1.0):
+        """Show the given area of the scene, without zooming more than maxZoom.
+
+        Args:
+            rect (QtCore.QRectF): The area to show, nothing is done if None
+            margin (int, optional): Space kept around the area, in scene units. Defaults to 40.
+            maxZoom (float, optional): Maximum scale of the view. Defaults to 1.0.
+        """
+        if rect is None:
+            return
+        rect = rect.adjusted(-margin, -margin, margin, margin)
+        self.fitInView(rect, QtCore.Qt.KeepAspectRatio)
+        zoom = self.transform().m11()
+        if zoom > maxZoom:
+            self.scale(maxZoom/zoom, maxZoom/zoom)
+            self.centerOn(rect.center())
 
     def about(self):
         pass
@@ -201,21 +670,117 @@ class View(QtWidgets.QGraphicsView):
                 return
             file = file[0]
                 
+        # A save of this project may still be written
+        persistence.writer.flush(file)
         if not os.path.exists(file) or not file.endswith(".browser"):
             print("ERROR: Unable to load this project")
             return
 
-        self.clear()
-        
-        content = json.load(open(file, 'r'))
-        for nodeData in content["nodes"]:
-            node = self.addRoot(nodeData["_path"])
-            node.load(nodeData)
+        try:
+            header, records = project.read(file)
+        except (project.ProjectError, IOError, OSError) as e:
+            print("ERROR: Unable to load this project: {0}".format(e))
+            if os.path.exists(utils.backupPath(file, 1)):
+                print("WARNING: The previous version of the project is kept in {0}".format(utils.backupPath(file, 1)))
+            return
 
-        self.fitInView(QtCore.QRect(*content["scenePos"]), QtCore.Qt.KeepAspectRatio)
+        self.clear()
+        # The restored nodes will be expanded from the listing cache, it's
+        # read in background while the project is loading
+        self.scanner.preloadCache()
 
+        self.fitInView(QtCore.QRectF(*header["scenePos"]), QtCore.Qt.KeepAspectRatio)
         self.setCurrentProject(file)
-    
+        shown = self.mapToScene(self.viewport().rect()).boundingRect()
+        self._loadRect = (shown.left(), shown.top(), shown.right(), shown.bottom())
+
+        # The nodes are created by slices in the event loop while the file
+        # is read. Only the items of the shown area are created during the
+        # read, the others are created afterwards by _loadFinished()
+        self._loader = project.Loader(records, self._loadRecord, self, batch=self.batch)
+        self._loader.finished.connect(self._loadFinished)
+        self._loader.start()
+
+    def _loadRecord(self, record):
+        """Add the node described by a record of a project file to the model.
+        The parent of the node has always been added before.
+
+        The items of the nodes hidden under a collapsed node are not created,
+        they are created when their parent is expanded. The items outside of
+        the shown area are created once the whole file is read.
+
+        Args:
+            record (dict): The data of the node
+        """
+        model = self.model
+        if record["parent"] is None:
+            if not os.path.exists(record["_path"]):
+                return
+            nodeId = model.addRecord(record)
+            self._rootsList.append(self.createItem(nodeId))
+            self._loadShown.add(nodeId)
+        else:
+            parentId = self._loadedNodes.get(record["parent"])
+            if parentId is None:
+                # The parent has been skipped, so are its children
+                return
+            nodeId = model.addRecord(record, parentId)
+            if parentId in self._loadShown and model.flags[parentId] & nodeModel.CHILDREN_VISIBLE:
+                self._loadShown.add(nodeId)
+                left, top, right, bottom = self._loadRect
+                x = model.x[nodeId]
+                y = model.y[nodeId]
+                if x <= right and y <= bottom and x + model.widths[nodeId] >= left and y + model.heights[nodeId] >= top:
+                    self._createLoadedItem(nodeId)
+                else:
+                    self._deferredItems.append(nodeId)
+        self.search.add([record["_path"]])
+        self._loadedNodes[record["id"]] = nodeId
+
+    def _createLoadedItem(self, nodeId):
+        """Create the item of a loaded node, and the items of its ancestors not created yet.
+
+        Args:
+            nodeId (int): Id of the node in the model
+
+        Returns:
+            nodalItems.BaseNode: The item of the node
+        """
+        model = self.model
+        node = model.items[nodeId]
+        if node is not None or not model.isValid(nodeId):
+            return node
+        parentId = model.parents[nodeId]
+        parent = model.items[parentId]
+        if parent is None:
+            parent = self._createLoadedItem(parentId)
+        node = self.createItem(nodeId)
+        self.connectNodes(parent, node)
+        return node
+
+    def _loadFinished(self):
+        """Create the items left outside of the shown area, once the file is read.
+        """
+        self._loadedNodes = {}
+        self._loadShown = set()
+        deferred = self._deferredItems
+        self._deferredItems = []
+        self.projectShown.emit()
+        self._loader = project.Loader(iter(deferred), self._createLoadedItem, self, batch=self.batch)
+        self._loader.finished.connect(self._itemsLoaded)
+        self._loader.start()
+
+    def _itemsLoaded(self):
+        self._loader = None
+        self._savedRevision = self.model.revision
+        self.projectLoaded.emit()
+
+    def finishLoading(self):
+        """Create right now all the nodes of the project being loaded.
+        """
+        while self._loader is not None:
+            self._loader.finish()
+
     def loadRecent(self):
         self.load(self.sender().text())
         
@@ -223,18 +788,45 @@ class View(QtWidgets.QGraphicsView):
         if self.currentProject is None:
             self.saveAs()
             return
-        result = {"scenePos": None, "nodes":[]}
-        for node in self._rootsList:
-            result["nodes"].append(node.save())
+        self.finishLoading()
+
+        # Only a copy of the model is taken here, the records are serialized
+        # and written in the worker thread of the writer
+        path = self.currentProject
+        scenePos = utils.rectToList(self.mapToScene(self.rect()).boundingRect())
+        roots = [node._id for node in self._rootsList]
+        model = self.model.snapshot()
+        backups = utils.settings.projectBackups
+        # The saves coming in a row only write the last one, see settings.saveDelay
+        persistence.writer.save(path, lambda: model,
+                                lambda model: project.write(path, scenePos, model.records(roots), backups),
+                                utils.settings.saveDelay)
+        if dirCache.listingCache.isDirty():
+            persistence.writer.save("listingCache", lambda: None, lambda data: dirCache.listingCache.save(),
+                                    utils.settings.saveDelay)
+        self._savedRevision = self.model.revision
+
+    def autosave(self):
+        """Save the current project if it changed since it was saved or loaded.
+        Nothing is saved while a project is loading.
+        """
+        if self.currentProject is None or self._loader is not None:
+            return
+        if self.model.revision != self._savedRevision:
+            self.save()
 
-        viewRect = self.mapToScene(self.rect()).boundingRect()
-        
-        
-        result["scenePos"] = utils.rectToList(self.mapToScene(self.rect()).boundingRect())
+    def _saveFailed(self, key, error):
+        if key == self.currentProject:
+            # Saved again by the next autosave
+            self._savedRevision = None
 
-        #TODO open a UI to pick the path of the 
-        json.dump(result, open(self.currentProject, "w"), indent=4)
-        # print(result)
+    def records(self):
+        """Iterate over the records of all the nodes, each node after its parent.
+
+        Yields:
+            dict: The data of a node, with its "id" and the "parent" id
+        """
+        return self.model.records([node._id for node in self._rootsList])
 
     def saveAs(self):
         file = QtWidgets.QFileDialog.getSaveFileName(filter="Browser Files (*.browser)")
@@ -255,15 +847,32 @@ class View(QtWidgets.QGraphicsView):
         """
 
         if event.key() == QtCore.Qt.Key_A:
-            itemsArea = self.scene().itemsBoundingRect()
-            self.fitInView(itemsArea, QtCore.Qt.KeepAspectRatio)
+            self.fitRect(self._getSceneBoundingbox())
+
+        elif event.key() == QtCore.Qt.Key_F:
+            self.fitRect(self._getSelectionBoundingbox())
 
-        elif event.key() == QtCore.Qt.Key_F:  
-            itemsArea = self._getSelectionBoundingbox()
-            center = QtCore.QPoint((itemsArea.x() + itemsArea.width())/2, (itemsArea.y() + itemsArea.height())/2)
-            self.centerOn(center)
-            # get selected ite
-            # self.fitInView(itemsArea, QtCore.Qt.KeepAspectRatio)
+        elif event.key() == QtCore.Qt.Key_F12:
+            if event.modifiers() & QtCore.Qt.ShiftModifier:
+                self.recordTrace()
+            else:
+                self.setProfiling(not self.isProfiling())
+
+    def paintEvent(self, event):
+        """Override the paint event to measure the frames while profiling
+
+        Args:
+            event (QtCore.QEvent): The event sent by QT Framework
+        """
+        if not profiler.enabled:
+            super(View, self).paintEvent(event)
+        else:
+            profiler.current.beginFrame()
+            super(View, self).paintEvent(event)
+            profiler.current.endFrame()
+        if not self._painted:
+            self._painted = True
+            self.firstFrame.emit()
 
     def wheelEvent(self, event):
         """Override the mouse wheel to allow the user to zoom in the scene
@@ -340,6 +949,13 @@ class View(QtWidgets.QGraphicsView):
 
         if len(self.scene().selectedItems()) > 0:
             menu.addAction(self.openExplorerSelectedNodeBtn)
+            menu.addAction(self.computeSizesBtn)
+            menu.addAction(self.preindexBtn)
+            layoutMenu = menu.addMenu("Layout")
+            for name, layoutClass in sorted(layout.layouts.items()):
+                layoutMenu.addAction(self.createMenuItem(layoutClass.label, self,
+                        statusTip="Place the children of the selected nodes",
+                        triggered=lambda checked=False, name=name: self.layoutSelectedNodes(name)))
             menu.addSeparator()
         
         menu.addAction(self.helpBtn)
@@ -371,6 +987,26 @@ class View(QtWidgets.QGraphicsView):
         if hasattr(self, "hud"):
             self.hud.show()
         
+    def showEvent(self, event):
+        super(View, self).showEvent(event)
+        if hasattr(self, "hud"):
+            self.hud.scheduler.updateState()
+
+    def hideEvent(self, event):
+        super(View, self).hideEvent(event)
+        if hasattr(self, "hud"):
+            self.hud.scheduler.updateState()
+
+    def changeEvent(self, event):
+        """Override the change event to pause the updates of the HUD while the window is minimized or inactive
+
+        Args:
+            event (QtCore.QEvent): The event sent by QT Framework
+        """
+        super(View, self).changeEvent(event)
+        if event.type() in (QtCore.QEvent.ActivationChange, QtCore.QEvent.WindowStateChange) and hasattr(self, "hud"):
+            self.hud.scheduler.updateState()
+
     def resizeEvent(self, event):
         """Override the resize function to send the resize to the HUD widget
 
@@ -387,28 +1023,50 @@ class Scene(QtWidgets.QGraphicsScene):
     def __init__(self, parent = None):
         super(Scene, self).__init__(parent)
 
-    def drawBackground(self, painter = QtGui.QPainter(), rect = None):
-        #view_rect = self.parent().mapToScene(self.parent().rect()).boundingRect()
-        rect = self.sceneRect()
-        darkLines = QtGui.QPen(QtGui.QColor(utils.getCssValue("backgroundGrid", "bigGrid-color")), 1, QtCore.Qt.SolidLine)
-        lightLines = QtGui.QPen(QtGui.QColor(utils.getCssValue("backgroundGrid", "smallGrid-color")), 1, QtCore.Qt.SolidLine)
-        painter.fillRect(rect, QtGui.QColor(utils.getCssValue("backgroundGrid", "background-color")))
-
-        painter.setPen(lightLines)
-        self.drawGrid(painter, rect, 15)
+    def drawBackground(self, painter, rect):
+        """Draw the grid, only in the exposed part of the scene.
 
-        painter.setPen(darkLines)
+        Args:
+            painter (QtGui.QPainter): The painter given by QT Framework
+            rect (QtCore.QRectF): The exposed area of the scene, in scene coordinates
+        """
+        rect = rect.intersected(self.sceneRect())
+        if rect.isEmpty():
+            return
+        start = profiler.clock() if profiler.enabled else None
+        style = theme.current
+        painter.fillRect(rect, style.brush("backgroundGrid", "background-color"))
+
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
+        # Skip the small grid when its lines would be closer than a few pixels
+        scale = painter.worldTransform().m11()
+        if 15 * scale >= 4:
+            painter.setPen(style.pen("backgroundGrid", "smallGrid-color", 0))
+            self.drawGrid(painter, rect, 15)
+
+        painter.setPen(style.pen("backgroundGrid", "bigGrid-color", 0))
         self.drawGrid(painter, rect, 150)
-        # self.update()
+        if start is not None:
+            profiler.current.span("drawBackground", start)
 
     def drawGrid(self, painter, rect, padding):
-        y = rect.y()
-        x = rect.x()
-        while y <= rect.height():
-            line = QtCore.QLineF(rect.x(), y, rect.width(), y)
-            painter.drawLine(line)
+        """Draw the lines of a grid in a single call.
+        The lines are snapped to the grid spacing so they don't move with the exposed rect.
+
+        Args:
+            painter (QtGui.QPainter): The painter to draw with
+            rect (QtCore.QRectF): The area to cover
+            padding (int): The space between two lines
+        """
+        left = rect.left() - math.fmod(rect.left(), padding)
+        top = rect.top() - math.fmod(rect.top(), padding)
+        lines = []
+        x = left
+        while x <= rect.right():
+            lines.append(QtCore.QLineF(x, rect.top(), x, rect.bottom()))
+            x += padding
+        y = top
+        while y <= rect.bottom():
+            lines.append(QtCore.QLineF(rect.left(), y, rect.right(), y))
             y += padding
-        while x <= rect.width():
-            line = QtCore.QLineF(x, rect.y(), x, rect.height())
-            painter.drawLine(line)
-            x += padding
\ No newline at end of file
+        painter.drawLines(lines)
@@ -1,6 +1,7 @@
 from Qt import QtWidgets, QtCore, QtGui
 from Qt import QtWidgets, QtGui, QtCore
-import os, datetime, sys, threading, utils
+from collections import OrderedDict
+import os, datetime, sys, math, utils, profiler, dirCache
 
 class Hud(QtCore.QObject):
     def __init__(self, parent = None):
@@ -9,15 +10,15 @@ class Hud(QtCore.QObject):
 
         self.size = QtCore.QSize(100, 100)
 
-        self.logo = QtWidgets.QLabel("Browther^3", parent=self._parent)
-        self.logo.setPixmap(QtGui.QPixmap(os.path.join(os.path.dirname(__file__), "images/logo.png")))
-        self.logo.setAlignment(QtCore.Qt.AlignRight)
-
-        self.time = TimeWidget()
-        self.time.setParent(self._parent)
+        # The decorative widgets are created after the first frame, see createDeferredWidgets()
+        self.logo = None
+        self.time = None
+        self.profile = None # Created when the profiling is enabled
 
         self.trayBtn = TrayBtn(self._parent)
 
+        # All the periodic widgets are updated from a single timer
+        self.scheduler = HudScheduler(self._parent, parent=self._parent)
 
         # self.mainLayout = QtWidgets.QVBoxLayout()
         # self.topHorizontalLayout = QtWidgets.QHBoxLayout()
@@ -47,21 +48,144 @@ class Hud(QtCore.QObject):
         # self.driveStatusLayout.addWidget(self.time)
 
         # self.setLayout(self.mainLayout)
+
+    def createDeferredWidgets(self):
+        """Create the widgets that are not needed to show the first frame: the logo and the clock.
+        """
+        if self.logo is not None:
+            return
+        self.logo = QtWidgets.QLabel("Browther^3", parent=self._parent)
+        self.logo.setPixmap(QtGui.QPixmap(os.path.join(os.path.dirname(__file__), "images/logo.png")))
+        self.logo.setAlignment(QtCore.Qt.AlignRight)
+
+        self.time = TimeWidget()
+        self.time.setParent(self._parent)
+        self.scheduler.add(self.time.updateTime, 1000)
+
+        self.updateLayout()
+        self.logo.show()
+        self.time.show()
+
     def updateLayout(self):
-        self.logo.move(self.size.width()-self.logo.sizeHint().width(), 0)
-        self.time.move(0, self.size.height()-self.time.sizeHint().height())
+        if self.logo is not None:
+            self.logo.move(self.size.width()-self.logo.sizeHint().width(), 0)
+            self.time.move(0, self.size.height()-self.time.sizeHint().height())
         self.trayBtn.move((self.size.width()-self.trayBtn.sizeHint().width())/2, self.size.height()-self.trayBtn.sizeHint().height())
+        if self.profile is not None:
+            self.profile.move(0, 0)
 
     def show(self):
-        self.logo.show()
-        self.time.show()
+        if self.logo is not None:
+            self.logo.show()
+            self.time.show()
         self.trayBtn.show()
+        if self.profile is not None and profiler.current.isEnabled():
+            self.profile.show()
+
+    def setProfiling(self, enabled):
+        if self.profile is None:
+            if not enabled:
+                return
+            self.profile = ProfileWidget(self._parent)
+        if enabled:
+            self.profile.reset()
+            self.scheduler.add(self.profile.refresh, 500)
+        else:
+            self.scheduler.remove(self.profile.refresh)
+        self.profile.setVisible(enabled)
+        self.updateLayout()
 
     def resize(self, w, h):
         self.size.setWidth(w)
         self.size.setHeight(h)
         self.updateLayout()
 
+class HudScheduler(QtCore.QObject):
+    """
+    Update the periodic widgets of the HUD from a single timer.
+
+    The calls are aligned on multiples of their interval, the timer wakes
+    up once for all the updates due at the same time, and not at all while
+    the window is hidden, minimized or not active: the updates start again,
+    at once, when the window comes back.
+    """
+    def __init__(self, widget, parent=None, slack=50):
+        """
+        Args:
+            widget (QWidget): The widget showing the HUD, the updates are paused while its window is not shown and active.
+                It has to call updateState() from its show, hide and change events.
+            parent (QObject, optional): Parent of the scheduler. Defaults to None.
+            slack (int, optional): Updates due within this time in milliseconds are done in the same tick. Defaults to 50.
+        """
+        super(HudScheduler, self).__init__(parent)
+        self._widget = widget
+        self._slack = slack/1000.0
+        self._updates = OrderedDict() # Callback -> [interval in seconds, clock() time of the next call]
+        self._paused = True # Until the widget is shown
+        self.ticks = 0 # Number of times the timer woke up
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._tick)
+
+        app = QtWidgets.QApplication.instance()
+        if app is not None:
+            app.applicationStateChanged.connect(self.updateState)
+        self.updateState()
+
+    def add(self, callback, interval):
+        """Call a function periodically, the first call is done right away if the HUD is shown.
+
+        Args:
+            callback (function): The function to call, without argument
+            interval (int): Time in milliseconds between two calls
+        """
+        self._updates[callback] = [interval/1000.0, profiler.clock()]
+        self._schedule()
+
+    def remove(self, callback):
+        self._updates.pop(callback, None)
+        self._schedule()
+
+    def isPaused(self):
+        return self._paused
+
+    def updateState(self, *args):
+        """Pause or resume the updates, called when the widget is shown or hidden, or its window changes state.
+        """
+        widget = self._widget
+        window = widget.window() if widget is not None else None
+        paused = window is None or not widget.isVisible() or window.isMinimized() or not window.isActiveWindow()
+        if paused == self._paused:
+            return
+        self._paused = paused
+        if not paused:
+            # Everything is out of date after a pause
+            now = profiler.clock()
+            for update in self._updates.values():
+                update[1] = now
+        self._schedule()
+
+    def _schedule(self):
+        if self._paused or not self._updates:
+            self._timer.stop()
+            return
+        nextTime = min(update[1] for update in self._updates.values())
+        self._timer.start(max(0, int((nextTime - profiler.clock())*1000)))
+
+    def _tick(self):
+        self.ticks += 1
+        now = profiler.clock()
+        for callback, update in list(self._updates.items()):
+            if update[1] > now + self._slack:
+                continue
+            # The calls are aligned on multiples of their interval, so the
+            # updates with related intervals share the same ticks
+            interval = update[0]
+            update[1] = (math.floor((now + self._slack)/interval) + 1)*interval
+            callback()
+        self._schedule()
+
 class BookmarkPin(QtWidgets.QLabel):
     def __init__(self, text=None, color="#ff0000"):
         super(BookmarkPin, self).__init__(text)        
@@ -103,8 +227,6 @@ class TimeWidget(QtWidgets.QWidget):
     def __init__(self, parent=None):
         super(TimeWidget, self).__init__(parent)
 
-        self.signal = CustomSignal().signal
-
         # Widgets
         self.hour = QtWidgets.QLabel("00:00:00")
         self.hour.setStyleSheet("font-size: 18px;color: lightGrey")
@@ -117,21 +239,81 @@ class TimeWidget(QtWidgets.QWidget):
         self.mainLayout.addWidget(self.date)
         self.setLayout(self.mainLayout)
 
-        # Connections
-        self.signal.connect(self.updateTime)
-
-        # Launch updater thread
-        self.t = threading.Thread(target=utils.emitTimer, args=(self.signal, 1))
-        self.t.setDaemon(True)
-        self.t.start()
-
     def updateTime(self):
-        if sys.version.startswith("3"):
-            now = datetime.datetime.now()
-        else:
-            now = datetime.now()
+        """Called every second by the scheduler of the HUD.
+        """
+        now = datetime.datetime.now()
         self.hour.setText(now.strftime("%H:%M:%S"))
-        self.date.setText(now.strftime("%Y %m %d"))
+        date = now.strftime("%Y %m %d")
+        if date != self.date.text():
+            self.date.setText(date)
+
+class ProfileWidget(QtWidgets.QLabel):
+    """
+    Overlay showing the measures of the profiler and the state of the
+    background jobs of the view, refreshed by the scheduler of the HUD.
+    """
+    sampleSize = 2000 # Above this number of items, the shown ones are counted in a sample
+
+    def __init__(self, view=None):
+        super(ProfileWidget, self).__init__(view)
+        self._view = view
+        self.setStyleSheet("font-family: monospace; color: lightGrey; background-color: rgba(0, 0, 0, 128); padding: 6px;")
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+
+        self._lastTime = 0.0
+        self._lastCounters = {} # Values of the counters at the last refresh, to compute the rates
+        self._sampleOffset = 0 # First item of the sample of the shown items
+
+    def reset(self):
+        self._lastTime = profiler.clock()
+        self._lastCounters = {}
+
+    def _shownText(self, items):
+        """Return the number of shown items. On a big scene it's estimated from a sample of the items,
+        checking them all would cost as much as the frames being measured.
+        """
+        if len(items) <= self.sampleSize:
+            return "{0:6d}".format(sum(1 for item in items if item is not None and item.isVisible()))
+        step = len(items)//self.sampleSize
+        # The sample moves at each refresh, so all the items are seen over time
+        self._sampleOffset = (self._sampleOffset + 1) % step
+        sample = items[self._sampleOffset::step]
+        shown = sum(1 for item in sample if item is not None and item.isVisible())
+        return "~{0:5d}".format(int(shown*len(items)/float(len(sample))))
+
+    def _rate(self, counters, name, elapsed):
+        value = counters[name] - self._lastCounters.get(name, 0)
+        return value/elapsed if elapsed > 0 else 0.0
+
+    def refresh(self):
+        view = self._view
+        current = profiler.current
+        counters = current.counters
+        now = profiler.clock()
+        elapsed = now - self._lastTime
+
+        model = view.model
+        shown = self._shownText(model.items)
+        listing = dirCache.listingCache.stats()
+        sizesCache = view.sizes.cache
+        sizesTotal = sizesCache.hits + sizesCache.misses
+
+        lines = [
+            "frame   {0:6.1f} ms  p90 {1:6.1f} ms  {2:5.0f} fps".format(current.frameTime(50)*1000, current.frameTime(90)*1000, self._rate(counters, "frames", elapsed)),
+            "paints  {0:6.0f} /frame".format(current.paintsPerFrame()),
+            "paths   {0:6.0f} updatePath/s  {1:6.0f} rebuilt/s  {2} pending".format(self._rate(counters, "updatePath", elapsed), view.pathScheduler.rate, view.pathScheduler.pending()),
+            "nodes   {0} shown / {1} total".format(shown, len(model)),
+            "jobs    scan {0}  sizes {1}  layout {2}  index {3}".format(view.scanner.pendingJobs(), view.sizes.pendingJobs(), view.layouter.pendingJobs(), view.preindexer.pendingJobs() if view.preindexer is not None else 0),
+            "cache   listing {0:3.0f}%  sizes {1:3.0f}%".format(listing["hitRate"]*100, float(sizesCache.hits)/sizesTotal*100 if sizesTotal else 0.0),
+        ]
+        if current.isTracing():
+            lines.append("tracing...")
+        self.setText("\n".join(lines))
+        self.adjustSize()
+
+        self._lastTime = now
+        self._lastCounters = dict(counters)
 
 class DriveStates(QtWidgets.QWidget):
     def __init__(self, parent=None):
@@ -0,0 +1,336 @@
+from Qt import QtCore
+import nodeModel
+import math
+
+# Layouts available by name, see register()
+layouts = {}
+
+
+def register(layoutClass):
+    """
+    Make a layout available by its name, in the settings and the context menu.
+    """
+    layouts[layoutClass.name] = layoutClass
+    return layoutClass
+
+
+def create(name, **kwargs):
+    """
+    Return a new layout from its registered name, None for an unknown name.
+    """
+    layoutClass = layouts.get(name)
+    if layoutClass is None:
+        return None
+    return layoutClass(**kwargs)
+
+
+class Tree(object):
+    """
+    Copy of the nodes shown in a subtree: the node and the children of its
+    expanded descendants. It only holds plain Python data, so a layout can
+    be computed in a worker thread while the items keep changing.
+    """
+    def __init__(self, model, rootId):
+        """
+        :param model: The nodeModel.NodeModel of the view
+        :param rootId: Id of the node at the top of the subtree, it stays in place
+        """
+        self.rootId = rootId
+        self.x = model.x[rootId]
+        self.y = model.y[rootId]
+        self.ids = [] # The shown ids, each node before its children
+        self.children = {} # id -> shown children ids
+        self.sizes = {} # id -> (width, height)
+        self.reverted = model.hasFlag(rootId, nodeModel.REVERTED) # The subtree grows to the left
+
+        stack = [rootId]
+        while stack:
+            nodeId = stack.pop()
+            self.ids.append(nodeId)
+            self.sizes[nodeId] = (model.widths[nodeId], model.heights[nodeId])
+            children = model.children[nodeId] if model.hasFlag(nodeId, nodeModel.CHILDREN_VISIBLE) else []
+            self.children[nodeId] = list(children)
+            stack.extend(reversed(children))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Layout(object):
+    """
+    Base class of the layouts. A layout computes the position of every node
+    of a Tree, the top node keeping its position.
+    """
+    name = None
+    label = None # Shown in the context menu
+
+    def __init__(self, hGap=40, vGap=4):
+        """
+        :param hGap: Horizontal space between a node and its children
+        :param vGap: Vertical space between two siblings
+        """
+        self.hGap = hGap
+        self.vGap = vGap
+
+    def compute(self, tree):
+        """
+        Return the {id: (x, y)} positions of the nodes of the tree and the
+        {id: reverted} knob direction of the nodes whose side changes.
+        """
+        raise NotImplementedError
+
+
+class _BlockLayout(Layout):
+    """
+    Place the subtree of each child in a band, the bands of the children are
+    stacked in columns next to their parent.
+    """
+    rows = None # Maximum number of children per column, None for a single column
+    centered = True # Center the parent on the column of its children
+
+    def compute(self, tree):
+        extents = self._extents(tree)
+        direction = -1 if tree.reverted else 1
+        positions = {tree.rootId: (tree.x, tree.y)}
+
+        for nodeId in tree.ids:
+            children = tree.children[nodeId]
+            if not children:
+                continue
+            x, y = positions[nodeId]
+            width, height = tree.sizes[nodeId]
+            columns = self._columns(children)
+            columnX = x + width + self.hGap if direction > 0 else x - self.hGap
+            for column in columns:
+                columnHeight = self._columnHeight(column, extents)
+                if self.centered:
+                    top = y + height/2.0 - columnHeight/2.0
+                else:
+                    top = y
+                columnWidth = 0
+                for childId in column:
+                    childWidth, childHeight = tree.sizes[childId]
+                    subtreeWidth, subtreeHeight = extents[childId]
+                    childY = top + subtreeHeight/2.0 - childHeight/2.0 if self.centered else top
+                    childX = columnX if direction > 0 else columnX - childWidth
+                    positions[childId] = (childX, childY)
+                    top += subtreeHeight + self.vGap
+                    columnWidth = max(columnWidth, subtreeWidth)
+                columnX += direction*(columnWidth + self.hGap)
+        return positions, {}
+
+    def _columns(self, children):
+        if not self.rows:
+            return [children]
+        return [children[i:i+self.rows] for i in range(0, len(children), self.rows)]
+
+    def _columnHeight(self, column, extents):
+        return sum(extents[childId][1] for childId in column) + self.vGap*(len(column) - 1)
+
+    def _extents(self, tree):
+        """
+        Return the {id: (width, height)} size of the subtree of every node, children first.
+        """
+        extents = {}
+        for nodeId in reversed(tree.ids):
+            width, height = tree.sizes[nodeId]
+            children = tree.children[nodeId]
+            if children:
+                columnsWidth = 0
+                columnsHeight = 0
+                columns = self._columns(children)
+                for column in columns:
+                    columnsWidth += max(extents[childId][0] for childId in column)
+                    columnsHeight = max(columnsHeight, self._columnHeight(column, extents))
+                columnsWidth += self.hGap*len(columns)
+                width += columnsWidth
+                height = max(height, columnsHeight)
+            extents[nodeId] = (width, height)
+        return extents
+
+
+@register
+class TidyLayout(_BlockLayout):
+    """
+    Tidy tree: the children of a node in one column, each node vertically
+    centered on its own children, no two subtrees overlapping.
+    """
+    name = "tidy"
+    label = "Tidy tree"
+
+
+@register
+class ColumnsLayout(_BlockLayout):
+    """
+    Compact layout for big folders: the children are split in several
+    columns of a fixed number of rows, aligned on the top of their parent.
+    """
+    name = "columns"
+    label = "Columns"
+    centered = False
+
+    def __init__(self, hGap=40, vGap=4, rows=25):
+        super(ColumnsLayout, self).__init__(hGap, vGap)
+        self.rows = rows
+
+
+@register
+class RadialLayout(Layout):
+    """
+    Place the descendants on circles around the top node, usually a RootNode.
+    Each node gets an angle proportional to its number of leaves, and the
+    nodes on the left of the center get their knobs reverted.
+    """
+    name = "radial"
+    label = "Radial"
+
+    def compute(self, tree):
+        rootId = tree.rootId
+        rootWidth, rootHeight = tree.sizes[rootId]
+        cx = tree.x + rootWidth/2.0
+        cy = tree.y + rootHeight/2.0
+
+        # Number of leaves under each node, and the nodes of each depth
+        leaves = {}
+        depths = {rootId: 0}
+        for nodeId in tree.ids:
+            for childId in tree.children[nodeId]:
+                depths[childId] = depths[nodeId] + 1
+        for nodeId in reversed(tree.ids):
+            children = tree.children[nodeId]
+            leaves[nodeId] = sum(leaves[childId] for childId in children) if children else 1
+
+        # Angle of each node, in the middle of a sector proportional to its number of leaves
+        angles = {}
+        spans = {}
+        sectors = {rootId: -math.pi}
+        for nodeId in tree.ids:
+            start = sectors[nodeId]
+            span = spans.get(nodeId, 2*math.pi)
+            total = float(leaves[nodeId])
+            for childId in tree.children[nodeId]:
+                childSpan = span*leaves[childId]/total
+                sectors[childId] = start
+                spans[childId] = childSpan
+                angles[childId] = start + childSpan/2.0
+                start += childSpan
+
+        # Radius of each ring: far enough from the previous one, and long
+        # enough for each node to fit in the chord of its sector
+        widths = {}
+        minRadii = {}
+        for nodeId in tree.ids[1:]:
+            depth = depths[nodeId]
+            width, height = tree.sizes[nodeId]
+            angle = angles[nodeId]
+            extent = abs(width*math.sin(angle)) + abs(height*math.cos(angle)) + self.vGap
+            chord = 2*math.sin(min(spans[nodeId], math.pi)/2.0)
+            widths[depth] = max(widths.get(depth, 0), width)
+            minRadii[depth] = max(minRadii.get(depth, 0), extent/chord)
+        radii = {}
+        previous = max(rootWidth, rootHeight)/2.0
+        for depth in range(1, len(widths) + 1):
+            radii[depth] = max(previous + self.hGap + widths[depth]/2.0, minRadii[depth])
+            previous = radii[depth] + widths[depth]/2.0
+
+        positions = {rootId: (tree.x, tree.y)}
+        reverted = {}
+        for nodeId in tree.ids[1:]:
+            angle = angles[nodeId]
+            radius = radii[depths[nodeId]]
+            width, height = tree.sizes[nodeId]
+            positions[nodeId] = (cx + radius*math.cos(angle) - width/2.0, cy + radius*math.sin(angle) - height/2.0)
+            reverted[nodeId] = math.cos(angle) < 0
+        return positions, reverted
+
+
+class LayoutSignals(QtCore.QObject):
+    finished = QtCore.Signal(object)
+
+
+class LayoutJob(QtCore.QRunnable):
+    """
+    Compute a layout in a worker thread and send the result back to the GUI thread.
+    """
+    def __init__(self, layout, tree, signals):
+        super(LayoutJob, self).__init__()
+        self.setAutoDelete(False)
+        self.layout = layout
+        self.tree = tree
+        self.signals = signals
+        self.cancelled = False
+        self.positions = None
+        self.reverted = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        if not self.cancelled:
+            self.positions, self.reverted = self.layout.compute(self.tree)
+        self.signals.finished.emit(self)
+
+
+class Layouter(QtCore.QObject):
+    """
+    Run the layouts of the view. The small subtrees are computed right away,
+    the big ones in a worker thread. The callback is always called in the
+    GUI thread, with the tree and the result of the layout.
+    """
+    def __init__(self, parent=None, threadThreshold=2000):
+        """
+        :param parent: Parent QObject of the layouter
+        :param threadThreshold: From this number of nodes, the layout is computed in a worker thread
+        """
+        super(Layouter, self).__init__(parent)
+        self.threadThreshold = threadThreshold
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._jobs = {} # Id of the top node -> (running job, callback)
+
+        self._signals = LayoutSignals(self)
+        self._signals.finished.connect(self._onFinished)
+
+    def run(self, layout, tree, callback):
+        """
+        Compute the layout of a tree and give the result to callback(tree, positions, reverted).
+        A layout still running for the same top node is cancelled.
+
+        Return the LayoutJob running in a worker thread, None if the layout has already been applied.
+
+        :param layout: The Layout to compute
+        :param tree: The Tree of the subtree to place
+        :param callback: Called in the GUI thread with the tree and the result
+        """
+        self.cancel(tree.rootId)
+        if len(tree) < self.threadThreshold:
+            positions, reverted = layout.compute(tree)
+            callback(tree, positions, reverted)
+            return None
+
+        job = LayoutJob(layout, tree, self._signals)
+        self._jobs[tree.rootId] = (job, callback)
+        self._pool.start(job)
+        return job
+
+    def cancel(self, rootId):
+        running = self._jobs.pop(rootId, None)
+        if running is not None:
+            running[0].cancel()
+
+    def cancelAll(self):
+        for rootId in list(self._jobs):
+            self.cancel(rootId)
+
+    def pendingJobs(self):
+        return len(self._jobs)
+
+    def waitForDone(self, msecs=-1):
+        return self._pool.waitForDone(msecs)
+
+    def _onFinished(self, job):
+        running = self._jobs.get(job.tree.rootId)
+        if job.cancelled or running is None or running[0] is not job:
+            return
+        del self._jobs[job.tree.rootId]
+        running[1](job.tree, job.positions, job.reverted)
@@ -1,9 +1,18 @@
 from Qt import QtWidgets, QtGui, QtCore
-import graph, utils
+import graph, utils, dirCache, startup, persistence
 
 class MainWindow(QtWidgets.QWidget):
-    def __init__(self, parent=None):
+    startupFinished = QtCore.Signal() # Sent once the project opened at startup is loaded
+
+    def __init__(self, parent=None, project=None):
+        """
+        Args:
+            parent (QWidget, optional): Parent of the window. Defaults to None.
+            project (str, optional): The project loaded at startup. Defaults to None, the last project if autoloadLastProject is set.
+        """
         super(MainWindow, self).__init__(parent)
+        self._startupProject = project
+        self._starting = True # Until the startup project is loaded
 
         # Init        
         self.resize(500, 500)
@@ -23,6 +32,7 @@ class MainWindow(QtWidgets.QWidget):
         # Widgets
         self._graph = graph.View()
         self.trayBtn = QtWidgets.QPushButton("^^")
+        self.panel = None # Created the first time it's shown, see getPanel()
 
         # Layout
         self.mainLayout = QtWidgets.QVBoxLayout()
@@ -39,13 +49,99 @@ class MainWindow(QtWidgets.QWidget):
 
         self.setLayout(self.mainLayout)
 
-    def show(self):
-        """Add the autoload part (to be sure that the UI already popup and do not break the zoom)
+        # Connections
+        self._graph.hud.trayBtn.clicked.connect(self.togglePanel)
+        self._graph.scene().selectionChanged.connect(self.updatePanel)
+        self._graph.firstFrame.connect(self._startup, QtCore.Qt.QueuedConnection)
+        self._graph.projectShown.connect(self._projectShown)
+        self._graph.projectLoaded.connect(self._projectLoaded)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+F"), self, self.focusFilter)
+
+    def getPanel(self):
+        """Return the file management widgets, created the first time they are needed.
+
+        Returns:
+            fileManager.Panel: The panel
+        """
+        if self.panel is None:
+            import fileManager
+            self.panel = fileManager.Panel(sizes=self._graph.sizes, scanner=self._graph.scanner)
+            self.panel.hide()
+            self.mainLayout.addWidget(self.panel)
+            self._graph.watcher.changed.connect(self.panel.foldersChanged)
+            self.panel.folderActivated.connect(self.selectFolder)
+            self.panel.filterChanged.connect(self._graph.filter)
+        return self.panel
+
+    def togglePanel(self):
+        """Show or hide the file management widgets under the graph.
+        """
+        panel = self.getPanel()
+        panel.setVisible(panel.isHidden())
+        self.updatePanel()
+
+    def updatePanel(self):
+        """Show in the panel the first selected node. Nothing is computed while the panel is hidden.
         """
-        super(MainWindow, self).show()        
-        # Autoload the last project opened
-        if len(utils.settings.recentProjects) > 0 and utils.settings.autoloadLastProject is True:
-            self._graph.load(utils.settings.recentProjects[0])
+        if self.panel is None or self.panel.isHidden():
+            return
+        for item in self._graph.scene().selectedItems():
+            if isinstance(item, graph.nodalItems.BaseNode):
+                if item._path != self.panel.folder():
+                    self.panel.setFolder(item._path)
+                return
+
+    def focusFilter(self):
+        """Show the panel and give the focus to its filter, which also highlights the matching nodes.
+        """
+        if self.panel is None or self.panel.isHidden():
+            self.togglePanel()
+        self.panel.filterInput.setFocus()
+        self.panel.filterInput.selectAll()
+
+    def selectFolder(self, path):
+        """Select the node of a folder activated in the panel, the panel follows the selection.
+        The panel opens the folder itself when it has no node.
+        """
+        nodeId = self._graph.model.find(path)
+        node = self._graph.model.items[nodeId] if nodeId is not None else None
+        if node is None or not node.isVisible():
+            self.panel.setFolder(path)
+            return
+        self._graph.scene().clearSelection()
+        node.setSelected(True)
+        self._graph.centerOn(node)
+
+    def _startup(self):
+        """Load the startup project once the window has painted its first frame, so
+        the window shows up right away and the zoom of the project is not broken.
+        """
+        startup.mark("first frame")
+        project = self._startupProject
+        if project is None and len(utils.settings.recentProjects) > 0 and utils.settings.autoloadLastProject is True:
+            project = utils.settings.recentProjects[0]
+        if project is not None:
+            self._graph.load(project)
+        if self._graph._loader is None:
+            # Nothing to load
+            self._projectShown()
+
+    def _projectShown(self):
+        if self._starting:
+            # Interactive once the event loop is free again
+            QtCore.QTimer.singleShot(0, self._interactive)
+
+    def _interactive(self):
+        startup.mark("interactive")
+        if self._graph._loader is None:
+            self._projectLoaded()
+
+    def _projectLoaded(self):
+        if not self._starting or "interactive" not in startup.elapsed():
+            return
+        self._starting = False
+        startup.mark("loaded")
+        self.startupFinished.emit()
 
     def closeEvent(self, event):
         """
@@ -54,6 +150,11 @@ class MainWindow(QtWidgets.QWidget):
         and also save the position of the software UI.
         """
         utils.settings.geometry = utils.rectToList(self.geometry())
-        utils.settings.save()
+        persistence.writer.save("settings", utils.settings.snapshot, utils.settings.write, utils.settings.saveDelay)
+        if dirCache.listingCache.isDirty():
+            persistence.writer.save("listingCache", lambda: None, lambda data: dirCache.listingCache.save(),
+                                    utils.settings.saveDelay)
+        # The saves still pending are written right now, before the application quits
+        persistence.writer.flush()
         super(MainWindow, self).closeEvent(event)
 
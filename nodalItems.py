@@ -1,80 +1,176 @@
 from Qt import QtWidgets, QtGui, QtCore
-import utils, os, random
+import utils, theme, nodeModel, geometry, profiler, os, random
+
+_fontMetrics = None
+
+def textWidth(text):
+    """
+    Return the width in pixels of a text drawn with the default font.
+    """
+    global _fontMetrics
+    if _fontMetrics is None:
+        _fontMetrics = QtGui.QFontMetrics(QtWidgets.QApplication.font())
+    return _fontMetrics.boundingRect(text).width()
+
+def _flagProperty(flag, doc):
+    """
+    Create a property that read and write a flag of the node in the model.
+    """
+    def getter(self):
+        return bool(self._model.flags[self._id] & flag)
+
+    def setter(self, value):
+        self._model.setFlag(self._id, flag, value)
+
+    return property(getter, setter, doc=doc)
+
 
 class BaseNode(QtWidgets.QGraphicsItem):
-    def __init__(self, path, bgColor="#4f7526", textColor="#ffffff"):
-        self._path = path # The path that reprent this node
+    """
+    Graphics item showing a node of a nodeModel.NodeModel.
+
+    The path, the parent and children links, the position and the flags of
+    the node are stored in the model, the item only keeps what is needed to
+    paint it. It can be destroyed and created again from the model.
+    """
+    _childrenVisibles = _flagProperty(nodeModel.CHILDREN_VISIBLE, "The status of the visibility of the children")
+    _seekChildren = _flagProperty(nodeModel.SEEK_CHILDREN, "If True, when double click on node, the script will look of the subfolder of this node")
+    _reverted = _flagProperty(nodeModel.REVERTED, "Check if the knob input/output have been reverted")
+    _movingSubtree = False # True while moveChildren() moves the descendants of a node
+    _outlineMargin = None # Width of the outline drawn around the nodes, read from the theme by outlineMargin()
+
+    def __init__(self, path, bgColor="#4f7526", textColor="#ffffff", model=None, nodeId=None):
+        """
+        :param path: The path that represent this node
+        :param model: The nodeModel.NodeModel holding the data of the node, a new one if None
+        :param nodeId: Id of an existing node of the model to show, a new node is added if None
+        """
+        if model is None:
+            model = nodeModel.NodeModel()
+        if nodeId is None:
+            nodeId = model.add(path, bgColor=bgColor, textColor=textColor)
+        self._model = model # The tree holding the data of this node
+        self._id = nodeId # Id of this node in the model
         self._inputKnob = QtCore.QPoint() # Position of the input knob
         self._outputKnob = QtCore.QPoint() # Position of the output knob
         self._connections = [] # List of the connections items (the path that link 2 nodes)
-        self._childrenList = [] # List of the childrens of this node
-        self._parent = None # The parent node
         self._rect = None # Represent the rect (the geometry) of this node
         self._sidePadding = 10 # Used to have a space each side of the name
-        self._childrenVisibles = False # The status of the visibilit of the children
-        self._seekChildren = True # If True, when double click on node, the script will look of the subfolder of this node
-        self._reverted = False # Check if the knob input/output have been reverted
+        self._loading = False # True while the sub folders are listed in background
+        self._scanJob = None # The running scan job that list the sub folders
+        self._highlighted = False # True when the folder matches the filter of the view
 
         super(BaseNode, self).__init__()
+        # Restore the position before the flags, the move has not to be propagated
+        self.setPos(model.x[nodeId], model.y[nodeId])
         self.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable)
         self.setFlag(QtWidgets.QGraphicsItem.ItemIsSelectable)
         self.setFlag(QtWidgets.QGraphicsItem.ItemSendsScenePositionChanges, True)
         
-        self.bgColor = bgColor # Background Color
-        self.textColor = textColor # Text color
+        self._palette = theme.palette(self.bgColor) # Shared colors, brushes and pens of the background color
         self.nodeName = os.path.basename(self._path)
 
-        self.colors = []#"#e74f4A", "#F5544E", "#CF4742", "#A83A36", "#692421"]
-        baseColor = QtGui.QColor(self.bgColor).getHsv()
-        for i in range(25, 101, 10):
-            hsv = list(baseColor)
-            hsv[2] = int(i*2.5)
-            variation = QtGui.QColor().fromHsv(*hsv)
-            self.colors.append(variation.name(QtGui.QColor.HexRgb))
-
         # Pen.
         self._pen = QtGui.QPen(QtCore.Qt.NoPen)
 
-        self._selPen = QtGui.QPen(QtCore.Qt.NoPen)
-        self._selPen.setStyle(QtCore.Qt.SolidLine)
-        self._selPen.setWidth(int(utils.getCssValue("node", "border-width")))
-        self._selPen.setColor(utils.getCssValue("node", "border-color"))
-
-        self.defineNodeRect()
+        if model.widths[nodeId] > 0:
+            self._rect = QtCore.QRect(0, 0, int(model.widths[nodeId]), int(model.heights[nodeId]))
+        else:
+            self.defineNodeRect()
+            model.setSize(nodeId, self._rect.width(), self._rect.height())
         self.setKnobsPosition()
+        if self._reverted:
+            self._swapKnobs()
 
-        # self.setCursor(QtCore.Qt.OpenHandCursor)
-
-    def save(self):        
-        result = dict()
-        for attr in ["_path", "bgColor", "textColor", "_childrenVisibles", "_seekChildren", "_reverted"]:
-            result[attr] = getattr(self, attr)
-
-        result["_rect"] = [self._rect.x(), self._rect.y(), self._rect.width(), self._rect.height()]
-
-        result["pos"] = self.pos().toTuple()
-        result["children"] = []
-        for child in self._childrenList:
-            result["children"].append(child.save())
-        return result
-
-    def load(self, data):
-        for attr in ["_path", "bgColor", "textColor", "_childrenVisibles", "_seekChildren", "_reverted"]:
-            if attr in data:
-                setattr(self, attr, data[attr])
+        model.items[nodeId] = self
 
-        self._rect = QtCore.QRect(*data["_rect"])
-        self.setPos(*data["pos"])
-        if self._reverted:
-            self._reverted = False
-            self.invertKnobPositions(False)
+        # self.setCursor(QtCore.Qt.OpenHandCursor)
 
-        for childData in data["children"]:
-            new_node = self.scene().parent().createNode(BranchNode, args=[childData["_path"]])
-            new_node.load(childData)
-            self.scene().parent().connectNodes(self, new_node)
-        
-        self.updateChildrenVisibility()
+    @property
+    def _path(self):
+        return self._model.paths[self._id]
+
+    @property
+    def bgColor(self):
+        return self._model.bgColors[self._id]
+
+    @bgColor.setter
+    def bgColor(self, value):
+        self._model.bgColors[self._id] = value
+        self._model.revision += 1
+        self._palette = theme.palette(value)
+
+    @property
+    def textColor(self):
+        return self._model.textColors[self._id]
+
+    @textColor.setter
+    def textColor(self, value):
+        self._model.textColors[self._id] = value
+        self._model.revision += 1
+
+    @property
+    def _parent(self):
+        """
+        The item of the parent node, None for a seed.
+        """
+        parentId = self._model.parents[self._id]
+        if parentId == -1:
+            return None
+        return self._model.items[parentId]
+
+    @property
+    def _childrenList(self):
+        """
+        The items of the children, the children without item are not listed.
+        """
+        items = self._model.items
+        return [items[childId] for childId in self._model.children[self._id] if items[childId] is not None]
+
+    def record(self):
+        """
+        Return the data of this node, without its children.
+        """
+        return self._model.record(self._id)
+
+    def hasPendingChildren(self):
+        """
+        Return True if some children have not been created because this node was collapsed.
+        """
+        items = self._model.items
+        return any(items[childId] is None for childId in self._model.children[self._id])
+
+    def materializeChildren(self):
+        """
+        Create the items of the children kept in the model while this node was collapsed.
+        """
+        model = self._model
+        pending = [childId for childId in model.children[self._id] if model.items[childId] is None]
+        if not pending:
+            return
+        dx, dy = model.takeOffset(self._id)
+
+        view = self.scene().parent()
+        with view.batch():
+            self._materializeChildren(view, pending, dx, dy)
+
+    def _materializeChildren(self, view, pending, dx, dy):
+        model = self._model
+        for childId in pending:
+            if dx or dy:
+                model.setPos(childId, model.x[childId] + dx, model.y[childId] + dy)
+                if model.children[childId]:
+                    model.addOffset(childId, dx, dy)
+            new_node = view.createItem(childId)
+            view.connectNodes(self, new_node)
+            if new_node._childrenVisibles:
+                new_node.materializeChildren()
+
+    def _swapKnobs(self):
+        _in = self._inputKnob
+        _out = self._outputKnob
+        self._inputKnob = _out
+        self._outputKnob = _in
 
     def invertKnobPositions(self, moveNode=True, affectChildren = True):
         # get delta with dad and apply it again       
@@ -84,17 +180,17 @@ class BaseNode(QtWidgets.QGraphicsItem):
             deltaPos = pos-parentPos
             deltaPos.setX(deltaPos.x()/2.0)
 
-        _in = self._inputKnob
-        _out = self._outputKnob
-        self._inputKnob = _out
-        self._outputKnob = _in
+        self._swapKnobs()
         self._reverted = not self._reverted
         if moveNode:
             deltaInPos = self.getInputPos() - self.pos()
             newPos = parentPos-deltaPos-deltaInPos
             newPos.setY(self.pos().y())
             self.setPos(newPos)
-            
+
+        # The hidden children have to be created to be moved on the other side
+        if self.scene() and self.hasPendingChildren():
+            self.materializeChildren()
         for child in self._childrenList:
             child.invertKnobPositions()
         self.updateConnections()
@@ -109,38 +205,109 @@ class BaseNode(QtWidgets.QGraphicsItem):
         pass
 
     def addChildren(self, node):
-        if not node in self._childrenList:
-            self._childrenList.append(node)
-            node._parent = self
-            
-        self.updateChildrenVisibility()
+        self._model.setParent(node._id, self._id)
+        view = self.scene().parent() if self.scene() else None
+        if view is not None and view.isBatching():
+            view.deferVisibility(node)
+            return
+        # Only the new child and its descendants are affected
+        node.setVisible(self._childrenVisibles and self.isVisible())
+        node.updateChildrenVisibility()
 
     def itemChange(self, change, value):
-        # Revert the knobs position to avoid weird stuff when the node is on the left side of the Root
-        if isinstance(self._parent, RootNode):
-            if self.getCenterPos().x() < self._parent.getCenterPos().x() and not self._reverted:
-                self.invertKnobPositions(False)
-
-            elif self.getCenterPos().x() > self._parent.getCenterPos().x() and self._reverted:
-                self.invertKnobPositions(False)
-        if self.scene():
+        # The descendants moved by moveChildren() are already handled
+        if self.scene() and not BaseNode._movingSubtree:
             if change == QtWidgets.QGraphicsItem.GraphicsItemChange.ItemPositionChange:
                 # Update the position of the children
                 delta = QtCore.QPointF(value) - self.pos()
                 if QtWidgets.QApplication.keyboardModifiers() != QtCore.Qt.AltModifier:
-                    for node in self._childrenList:
-                        node.moveBy(delta.x(), delta.y())
+                    self.moveChildren(delta.x(), delta.y())
 
                 # TODO: unselect the node after the move?
-                
-            # Update the line that connect the nodes
-            self.updateConnections()
+
+            elif change == QtWidgets.QGraphicsItem.GraphicsItemChange.ItemPositionHasChanged:
+                # Revert the knobs position to avoid weird stuff when the node is on the left side of the Root
+                parent = self._parent
+                if isinstance(parent, RootNode):
+                    if self.getCenterPos().x() < parent.getCenterPos().x() and not self._reverted:
+                        self.invertKnobPositions(False)
+
+                    elif self.getCenterPos().x() > parent.getCenterPos().x() and self._reverted:
+                        self.invertKnobPositions(False)
+
+                # Update the line that connect the nodes
+                self.updateConnections()
+
+            elif change == QtWidgets.QGraphicsItem.GraphicsItemChange.ItemScenePositionHasChanged:
+                self._model.setPos(self._id, value.x(), value.y())
+
         return super(BaseNode, self).itemChange(change, value)
 
+    def setPosOnly(self, x, y):
+        """
+        Move this node without moving its children.
+        """
+        BaseNode._movingSubtree = True
+        try:
+            self.setPos(x, y)
+        finally:
+            BaseNode._movingSubtree = False
+        self._model.setPos(self._id, x, y)
+
+    def setReverted(self, reverted):
+        """
+        Put the input knob on the right side when reverted is True, without moving the node.
+        """
+        if reverted != self._reverted:
+            self._swapKnobs()
+            self._reverted = reverted
+            self.updateConnections()
+
+    def moveChildren(self, dx, dy):
+        """
+        Move all the descendants of this node in one pass.
+
+        The descendants don't go through their own itemChange, and the
+        connections inside the subtree are translated instead of being
+        computed again. The connections of this node are updated by its
+        own itemChange.
+        """
+        start = profiler.clock() if profiler.enabled else None
+        model = self._model
+        items = model.items
+        stack = [self._id]
+        BaseNode._movingSubtree = True
+        try:
+            while stack:
+                nodeId = stack.pop()
+                hasPending = False
+                for childId in model.children[nodeId]:
+                    child = items[childId]
+                    if child is None:
+                        hasPending = True
+                        continue
+                    child.setPos(child.x() + dx, child.y() + dy)
+                    model.translate(childId, dx, dy)
+                    if nodeId != self._id:
+                        for connection in child._connections:
+                            if connection._dstNode is child:
+                                connection.translate(dx, dy)
+                    stack.append(childId)
+                if hasPending:
+                    # The children without item follow when they are created
+                    model.addOffset(nodeId, dx, dy)
+        finally:
+            BaseNode._movingSubtree = False
+        if start is not None:
+            profiler.current.span("moveChildren", start)
+
     def updateConnections(self):
+        # Computed once per frame by the scheduler of the view
+        if self.scene():
+            self.scene().parent().pathScheduler.schedule(self._connections)
+            return
         for connection in self._connections:
             connection.updatePath()
-        pass
 
     def getInputPos(self):
         nodePos = self.pos()
@@ -151,14 +318,58 @@ class BaseNode(QtWidgets.QGraphicsItem):
         return nodePos + self._outputKnob
 
     def getCenterPos(self):
-        rect = self.boundingRect()
+        rect = self._rect
         return QtCore.QPointF(self.pos().x() + rect.width()/2.0, self.pos().y() + rect.height()/2.0)
 
+    def highlightPen(self):
+        """
+        Return the shared pen used to outline the nodes matching the filter.
+        """
+        return theme.current.pen("node", "highlight-color", theme.current.px("node", "highlight-width", 2))
+
+    def setHighlighted(self, highlighted):
+        if highlighted != self._highlighted:
+            self._highlighted = highlighted
+            self.update()
+
+    def selectionPen(self, style=QtCore.Qt.SolidLine):
+        """
+        Return the shared pen used to draw the outline of the node.
+        """
+        return theme.current.pen("node", "border-color", theme.current.px("node", "border-width", 1), style)
+
+    @staticmethod
+    def outlineMargin():
+        """
+        Return the width of the outline drawn around the nodes, it's read from the theme once.
+        """
+        if BaseNode._outlineMargin is None:
+            BaseNode._outlineMargin = max(theme.current.px("node", "border-width", 1), theme.current.px("node", "highlight-width", 2))
+        return BaseNode._outlineMargin
+
+    @staticmethod
+    def themeChanged():
+        BaseNode._outlineMargin = None
+
     def boundingRect(self):
-        return QtCore.QRectF(self._rect)
+        # Include the outline drawn around the node, the view only repaints
+        # the area covered by the bounding rect when the node changes
+        margin = BaseNode._outlineMargin
+        if margin is None:
+            margin = self.outlineMargin()
+        return QtCore.QRectF(self._rect).adjusted(-margin, -margin, margin, margin)
 
     def paint(self, painter, option, widget):
-        painter.setRenderHints(QtGui.QPainter.Antialiasing | QtGui.QPainter.TextAntialiasing, True)
+        if profiler.enabled:
+            profiler.current.count("nodePaints")
+        # Level of detail: when zoomed out, the text is unreadable anyway
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < utils.settings.lodNodeThreshold:
+            self.paintSimplified(painter)
+            return
+
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, True)
+        painter.setRenderHint(QtGui.QPainter.TextAntialiasing, True)
 
         painter.setPen(self._pen)
 
@@ -171,26 +382,53 @@ class BaseNode(QtWidgets.QGraphicsItem):
         # Draw the selection of the node
         # Edit the pen when the node is selected  
         if self.isSelected():
-            painter.setPen(self._selPen)
-            painter.setBrush(QtGui.QColor(255, 255, 255, 0))
+            painter.setPen(self.selectionPen())
+            painter.setBrush(QtCore.Qt.NoBrush)
             self.paintSelection(painter)
+        elif self._highlighted:
+            painter.setPen(self.highlightPen())
+            painter.setBrush(QtCore.Qt.NoBrush)
+            self.paintHighlight(painter)
+
+        # Draw the loading state while the sub folders are listed
+        if self._loading:
+            painter.setPen(self.selectionPen(QtCore.Qt.DashLine))
+            painter.setBrush(QtCore.Qt.NoBrush)
+            self.paintLoading(painter)
+
+    def paintSimplified(self, painter):
+        """
+        Draw the node as a plain bar, used under the level of detail threshold.
+        """
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
+        painter.fillRect(self._rect, self._palette.brush)
+        if self.isSelected() or self._highlighted:
+            painter.setPen(self.selectionPen() if self.isSelected() else self.highlightPen())
+            painter.setBrush(QtCore.Qt.NoBrush)
+            painter.drawRect(self._rect)
 
     def paintBackground(self, painter):
         pass
 
     def paintText(self, painter):
-        painter.setPen(QtGui.QColor(self.textColor))
+        painter.setPen(theme.palette(self.textColor).color)
         painter.drawText(self._rect, QtCore.Qt.AlignCenter, self.nodeName)
 
     def paintSelection(self, painter):
-        painter.drawRoundedRect(self.boundingRect(), 3, 3)
+        painter.drawRoundedRect(QtCore.QRectF(self._rect), 3, 3)
+
+    def paintLoading(self, painter):
+        painter.drawRoundedRect(QtCore.QRectF(self._rect), 3, 3)
+
+    def paintHighlight(self, painter):
+        self.paintSelection(painter)
 
     def updateChildrenVisibility(self):
-        for node in self.getChildrens(True):
-            value = node._parent._childrenVisibles
-            if self._childrenVisibles == False:
-                value = False
-            node.setVisible(value)
+        # A child is visible only if its parent is visible and expanded
+        visible = self._childrenVisibles and self.isVisible()
+        for node in self._childrenList:
+            node.setVisible(visible)
+            node.updateChildrenVisibility()
 
     def getChildrens(self, recursive=False):
         result = []
@@ -202,25 +440,108 @@ class BaseNode(QtWidgets.QGraphicsItem):
         return result
 
     def _fillData(self):
-        color = self.bgColor
-        counter = 0
-        for folder in os.listdir(self._path):
-            full_path = os.path.join(self._path, folder)
-            if os.path.isdir(full_path):                
-                if isinstance(self, RootNode):
-                    color = self.colors[random.randint(0, len(self.colors)-1)]
-
-                new_node = self.scene().parent().createNode(BranchNode, args=[full_path, color])
-                new_node.setPos(self.pos())
-                new_node.moveBy(self._rect.width() + 20, 20*counter)
-
-                self.scene().parent().connectNodes(self, new_node)
-                
+        """
+        List the sub folders of this node in background. The children are
+        created by batches as soon as they are found.
+        """
+        view = self.scene().parent()
+        self._loading = True
+        self._scanJob = view.scanner.scan(self._path, self._addFolders, self._fillDataFinished)
+        self.update()
+
+    def _addFolders(self, paths):
+        view = self.scene().parent()
+        model = self._model
+        existing = set(model.paths[childId] for childId in model.children[self._id])
+        counter = len(model.children[self._id])
+        newPaths = []
+        colors = []
+        positions = []
+        for full_path in paths:
+            if full_path in existing:
+                continue
+            color = self.bgColor
+            if isinstance(self, RootNode):
+                variants = self._palette.variants
+                color = variants[random.randint(0, len(variants)-1)]
+
+            newPaths.append(full_path)
+            colors.append(color)
+            positions.append((self.pos().x() + self._rect.width() + 20, self.pos().y() + 20*counter))
+            counter += 1
+
+        start = profiler.clock() if profiler.enabled else None
+        with view.batch():
+            for new_node in view.createChildren(self, newPaths, colors, positions):
                 if self._reverted is True:
                     new_node.invertKnobPositions()
-                counter += 1
-
+        if start is not None:
+            profiler.current.count("createdNodes", len(newPaths))
+            profiler.current.span("addFolders", start, nodes=len(newPaths))
+
+    def _fillDataFinished(self, job):
+        self._scanJob = None
+        self._loading = False
+        if job.error is not None:
+            # Listed again the next time the node is expanded
+            self.update()
+            return
         self._seekChildren = False
+        view = self.scene().parent()
+        view.watchNode(self)
+        if self._childrenVisibles and utils.settings.layout:
+            # Only the subtree of this node is placed again
+            view.layoutNode(self)
+        self.update()
+
+    def refresh(self):
+        """
+        List the sub folders again after a change on the disk: the new ones
+        are added, the removed ones are removed with their subtree, the
+        other children are left untouched.
+        """
+        if self._loading:
+            # The running listing will see the change
+            return
+        view = self.scene().parent()
+        found = []
+        self._loading = True
+        self._scanJob = view.scanner.scan(self._path, found.extend, lambda job: self._refreshFinished(job, found))
+        self.update()
+
+    def _refreshFinished(self, job, found):
+        self._scanJob = None
+        self._loading = False
+        if job.error is not None:
+            self.update()
+            return
+        view = self.scene().parent()
+        found = set(found)
+        model = self._model
+        for childId in list(model.children[self._id]):
+            if model.paths[childId] not in found:
+                view.search.remove([model.paths[nodeId] for nodeId in model.descendants(childId, True)])
+                child = model.items[childId]
+                if child is None:
+                    model.remove(childId)
+                else:
+                    view.removeNode(child)
+        count = len(model.children[self._id])
+        self._addFolders(sorted(found))
+        if len(model.children[self._id]) != count and self._childrenVisibles and utils.settings.layout:
+            view.layoutNode(self)
+        self.update()
+
+    def cancelFillData(self):
+        """
+        Stop the listing of the sub folders. The children already found are kept
+        and the listing will start again the next time the node is expanded.
+        """
+        if self._scanJob is not None and self.scene():
+            self.scene().parent().scanner.cancel(self._scanJob)
+        self._scanJob = None
+        self._loading = False
+        self.update()
 
     def setVisible(self, visible=True):
         super(BaseNode, self).setVisible(visible)
@@ -231,27 +552,43 @@ class BaseNode(QtWidgets.QGraphicsItem):
         if event.button() == QtCore.Qt.MouseButton.RightButton:
             view = self.scene().parent()
             view.rightClickNode = self
+        elif event.button() == QtCore.Qt.MouseButton.LeftButton:
+            self.scene().parent().beginDrag(self)
         super(BaseNode, self).mousePressEvent(event)
 
-    def mouseMoveEvent(self, event):
-        self.updateConnections()
-        super(BaseNode, self).mouseMoveEvent(event)
+    def mouseReleaseEvent(self, event):
+        super(BaseNode, self).mouseReleaseEvent(event)
+        if self.scene():
+            self.scene().parent().endDrag()
 
     def mouseDoubleClickEvent(self, event):
         super(BaseNode, self).mouseDoubleClickEvent(event)
-        if self._seekChildren is True:
-            self._fillData()
         self._childrenVisibles = not self._childrenVisibles
+        view = self.scene().parent()
+        if self._childrenVisibles:
+            self.materializeChildren()
+            view.watchSubtree(self)
+        else:
+            view.unwatchSubtree(self)
+        if self._childrenVisibles and self._seekChildren is True and not self._loading:
+            self._fillData()
+        elif not self._childrenVisibles and self._loading:
+            self.cancelFillData()
         self.updateChildrenVisibility()
 
 
 class ConnectionPath(QtWidgets.QGraphicsPathItem):
+    rebuilds = 0 # Number of paths computed since the start, read by pathScheduler to profile
 
     def __init__(self, srcNode, dstNode):
         super(ConnectionPath, self).__init__()
         self._waveFactor = 5
         self._srcNode = srcNode   
         self._dstNode = dstNode
+        self._p1 = QtCore.QPointF() # Start point of the path, in item coordinates
+        self._p2 = QtCore.QPointF() # End point of the path, in item coordinates
+        # The pen width is used by the bounding rect, it has to match the painted one
+        self.setPen(self._dstNode._palette.connectionPen)
         if not self in self._srcNode._connections:
             self._srcNode._connections.append(self)
         if not self in self._dstNode._connections:
@@ -261,40 +598,71 @@ class ConnectionPath(QtWidgets.QGraphicsPathItem):
 
 
     def paint(self, painter, option, widget):
-        color = QtGui.QColor(self._dstNode.bgColor)
-        p1 = self.path().pointAtPercent(0)
-        p2 = self.path().pointAtPercent(1)
+        if profiler.enabled:
+            profiler.current.count("connectionPaints")
+        palette = self._dstNode._palette
 
-        painter.setRenderHint(painter.Antialiasing, True)
+        # Level of detail: draw a straight line when zoomed out
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < utils.settings.lodConnectionThreshold:
+            painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
+            painter.setPen(palette.linePen)
+            painter.drawLine(self._p1, self._p2)
+            return
 
-        painter.setPen(QtGui.QPen(color, 3, QtCore.Qt.SolidLine))
-        painter.drawPath(self.path())
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, True)
 
-    def updatePath(self):
-        p1 = self._srcNode.getOutputPos()
-        if isinstance(self._srcNode, RootNode):
-            p1 = self._srcNode.getOutputPos(self._dstNode)
-        p2 = self._dstNode.getInputPos()
-        p3 = self._dstNode.getOutputPos()
+        painter.setPen(palette.connectionPen)
+        painter.drawPath(self.path())
 
+    def translate(self, dx, dy):
+        """
+        Move the path without computing it again, when both nodes moved by the same offset.
+        """
+        # The path is in item coordinates, moving the item is much cheaper than setPath
+        self.moveBy(dx, dy)
+
+    def endPoints(self):
+        """
+        Return the output knob of the source node, the input knob of the
+        destination node, and the radius of the source if it's a RootNode
+        (0 otherwise), as expected by geometry.connections().
+        """
+        src = self._srcNode
+        origin = src.getOutputPos()
+        target = self._dstNode.getInputPos()
+        radius = src._r if isinstance(src, RootNode) else 0
+        return (origin.x(), origin.y()), (target.x(), target.y()), radius
+
+    def setCurve(self, start, ctrl1, ctrl2, end):
+        """
+        Set the path from the points computed by geometry.connections(), in scene coordinates.
+        """
+        ConnectionPath.rebuilds += 1
+        # The path is relative to the position of the item, see translate()
+        ox = self.x()
+        oy = self.y()
+        self._p1 = QtCore.QPointF(start[0] - ox, start[1] - oy)
+        self._p2 = QtCore.QPointF(end[0] - ox, end[1] - oy)
         path = QtGui.QPainterPath()
-        dx = (p2.x() - p1.x()) * 0.5
-        dy = p2.y() - p1.y()
-        ctrl1 = QtCore.QPointF(p1.x() + dx, p1.y() + dy * 0)
-        ctrl2 = QtCore.QPointF(p1.x() + dx, p1.y() + dy * 1)
-
-        if isinstance(self._srcNode, RootNode):
-            ctrl1 = ctrl2
-
-        path.moveTo(p1)
-        path.cubicTo(ctrl1, ctrl2, p2)
-        # path.lineTo(p3)
+        path.moveTo(self._p1)
+        path.cubicTo(QtCore.QPointF(ctrl1[0] - ox, ctrl1[1] - oy), QtCore.QPointF(ctrl2[0] - ox, ctrl2[1] - oy), self._p2)
         self.setPath(path)
 
+    def updatePath(self):
+        if profiler.enabled:
+            profiler.current.count("updatePath")
+        origin, target, radius = self.endPoints()
+        # A single connection is faster without NumPy
+        starts, ctrl1, ctrl2, ends = geometry.connections([origin], [target], [radius], useNumpy=False)
+        self.setCurve(starts[0], ctrl1[0], ctrl2[0], ends[0])
+
 
 class RootNode(BaseNode):
-    def __init__(self, name="Root", bgColor="#297286"):
-        super(RootNode, self).__init__(name, bgColor)
+    _font = None # Font of the name, shared by all the seeds
+
+    def __init__(self, name="Root", bgColor="#297286", **kwargs):
+        super(RootNode, self).__init__(name, bgColor, **kwargs)
         self._borderSize = self._rect.width()/10
         self._r = self._rect.width()/2
 
@@ -309,17 +677,17 @@ class RootNode(BaseNode):
 
     def paintBackground(self, painter):
         center = self.getOutputPos() - self.pos()
-        bgColor = QtGui.QColor(self.bgColor)
-        painter.setBrush(QtGui.QBrush(bgColor))
+        palette = self._palette
+        painter.setBrush(palette.brush)
         if self.isSelected():
-            painter.setBrush(QtGui.QBrush(bgColor.lighter()))
+            painter.setBrush(palette.lighterBrush)
 
         for children in self.getChildrens():
             if self._childrenVisibles is True:
                 painter.drawEllipse(self.getOutputPos(children) - self.pos(), self._borderSize, self._borderSize)
 
         painter.drawEllipse(center, self._r, self._r)
-        painter.setBrush(QtGui.QBrush(bgColor.darker()))
+        painter.setBrush(palette.darkerBrush)
         painter.drawEllipse(center, self._r-self._borderSize, self._r-self._borderSize)
 
     def getOutputPos(self, node=None):
@@ -329,31 +697,47 @@ class RootNode(BaseNode):
             
         dest_point = node.getInputPos()
 
-        vec = utils.Vector(dest_point.x()-standard_pos.x(), dest_point.y()-standard_pos.y())
-        vec = utils.Vector(standard_pos.x(), standard_pos.y()) + vec.normalize()*self._r
-        return QtCore.QPointF(*vec.values)
+        # Point of the circle in the direction of the node
+        x, y = geometry.attachPoints([(standard_pos.x(), standard_pos.y())], [(dest_point.x(), dest_point.y())], [self._r], useNumpy=False)[0]
+        return QtCore.QPointF(x, y)
 
     def paintText(self, painter):
-        font = QtGui.QFont()
-        font.setPixelSize(14)  
-        painter.setFont(font)
+        if RootNode._font is None:
+            RootNode._font = QtGui.QFont()
+            RootNode._font.setPixelSize(14)
+        painter.setFont(RootNode._font)
         super(RootNode, self).paintText(painter)
 
     def paintSelection(self, painter):
         return
         painter.drawEllipse(self._rect)
 
+    def paintLoading(self, painter):
+        painter.drawEllipse(self.getOutputPos() - self.pos(), self._r, self._r)
+
+    def paintHighlight(self, painter):
+        self.paintLoading(painter)
+
+    def boundingRect(self):
+        # The knobs of the connections are drawn over the border of the circle
+        return QtCore.QRectF(self._rect).adjusted(-self._borderSize, -self._borderSize, self._borderSize, self._borderSize)
+
+    def paintSimplified(self, painter):
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
+        painter.setPen(QtCore.Qt.NoPen)
+        painter.setBrush(self._palette.brush)
+        painter.drawEllipse(self._rect)
+
 
 class BranchNode(BaseNode):
-    def __init__(self, name="Branch", bgColor="#297286"):
-        super(BranchNode, self).__init__(name, bgColor)
+    def __init__(self, name="Branch", bgColor="#297286", **kwargs):
+        super(BranchNode, self).__init__(name, bgColor, **kwargs)
         self._height = 3
 
 
     def defineNodeRect(self):
-        label = QtWidgets.QLabel(self.nodeName)
         self._rect = QtCore.QRect(0,0,100,20)
-        self._rect.setWidth(label.sizeHint().width() + 2*self._sidePadding)
+        self._rect.setWidth(textWidth(self.nodeName) + 2*self._sidePadding)
 
     def setKnobsPosition(self):
         input_pos = QtCore.QPoint(self._rect.x(), self._rect.height()/2.0)
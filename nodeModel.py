@@ -0,0 +1,361 @@
+from array import array
+
+# Flags of a node
+CHILDREN_VISIBLE = 1 # The node is expanded
+SEEK_CHILDREN = 2 # The sub folders have not been listed yet
+REVERTED = 4 # The input and output knobs are swapped
+
+
+class NodeModel(object):
+    """
+    Compact storage of the tree of folders, indexed by node id.
+
+    The data of every node lives in flat arrays and lists. The graphics items
+    of nodalItems are views over it: a node hidden under a collapsed node has
+    no item, it is created on demand the first time it has to be shown.
+    Walking the tree never goes through Qt.
+    """
+    def __init__(self):
+        self.revision = 0 # Incremented by every change, to know if the tree has to be saved
+        self.clear()
+
+    def clear(self):
+        self.revision += 1
+        self.paths = [] # id -> path of the folder, None when the node has been removed
+        self.parents = array("l") # id -> parent id, -1 for a seed
+        self.children = [] # id -> list of the children ids
+        self.flags = array("B") # id -> CHILDREN_VISIBLE | SEEK_CHILDREN | REVERTED
+        self.x = array("d") # id -> position of the node in the scene
+        self.y = array("d")
+        self.widths = array("d") # id -> size of the node
+        self.heights = array("d")
+        self.bgColors = [] # id -> background color
+        self.textColors = [] # id -> text color
+        self.items = [] # id -> graphics item, None when not created
+        self.offsets = {} # id -> [dx, dy] move not applied yet to its children without item
+        self.bounds = {} # id -> (left, top, right, bottom) of the node and its shown descendants, see subtreeBounds()
+        self._free = [] # Ids of the removed nodes, reused by add()
+        self._pathIds = {} # path -> id of the first node showing this folder, see find()
+
+    def __len__(self):
+        return len(self.paths) - len(self._free)
+
+    def add(self, path, parent=-1, bgColor="#4f7526", textColor="#ffffff", flags=SEEK_CHILDREN, x=0.0, y=0.0, width=0.0, height=0.0):
+        """
+        Add a node and return its id.
+
+        :param path: The folder represented by the node
+        :param parent: Id of the parent node, -1 for none
+        """
+        if self._free:
+            nodeId = self._free.pop()
+            self.paths[nodeId] = path
+            self.parents[nodeId] = parent
+            self.children[nodeId] = []
+            self.flags[nodeId] = flags
+            self.x[nodeId] = x
+            self.y[nodeId] = y
+            self.widths[nodeId] = width
+            self.heights[nodeId] = height
+            self.bgColors[nodeId] = bgColor
+            self.textColors[nodeId] = textColor
+            self.items[nodeId] = None
+        else:
+            nodeId = len(self.paths)
+            self.paths.append(path)
+            self.parents.append(parent)
+            self.children.append([])
+            self.flags.append(flags)
+            self.x.append(x)
+            self.y.append(y)
+            self.widths.append(width)
+            self.heights.append(height)
+            self.bgColors.append(bgColor)
+            self.textColors.append(textColor)
+            self.items.append(None)
+
+        self.revision += 1
+        self._pathIds.setdefault(path, nodeId)
+        if parent != -1:
+            self.children[parent].append(nodeId)
+            self.invalidateBounds(parent)
+        return nodeId
+
+    def setParent(self, nodeId, parent):
+        old = self.parents[nodeId]
+        if old == parent:
+            return
+        self.revision += 1
+        if old != -1:
+            self.children[old].remove(nodeId)
+            self.invalidateBounds(old)
+        self.parents[nodeId] = parent
+        if parent != -1:
+            self.children[parent].append(nodeId)
+            self.invalidateBounds(parent)
+
+    def remove(self, nodeId):
+        """
+        Remove a node and all its descendants.
+
+        :return: The removed ids, parents first
+        """
+        removed = self.descendants(nodeId, True)
+        self.revision += 1
+        self.setParent(nodeId, -1)
+        for removedId in removed:
+            if self._pathIds.get(self.paths[removedId]) == removedId:
+                del self._pathIds[self.paths[removedId]]
+            self.paths[removedId] = None
+            self.children[removedId] = []
+            self.items[removedId] = None
+            self.offsets.pop(removedId, None)
+            self.bounds.pop(removedId, None)
+            self._free.append(removedId)
+        return removed
+
+    def find(self, path):
+        """
+        Return the id of a node showing the given folder, None if there is none.
+        """
+        return self._pathIds.get(path)
+
+    def isValid(self, nodeId):
+        return 0 <= nodeId < len(self.paths) and self.paths[nodeId] is not None
+
+    def descendants(self, nodeId, includeSelf=False):
+        """
+        Return the ids of all the descendants of a node, parents first.
+        """
+        result = [nodeId] if includeSelf else []
+        stack = list(reversed(self.children[nodeId]))
+        while stack:
+            current = stack.pop()
+            result.append(current)
+            stack.extend(reversed(self.children[current]))
+        return result
+
+    def ancestors(self, nodeId):
+        result = []
+        parent = self.parents[nodeId]
+        while parent != -1:
+            result.append(parent)
+            parent = self.parents[parent]
+        return result
+
+    def hasFlag(self, nodeId, flag):
+        return bool(self.flags[nodeId] & flag)
+
+    def setFlag(self, nodeId, flag, value=True):
+        old = self.flags[nodeId]
+        self.revision += 1
+        if value:
+            self.flags[nodeId] |= flag
+        else:
+            self.flags[nodeId] &= ~flag & 0xff
+        if (old ^ self.flags[nodeId]) & CHILDREN_VISIBLE:
+            # The children are shown or hidden
+            self.invalidateBounds(nodeId)
+
+    def setPos(self, nodeId, x, y):
+        self.revision += 1
+        self.x[nodeId] = x
+        self.y[nodeId] = y
+        self.invalidateBounds(nodeId)
+
+    def setSize(self, nodeId, width, height):
+        self.revision += 1
+        self.widths[nodeId] = width
+        self.heights[nodeId] = height
+        self.invalidateBounds(nodeId)
+
+    def translate(self, nodeId, dx, dy):
+        """
+        Move a node that moves with all its descendants. Its cached bounds
+        are moved too, instead of being computed again. The caller has to
+        translate the descendants and to invalidate the bounds of the
+        ancestors of the subtree.
+        """
+        self.revision += 1
+        self.x[nodeId] += dx
+        self.y[nodeId] += dy
+        box = self.bounds.get(nodeId)
+        if box is not None:
+            self.bounds[nodeId] = (box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy)
+
+    def invalidateBounds(self, nodeId):
+        """
+        Forget the cached bounds of a node and of its ancestors.
+        """
+        bounds = self.bounds
+        while nodeId != -1:
+            # The bounds of a parent are computed after the ones of its shown
+            # children, so an ancestor of a node without bounds has none either
+            if bounds.pop(nodeId, None) is None:
+                return
+            nodeId = self.parents[nodeId]
+
+    def subtreeBounds(self, nodeId):
+        """
+        Return the (left, top, right, bottom) box of a node and of the
+        descendants shown under it, the children of an expanded node.
+
+        The boxes are cached and only computed again for the nodes changed
+        since the last call, so the bounds of a whole tree usually cost a
+        dictionary lookup.
+        """
+        bounds = self.bounds
+        box = bounds.get(nodeId)
+        if box is not None:
+            return box
+
+        # Children first, without recursion to support deep trees
+        stack = [(nodeId, False)]
+        while stack:
+            current, childrenDone = stack.pop()
+            if not childrenDone:
+                if current in bounds:
+                    continue
+                stack.append((current, True))
+                if self.flags[current] & CHILDREN_VISIBLE:
+                    for childId in self.children[current]:
+                        if childId not in bounds:
+                            stack.append((childId, False))
+                continue
+
+            left = self.x[current]
+            top = self.y[current]
+            right = left + self.widths[current]
+            bottom = top + self.heights[current]
+            if self.flags[current] & CHILDREN_VISIBLE:
+                for childId in self.children[current]:
+                    childBox = bounds[childId]
+                    if childBox[0] < left:
+                        left = childBox[0]
+                    if childBox[1] < top:
+                        top = childBox[1]
+                    if childBox[2] > right:
+                        right = childBox[2]
+                    if childBox[3] > bottom:
+                        bottom = childBox[3]
+            # Tuples of floats are not tracked by the garbage collector
+            bounds[current] = (left, top, right, bottom)
+        return bounds[nodeId]
+
+    def unionBounds(self, nodeIds):
+        """
+        Return the [left, top, right, bottom] box of several subtrees, None if nodeIds is empty.
+        """
+        result = None
+        for nodeId in nodeIds:
+            box = self.subtreeBounds(nodeId)
+            if result is None:
+                result = list(box)
+                continue
+            result[0] = min(result[0], box[0])
+            result[1] = min(result[1], box[1])
+            result[2] = max(result[2], box[2])
+            result[3] = max(result[3], box[3])
+        return result
+
+    def addOffset(self, nodeId, dx, dy):
+        """
+        Record a move of a node that has to be applied to its children
+        without item, when they are created.
+        """
+        self.revision += 1
+        offset = self.offsets.get(nodeId)
+        if offset is None:
+            self.offsets[nodeId] = [dx, dy]
+        else:
+            offset[0] += dx
+            offset[1] += dy
+
+    def takeOffset(self, nodeId):
+        return self.offsets.pop(nodeId, (0.0, 0.0))
+
+    def snapshot(self):
+        """
+        Return a copy of the data saved in a project file, records() can
+        iterate over it in another thread while this model changes.
+        The items are only kept to know which nodes have one.
+        """
+        copy = NodeModel.__new__(NodeModel)
+        copy.revision = self.revision
+        copy.paths = list(self.paths)
+        copy.parents = array("l", self.parents)
+        copy.children = [list(children) for children in self.children]
+        copy.flags = array("B", self.flags)
+        copy.x = array("d", self.x)
+        copy.y = array("d", self.y)
+        copy.widths = array("d", self.widths)
+        copy.heights = array("d", self.heights)
+        copy.bgColors = list(self.bgColors)
+        copy.textColors = list(self.textColors)
+        copy.items = list(self.items)
+        copy.offsets = dict((nodeId, list(offset)) for nodeId, offset in self.offsets.items())
+        copy.bounds = {}
+        copy._free = list(self._free)
+        copy._pathIds = {}
+        return copy
+
+    def record(self, nodeId, offset=(0.0, 0.0)):
+        """
+        Return the data of a node as saved in a project file, without its children.
+        """
+        flags = self.flags[nodeId]
+        return {
+            "_path": self.paths[nodeId],
+            "bgColor": self.bgColors[nodeId],
+            "textColor": self.textColors[nodeId],
+            "_childrenVisibles": bool(flags & CHILDREN_VISIBLE),
+            "_seekChildren": bool(flags & SEEK_CHILDREN),
+            "_reverted": bool(flags & REVERTED),
+            "_rect": [0, 0, self.widths[nodeId], self.heights[nodeId]],
+            "pos": [self.x[nodeId] + offset[0], self.y[nodeId] + offset[1]],
+        }
+
+    def addRecord(self, record, parent=-1):
+        """
+        Add a node from the data returned by record() and return its id.
+        """
+        flags = 0
+        if record.get("_childrenVisibles"):
+            flags |= CHILDREN_VISIBLE
+        if record.get("_seekChildren", True):
+            flags |= SEEK_CHILDREN
+        if record.get("_reverted"):
+            flags |= REVERTED
+        rect = record.get("_rect", [0, 0, 0, 0])
+        return self.add(record["_path"], parent,
+                        bgColor=record.get("bgColor", "#4f7526"),
+                        textColor=record.get("textColor", "#ffffff"),
+                        flags=flags,
+                        x=record["pos"][0], y=record["pos"][1],
+                        width=rect[2], height=rect[3])
+
+    def records(self, roots):
+        """
+        Iterate over the records of the given seeds and all their descendants,
+        each node after its parent. The ids are renumbered from 0.
+
+        :param roots: Ids of the seeds
+        """
+        nextId = 0
+        stack = [(nodeId, None, (0.0, 0.0)) for nodeId in reversed(roots)]
+        while stack:
+            nodeId, parentId, offset = stack.pop()
+            record = self.record(nodeId, offset)
+            record["id"] = nextId
+            record["parent"] = parentId
+            yield record
+
+            # The children without item have not followed the moves of this node yet
+            pendingOffset = self.offsets.get(nodeId, (0.0, 0.0))
+            for childId in reversed(self.children[nodeId]):
+                if self.items[childId] is None:
+                    childOffset = (offset[0] + pendingOffset[0], offset[1] + pendingOffset[1])
+                else:
+                    childOffset = (0.0, 0.0)
+                stack.append((childId, nextId, childOffset))
+            nextId += 1
@@ -0,0 +1,105 @@
+from Qt import QtCore
+from collections import OrderedDict
+import time
+import nodalItems, geometry, profiler
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+class PathScheduler(QtCore.QObject):
+    """
+    Collect the connections whose path has to be computed again, and
+    update each of them once per frame, from a single timer.
+
+    A node moving several times during a frame, or a subtree whose nodes
+    all invalidate the same connections, only costs one path rebuild per
+    connection.
+    """
+    rateUpdated = QtCore.Signal(float) # Path rebuilds per second, sent every second while profiling
+    numpyThreshold = 64 # Under this number of connections, the plain Python geometry is faster
+
+    def __init__(self, parent=None, interval=16):
+        """
+        Args:
+            parent (QObject, optional): Parent of the scheduler. Defaults to None.
+            interval (int, optional): Time in milliseconds between two updates. Defaults to 16.
+        """
+        super(PathScheduler, self).__init__(parent)
+        self._dirty = OrderedDict() # Connections to update, used as an ordered set
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.flush)
+
+        self.rate = 0.0 # Path rebuilds per second during the last second, while profiling
+        self._profiling = False
+        self._profileStart = 0.0
+        self._profileCount = 0 # Value of ConnectionPath.rebuilds when the last second started
+        self._profileTimer = QtCore.QTimer(self)
+        self._profileTimer.setInterval(1000)
+        self._profileTimer.timeout.connect(self._updateRate)
+
+    def schedule(self, connections):
+        """Mark connections to be updated at the next frame.
+
+        Args:
+            connections (list): nodalItems.ConnectionPath items
+        """
+        for connection in connections:
+            self._dirty[connection] = None
+        if self._dirty and not self._timer.isActive():
+            self._timer.start()
+
+    def pending(self):
+        return len(self._dirty)
+
+    def flush(self):
+        """Update all the scheduled connections now.
+        """
+        self._timer.stop()
+        dirty = self._dirty
+        self._dirty = OrderedDict()
+        # Skip the connections removed from the scene since they were scheduled
+        alive = [connection for connection in dirty if connection.scene() is not None]
+        if not alive:
+            return
+        start = profiler.clock() if profiler.enabled else None
+
+        # The geometry of all the connections is computed at once
+        origins, targets, radii = zip(*[connection.endPoints() for connection in alive])
+        useNumpy = None if len(alive) >= self.numpyThreshold else False
+        starts, ctrl1, ctrl2, ends = geometry.connections(origins, targets, radii, useNumpy)
+        for i, connection in enumerate(alive):
+            connection.setCurve(starts[i], ctrl1[i], ctrl2[i], ends[i])
+        if start is not None:
+            profiler.current.span("updatePaths", start, connections=len(alive))
+
+    def clear(self):
+        """Forget the scheduled connections, used when the items are deleted.
+        """
+        self._timer.stop()
+        self._dirty = OrderedDict()
+
+    def setProfiling(self, enabled):
+        """Measure the path rebuilds and send rateUpdated every second.
+        """
+        self._profiling = enabled
+        self.rate = 0.0
+        self._profileStart = clock()
+        self._profileCount = nodalItems.ConnectionPath.rebuilds
+        if enabled:
+            self._profileTimer.start()
+        else:
+            self._profileTimer.stop()
+
+    def isProfiling(self):
+        return self._profiling
+
+    def _updateRate(self):
+        now = clock()
+        count = nodalItems.ConnectionPath.rebuilds
+        elapsed = now - self._profileStart
+        self.rate = (count - self._profileCount) / elapsed if elapsed > 0 else 0.0
+        self._profileStart = now
+        self._profileCount = count
+        self.rateUpdated.emit(self.rate)
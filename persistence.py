@@ -0,0 +1,149 @@
+"""
+Write the files of the application in a worker thread.
+
+A save is made of two functions: snapshot() copies the data to write, it's
+called in the GUI thread when the save is due, and write(data) writes that
+copy in the worker thread:
+
+    persistence.writer.save("settings", utils.settings.snapshot, utils.settings.write, delay=1000)
+
+The saves of a same key are coalesced: a save requested while another one
+is waiting, or being written, only writes the latest data once.
+"""
+from Qt import QtCore
+from collections import OrderedDict
+import time
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+class WriteSignals(QtCore.QObject):
+    finished = QtCore.Signal(object) # The job
+
+
+class WriteJob(QtCore.QRunnable):
+    """
+    Write the snapshot of a save in a worker thread.
+    """
+    def __init__(self, key, write, data, signals):
+        super(WriteJob, self).__init__()
+        self.setAutoDelete(False)
+        self.key = key
+        self.write = write
+        self.data = data
+        self.error = None # Message of the exception raised by write, if any
+        self.signals = signals
+
+    def run(self):
+        try:
+            self.write(self.data)
+        except Exception as e:
+            self.error = str(e) or e.__class__.__name__
+        self.data = None
+        self.signals.finished.emit(self)
+
+
+class Writer(QtCore.QObject):
+    """
+    Debounce the saves and write them one after the other in a worker thread.
+    """
+    saved = QtCore.Signal(str) # Key of a save once it's written
+    failed = QtCore.Signal(str, str) # Key and error of a save that could not be written
+
+    def __init__(self, parent=None):
+        """
+        Args:
+            parent (QObject, optional): Parent of the writer. Defaults to None.
+        """
+        super(Writer, self).__init__(parent)
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(1) # The files are written in the order of the saves
+        self._pending = OrderedDict() # Key -> (snapshot, write, due time) of the saves not started yet
+        self._jobs = OrderedDict() # Key -> job being written
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._startDue)
+
+        self._signals = WriteSignals(self)
+        self._signals.finished.connect(self._onFinished)
+
+    def save(self, key, snapshot, write, delay=0):
+        """Write a file in background, once no other save of the same key is requested for delay.
+
+        Args:
+            key (str): Identify the file, usually its path
+            snapshot (callable): Return a copy of the data to write, called in the GUI thread
+            write (callable): Write the data returned by snapshot, called in a worker thread
+            delay (int, optional): Time in milliseconds to wait for another save. Defaults to 0.
+        """
+        self._pending[key] = (snapshot, write, clock() + delay/1000.0)
+        self._schedule()
+
+    def flush(self, key=None):
+        """Write right now the pending saves, and wait until they are written.
+
+        Args:
+            key (str, optional): Only write the saves of this key. Defaults to None, all the saves.
+        """
+        self.waitForDone()
+        for pendingKey in list(self._pending):
+            if key is None or pendingKey == key:
+                self._start(pendingKey)
+        self._schedule()
+        self.waitForDone()
+
+    def pending(self):
+        """
+        Returns:
+            list: Keys of the saves waiting or being written
+        """
+        return list(OrderedDict.fromkeys(list(self._jobs) + list(self._pending)))
+
+    def waitForDone(self):
+        """Block until the saves being written are done.
+        """
+        self._pool.waitForDone()
+        for job in list(self._jobs.values()):
+            self._onFinished(job)
+
+    def _schedule(self):
+        # The saves whose previous one is being written wait for it
+        dues = [due for key, (snapshot, write, due) in self._pending.items() if key not in self._jobs]
+        if not dues:
+            self._timer.stop()
+            return
+        self._timer.start(max(0, int((min(dues) - clock())*1000)))
+
+    def _startDue(self):
+        now = clock()
+        for key, (snapshot, write, due) in list(self._pending.items()):
+            if due <= now and key not in self._jobs:
+                self._start(key)
+        self._schedule()
+
+    def _start(self, key):
+        snapshot, write, due = self._pending.pop(key)
+        try:
+            data = snapshot()
+        except Exception as e:
+            print("ERROR: Unable to save {0}: {1}".format(key, e))
+            self.failed.emit(key, str(e))
+            return
+        job = WriteJob(key, write, data, self._signals)
+        self._jobs[key] = job
+        self._pool.start(job)
+
+    def _onFinished(self, job):
+        if self._jobs.get(job.key) is not job:
+            # Already handled by waitForDone()
+            return
+        del self._jobs[job.key]
+        if job.error is None:
+            self.saved.emit(job.key)
+        else:
+            print("ERROR: Unable to save {0}: {1}".format(job.key, job.error))
+            self.failed.emit(job.key, job.error)
+        self._schedule()
+
+
+writer = Writer()
@@ -0,0 +1,343 @@
+"""
+Pre-indexing of the new seeds.
+
+A pool of processes reads the tree of a seed down to a maximum depth or
+number of folders, level by level. The result is written to a compact
+index file and fed to the caches of the application: the listing cache
+used to expand the nodes, the folder cache of the sizes, and the search
+index. The next time the seed is added, the index file is read instead.
+
+The cached entries keep the mtime and the inode of each folder, so an
+entry that is out of date is never used.
+"""
+from Qt import QtCore
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+import utils
+
+try:
+    from os import scandir
+except ImportError:
+    # Python 2.7 without the scandir backport
+    scandir = None
+
+VERSION = 1
+clock = getattr(time, "perf_counter", time.time)
+
+
+def readFolder(path):
+    """
+    Read one folder: the size and the number of the files directly in it,
+    the names of its sub folders, and the names of the links to folders.
+    The links are listed, as the scanner does, but never followed.
+
+    :return: (path, mtime, inode, size, count, folders, links)
+    """
+    stat = os.stat(path)
+    size = 0
+    count = 0
+    folders = []
+    links = []
+    if scandir is None:
+        for name in os.listdir(path):
+            fullPath = os.path.join(path, name)
+            if os.path.isdir(fullPath):
+                (links if os.path.islink(fullPath) else folders).append(name)
+            elif os.path.isfile(fullPath) and not os.path.islink(fullPath):
+                size += os.path.getsize(fullPath)
+                count += 1
+        return path, stat.st_mtime, stat.st_ino, size, count, folders, links
+
+    iterator = scandir(path)
+    try:
+        for entry in iterator:
+            try:
+                if entry.is_dir():
+                    (links if entry.is_symlink() else folders).append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    size += entry.stat(follow_symlinks=False).st_size
+                    count += 1
+            except OSError:
+                continue
+    finally:
+        if hasattr(iterator, "close"):
+            iterator.close()
+    return path, stat.st_mtime, stat.st_ino, size, count, folders, links
+
+
+def readFolders(paths):
+    """
+    Read a list of folders in a worker process, the unreadable ones are skipped.
+    """
+    result = []
+    for path in paths:
+        try:
+            result.append(readFolder(path))
+        except OSError:
+            continue
+    return result
+
+
+def createPool(processes=None):
+    """
+    Return a pool of processes, None if the platform can't start processes.
+
+    The processes are spawned rather than forked: forking the GUI process
+    while its threads are running is not safe.
+    """
+    try:
+        context = multiprocessing.get_context("spawn") if hasattr(multiprocessing, "get_context") else multiprocessing
+        return context.Pool(processes or None)
+    except (OSError, ImportError, NotImplementedError) as error:
+        print("WARNING: Unable to start the indexing processes, the folders are read in a thread: {0}".format(error))
+        return None
+
+
+def crawl(path, pool=None, maxDepth=8, budget=50000, chunkSize=32, progress=None, isCancelled=None):
+    """
+    Read the tree of a folder level by level, the folders of a level being
+    read in parallel by the pool.
+
+    :param path: The folder at the top of the tree
+    :param pool: The pool of processes reading the folders, None to read them in the current thread
+    :param maxDepth: Depth of the deepest folders read, 0 reads only path
+    :param budget: Maximum number of folders read
+    :param chunkSize: Number of folders sent at once to a process
+    :param progress: Called with the number of folders read and the current depth, at most 10 times per second
+    :param isCancelled: Callable returning True when the crawl has to stop
+    :return: The entries of the read folders, see readFolder()
+    """
+    entries = []
+    level = [path]
+    depth = 0
+    nextProgress = clock()
+    while level and depth <= maxDepth and len(entries) < budget:
+        level = level[:budget - len(entries)]
+        chunks = [level[i:i+chunkSize] for i in range(0, len(level), chunkSize)]
+        results = pool.imap_unordered(readFolders, chunks) if pool is not None else (readFolders(chunk) for chunk in chunks)
+        nextLevel = []
+        for result in results:
+            if isCancelled is not None and isCancelled():
+                return entries
+            for entry in result:
+                entries.append(entry)
+                nextLevel.extend(os.path.join(entry[0], name) for name in entry[5])
+            if progress is not None and clock() > nextProgress:
+                progress(len(entries), depth)
+                nextProgress = clock() + 0.1
+        level = nextLevel
+        depth += 1
+    if progress is not None:
+        progress(len(entries), depth - 1)
+    return entries
+
+
+def indexPath(path):
+    """
+    Return the path of the index file of a seed.
+    """
+    key = hashlib.sha1(os.path.normcase(os.path.abspath(path)).encode("utf-8")).hexdigest()
+    return os.path.join(os.path.dirname(utils.settings.path), "indexes", key + ".jsonl.gz")
+
+
+def write(path, entries, fileName=None):
+    """
+    Write the entries of a crawl to a gzipped file, one JSON list per folder,
+    the paths relative to the seed.
+    """
+    fileName = fileName or indexPath(path)
+    folder = os.path.dirname(fileName)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    def writeEntries(output):
+        with gzip.GzipFile(fileobj=output, mode="wb") as f:
+            f.write((json.dumps({"version": VERSION, "root": path, "time": time.time()}) + "\n").encode("utf-8"))
+            for entry in entries:
+                record = [os.path.relpath(entry[0], path)] + list(entry[1:])
+                f.write((json.dumps(record) + "\n").encode("utf-8"))
+
+    # A crawl can always be done again, no backup is kept
+    utils.atomicWrite(fileName, writeEntries, mode="wb")
+    return fileName
+
+
+def read(path, fileName=None):
+    """
+    Return the entries of the index file of a seed, None if there is no valid file.
+    """
+    fileName = fileName or indexPath(path)
+    if not os.path.exists(fileName):
+        return None
+    entries = []
+    try:
+        with gzip.open(fileName, "rb") as f:
+            header = json.loads(f.readline().decode("utf-8"))
+            if header.get("version") != VERSION:
+                return None
+            for line in f:
+                record = json.loads(line.decode("utf-8"))
+                entries.append(tuple([os.path.normpath(os.path.join(path, record[0]))] + record[1:]))
+    except (IOError, OSError, ValueError, EOFError):
+        print("WARNING: Unable to read the index of {0}, it will be rebuilt".format(path))
+        return None
+    return entries
+
+
+def feed(entries, listingCache=None, folderCache=None):
+    """
+    Add the entries of a crawl to the caches of the application.
+
+    :param listingCache: A dirCache.DirectoryCache, filled with the folders and the links
+    :param folderCache: A sizes.FolderCache, filled with the sizes and the folders
+    """
+    for path, mtime, inode, size, count, folders, links in entries:
+        if listingCache is not None:
+            listingCache.set(path, [os.path.join(path, name) for name in folders + links], (mtime, inode))
+        if folderCache is not None:
+            folderCache.store(path, (mtime, inode), size, count, folders)
+
+
+class PreindexSignals(QtCore.QObject):
+    progress = QtCore.Signal(object, int, int)
+    finished = QtCore.Signal(object)
+
+
+class PreindexJob(QtCore.QRunnable):
+    """
+    Crawl a seed, or read its index file, and feed the caches, in a worker
+    thread. The folders themselves are read by a pool of processes.
+    """
+    def __init__(self, path, signals, listingCache, folderCache, processes=None, maxDepth=8, budget=50000, reuse=True):
+        super(PreindexJob, self).__init__()
+        self.setAutoDelete(False)
+        self.path = path
+        self.signals = signals
+        self.listingCache = listingCache
+        self.folderCache = folderCache
+        self.processes = processes
+        self.maxDepth = maxDepth
+        self.budget = budget
+        self.reuse = reuse
+        self.cancelled = False
+        self.entries = None
+        self.fromFile = False # True when the entries have been read from the index file
+
+    def cancel(self):
+        self.cancelled = True
+
+    def isCancelled(self):
+        return self.cancelled
+
+    def run(self):
+        entries = read(self.path) if self.reuse else None
+        if entries is not None:
+            self.fromFile = True
+        else:
+            pool = createPool(self.processes)
+            try:
+                entries = crawl(self.path, pool, self.maxDepth, self.budget,
+                                progress=lambda count, depth: self.signals.progress.emit(self, count, depth),
+                                isCancelled=self.isCancelled)
+            finally:
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+            if not self.cancelled:
+                try:
+                    write(self.path, entries)
+                except (IOError, OSError) as error:
+                    print("WARNING: Unable to write the index of {0}: {1}".format(self.path, error))
+
+        if not self.cancelled:
+            feed(entries, self.listingCache, self.folderCache)
+            self.entries = entries
+        self.signals.finished.emit(self)
+
+
+class Preindexer(QtCore.QObject):
+    """
+    Pre-index the seeds in background, one at a time.
+
+    progress is sent with the seed, the number of folders read and the
+    current depth. finished is sent with the seed and the paths of all the
+    indexed folders, once the caches are filled.
+    """
+    progress = QtCore.Signal(str, int, int)
+    finished = QtCore.Signal(str, object)
+
+    def __init__(self, parent=None, listingCache=None, folderCache=None, processes=None, maxDepth=8, budget=50000):
+        """
+        Args:
+            parent (QObject, optional): Parent of the preindexer. Defaults to None.
+            listingCache (dirCache.DirectoryCache, optional): Cache of the listings to fill. Defaults to None.
+            folderCache (sizes.FolderCache, optional): Cache of the sizes to fill. Defaults to None.
+            processes (int, optional): Number of processes reading the folders. Defaults to None, one per CPU.
+            maxDepth (int, optional): Depth of the deepest folders read under a seed. Defaults to 8.
+            budget (int, optional): Maximum number of folders read per seed. Defaults to 50000.
+        """
+        super(Preindexer, self).__init__(parent)
+        self.listingCache = listingCache
+        self.folderCache = folderCache
+        self.processes = processes
+        self.maxDepth = maxDepth
+        self.budget = budget
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._jobs = {} # Seed -> running job
+
+        self._signals = PreindexSignals(self)
+        self._signals.progress.connect(self._onProgress)
+        self._signals.finished.connect(self._onFinished)
+
+    def run(self, path, reuse=True):
+        """Start to index a seed.
+
+        Args:
+            path (str): The folder of the seed
+            reuse (bool, optional): Read the index file of the seed if there is one. Defaults to True.
+
+        Returns:
+            PreindexJob: The job, already running if the seed was being indexed
+        """
+        job = self._jobs.get(path)
+        if job is not None:
+            return job
+        job = PreindexJob(path, self._signals, self.listingCache, self.folderCache,
+                          self.processes, self.maxDepth, self.budget, reuse)
+        self._jobs[path] = job
+        self._pool.start(job)
+        return job
+
+    def cancel(self, path):
+        job = self._jobs.pop(path, None)
+        if job is not None:
+            job.cancel()
+
+    def cancelAll(self):
+        for path in list(self._jobs):
+            self.cancel(path)
+
+    def isRunning(self, path):
+        return path in self._jobs
+
+    def pendingJobs(self):
+        return len(self._jobs)
+
+    def waitForDone(self, msecs=-1):
+        return self._pool.waitForDone(msecs)
+
+    def _onProgress(self, job, count, depth):
+        if self._jobs.get(job.path) is job:
+            self.progress.emit(job.path, count, depth)
+
+    def _onFinished(self, job):
+        if self._jobs.get(job.path) is not job:
+            return
+        del self._jobs[job.path]
+        if not job.cancelled:
+            self.finished.emit(job.path, [entry[0] for entry in job.entries])
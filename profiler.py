@@ -0,0 +1,172 @@
+"""
+Measure the hot paths of the graph: the frames, the paints, the path
+updates, and optionally record a timed trace of them for offline analysis.
+
+The hooks placed in the hot paths only read the module flag `enabled`
+when the profiler is off:
+
+    if profiler.enabled:
+        profiler.current.count("nodePaints")
+
+The trace is written in the Trace Event Format, it can be opened with
+chrome://tracing or https://ui.perfetto.dev.
+"""
+from Qt import QtCore
+from collections import defaultdict, deque
+import json
+import os
+import time
+import utils
+
+clock = getattr(time, "perf_counter", time.time)
+
+enabled = False # Read by the hooks, True while the profiler measures or records a trace
+
+
+class Profiler(QtCore.QObject):
+    """
+    Counters and frame times of the graph, and the trace being recorded.
+    """
+    traceWritten = QtCore.Signal(str) # Path of the trace file, once a trace is written
+
+    def __init__(self, parent=None, frames=120, maxEvents=200000):
+        """
+        Args:
+            parent (QObject, optional): Parent of the profiler. Defaults to None.
+            frames (int, optional): Number of frames kept to compute the frame time. Defaults to 120.
+            maxEvents (int, optional): Maximum number of events recorded in a trace. Defaults to 200000.
+        """
+        super(Profiler, self).__init__(parent)
+        self.counters = defaultdict(int) # Name -> count since the profiler was enabled
+        self.frames = deque(maxlen=frames) # (duration in seconds, paints) of the last frames
+        self.maxEvents = maxEvents
+        self._measuring = False
+        self._frameStart = 0.0
+        self._framePaints = 0 # Value of the paints counters when the frame started
+        self._trace = None # Events of the trace being recorded
+        self._traceStart = 0.0
+        self._traceFile = None
+        self._traceTimer = None
+
+    def setEnabled(self, enabled):
+        """Start or stop measuring, the counters start again from 0.
+        A trace being recorded keeps the hooks enabled until it's written.
+        """
+        self._measuring = enabled
+        self.reset()
+        self._updateFlag()
+
+    def isEnabled(self):
+        return self._measuring
+
+    def reset(self):
+        self.counters = defaultdict(int)
+        self.frames.clear()
+
+    def _updateFlag(self):
+        global enabled
+        enabled = self._measuring or self._trace is not None
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def beginFrame(self):
+        self._frameStart = clock()
+        self._framePaints = self.counters["nodePaints"] + self.counters["connectionPaints"]
+
+    def endFrame(self):
+        end = clock()
+        paints = self.counters["nodePaints"] + self.counters["connectionPaints"] - self._framePaints
+        self.frames.append((end - self._frameStart, paints))
+        self.counters["frames"] += 1
+        self.span("frame", self._frameStart, end, paints=paints)
+
+    def span(self, name, start, end=None, **args):
+        """Record an event of the trace, between two clock() times.
+        Nothing is done when no trace is being recorded.
+        """
+        trace = self._trace
+        if trace is None or len(trace) >= self.maxEvents:
+            return
+        end = clock() if end is None else end
+        event = {"name": name, "ph": "X", "pid": 0, "tid": 0,
+                 "ts": (start - self._traceStart)*1e6, "dur": (end - start)*1e6}
+        if args:
+            event["args"] = args
+        trace.append(event)
+
+    def frameTime(self, percent=50):
+        """Return a percentile of the duration of the last frames, in seconds.
+        """
+        if not self.frames:
+            return 0.0
+        durations = sorted(duration for duration, paints in self.frames)
+        return durations[min(len(durations) - 1, int(len(durations)*percent/100.0))]
+
+    def paintsPerFrame(self):
+        if not self.frames:
+            return 0.0
+        return sum(paints for duration, paints in self.frames)/float(len(self.frames))
+
+    def startTrace(self, fileName=None, duration=None):
+        """Record the events of the hot paths, and write them once the duration is elapsed.
+
+        Args:
+            fileName (str, optional): The trace file. Defaults to a new file in the traces folder, next to the settings.
+            duration (float, optional): Time in seconds before the trace is written. Defaults to None, see stopTrace().
+
+        Returns:
+            str: The path of the trace file
+        """
+        if fileName is None:
+            fileName = os.path.join(os.path.dirname(utils.settings.path), "traces",
+                                    time.strftime("trace_%Y%m%d_%H%M%S.json"))
+        self._trace = []
+        self._traceStart = clock()
+        self._traceFile = fileName
+        self._updateFlag()
+        if duration is not None:
+            if self._traceTimer is None:
+                self._traceTimer = QtCore.QTimer(self)
+                self._traceTimer.setSingleShot(True)
+                self._traceTimer.timeout.connect(self.stopTrace)
+            self._traceTimer.start(int(duration*1000))
+        return fileName
+
+    def isTracing(self):
+        return self._trace is not None
+
+    def stopTrace(self):
+        """Write the recorded trace to its file.
+
+        Returns:
+            str: The path of the written file, None if no trace was recorded or it can't be written
+        """
+        if self._trace is None:
+            return None
+        if self._traceTimer is not None:
+            self._traceTimer.stop()
+        trace = self._trace
+        fileName = self._traceFile
+        self._trace = None
+        self._traceFile = None
+        self._updateFlag()
+
+        data = {"traceEvents": trace, "displayTimeUnit": "ms",
+                "otherData": {"version": utils.__version__, "counters": dict(self.counters)}}
+        try:
+            folder = os.path.dirname(fileName)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            with open(fileName, "w") as f:
+                json.dump(data, f)
+        except (IOError, OSError) as error:
+            print("ERROR: Unable to write the trace {0}: {1}".format(fileName, error))
+            return None
+        if len(trace) >= self.maxEvents:
+            print("WARNING: The trace {0} is truncated to {1} events".format(fileName, self.maxEvents))
+        self.traceWritten.emit(fileName)
+        return fileName
+
+
+current = Profiler()
@@ -0,0 +1,219 @@
+from Qt import QtCore
+import json
+import time
+import utils
+
+FORMAT = "browser"
+VERSION = 2
+SCENE_POS = [-500, -500, 1000, 1000] # Area shown by a project saved without it
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+class ProjectError(Exception):
+    pass
+
+
+def write(path, scenePos, records, backups=0):
+    """
+    Write a project file, one node after the other.
+
+    The file starts with a header line, then each line is the JSON record of
+    one node. A node is always written after its parent, and refers to it
+    with its "parent" id (None for the seeds).
+
+    The file is replaced atomically, a crash never leaves it half written.
+
+    :param path: The .browser file to write
+    :param scenePos: The visible area of the scene [x, y, w, h]
+    :param records: Iterable of the node records, parents first
+    :param backups: Number of previous versions of the file kept, see utils.atomicWrite()
+    """
+    header = {"format": FORMAT, "version": VERSION, "scenePos": scenePos}
+
+    def writeRecords(f):
+        f.write(json.dumps(header) + "\n")
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    utils.atomicWrite(path, writeRecords, backups)
+
+
+def read(path):
+    """
+    Open a project file and return its header and an iterator on its records.
+
+    The records are parsed lazily, while the iterator is consumed. The old
+    nested format (version 1) is read at once and converted into records.
+
+    :param path: The .browser file to read
+    """
+    f = open(path, "r")
+    firstLine = f.readline()
+    try:
+        header = json.loads(firstLine)
+    except ValueError:
+        header = None
+
+    if isinstance(header, dict) and header.get("format") == FORMAT:
+        if header.get("version", 0) > VERSION:
+            f.close()
+            raise ProjectError("The project {0} has been saved by a newer version".format(path))
+        header["scenePos"] = _scenePos(header.get("scenePos"))
+        return header, _readRecords(f, path)
+
+    # Version 1: a single indented JSON document with nested children
+    f.seek(0)
+    try:
+        content = json.load(f)
+    except ValueError as e:
+        raise ProjectError("The project {0} is not valid: {1}".format(path, e))
+    finally:
+        f.close()
+    if not isinstance(content, dict) or not isinstance(content.get("nodes"), list):
+        raise ProjectError("The project {0} is not valid: no list of nodes".format(path))
+    header = {"format": FORMAT, "version": 1, "scenePos": _scenePos(content.get("scenePos"))}
+    return header, migrate(content["nodes"], path)
+
+
+def _scenePos(value):
+    """
+    Return the shown area of a header, SCENE_POS when it's missing or invalid.
+    """
+    if isinstance(value, list) and len(value) == 4 and all(isinstance(v, (int, float)) for v in value):
+        return value
+    return list(SCENE_POS)
+
+
+def _isValid(record):
+    return isinstance(record, dict) and all(key in record for key in ("_path", "pos"))
+
+
+def _warnSkipped(path, skipped):
+    print("WARNING: {0} invalid records of the project {1} have been skipped with their subtree, {2}".format(
+        len(skipped), path, ", ".join(str(item) for item in skipped[:10]) + (", ..." if len(skipped) > 10 else "")))
+
+
+def _readRecords(f, path):
+    """
+    Parse the records of a file one line at a time. A corrupt line, e.g. the
+    end of a file truncated by a crash, is skipped with its subtree: its
+    children refer to a parent that is never added.
+    """
+    skipped = []
+    with f:
+        for number, line in enumerate(f, 2):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not _isValid(record) or "id" not in record or "parent" not in record:
+                skipped.append("line {0}".format(number))
+                continue
+            yield record
+    if skipped:
+        _warnSkipped(path, skipped)
+
+
+def migrate(nodes, path=None):
+    """
+    Convert the nested node dicts of the version 1 into flat records.
+    An invalid node is skipped with its children.
+
+    :param nodes: The list of the seed dicts, with their "children"
+    :param path: The project file, for the warning about the skipped nodes
+    """
+    nextId = 0
+    skipped = []
+    stack = [(data, None) for data in reversed(nodes)]
+    while stack:
+        data, parentId = stack.pop()
+        if not _isValid(data) or not isinstance(data.get("children", []), list):
+            skipped.append(data.get("_path", "node") if isinstance(data, dict) else "node")
+            continue
+        record = dict((k, v) for k, v in data.items() if k != "children")
+        record["id"] = nextId
+        record["parent"] = parentId
+        yield record
+        for childData in reversed(data.get("children", [])):
+            stack.append((childData, nextId))
+        nextId += 1
+    if skipped:
+        _warnSkipped(path, skipped)
+
+
+class Loader(QtCore.QObject):
+    """
+    Consume an iterator of records in the event loop, a time slice per
+    tick, so the window stays interactive while a project is loading.
+    """
+    finished = QtCore.Signal()
+
+    def __init__(self, records, callback, parent=None, budget=0.015, batch=None):
+        """
+        Args:
+            records (iterator): The records to consume
+            callback (callable): Called with each record
+            parent (QObject, optional): Parent of the loader. Defaults to None.
+            budget (float, optional): Time in seconds spent per tick. Defaults to 0.015.
+            batch (callable, optional): Return a context manager wrapping each tick. Defaults to None.
+        """
+        super(Loader, self).__init__(parent)
+        self._records = records
+        self._callback = callback
+        self._budget = budget
+        self._batch = batch
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._tick)
+        self.count = 0
+
+    def start(self):
+        self._timer.start()
+
+    def isRunning(self):
+        return self._records is not None
+
+    def cancel(self):
+        self._timer.stop()
+        self._records = None
+
+    def finish(self):
+        """
+        Consume all the remaining records right now.
+        """
+        self._timer.stop()
+        self._consume(None)
+
+    def _tick(self):
+        self._consume(self._budget)
+
+    def _consumeRecords(self, budget):
+        """
+        Give the records to the callback until the budget is spent.
+        Return True when all the records have been consumed.
+        """
+        end = clock() + budget if budget is not None else None
+        for record in self._records:
+            self._callback(record)
+            self.count += 1
+            if end is not None and clock() > end:
+                return False
+        return True
+
+    def _consume(self, budget):
+        if self._records is None:
+            return
+        if self._batch is not None:
+            with self._batch():
+                done = self._consumeRecords(budget)
+        else:
+            done = self._consumeRecords(budget)
+        if not done:
+            return
+        self._timer.stop()
+        self._records = None
+        self.finished.emit()
@@ -0,0 +1,199 @@
+from Qt import QtCore
+import os
+
+try:
+    from os import scandir
+except ImportError:
+    # Python 2.7 without the scandir backport
+    scandir = None
+
+
+def listDirectories(path, isCancelled=None):
+    """
+    Yield the full path of every sub folder of the given path.
+
+    Use os.scandir when available so the d_type cached by the OS is used
+    instead of doing one stat per entry.
+
+    :param path: The folder to list
+    :param isCancelled: Callable returning True when the listing has to stop
+    """
+    if scandir is None:
+        for name in os.listdir(path):
+            if isCancelled is not None and isCancelled():
+                return
+            fullPath = os.path.join(path, name)
+            if os.path.isdir(fullPath):
+                yield fullPath
+        return
+
+    iterator = scandir(path)
+    try:
+        for entry in iterator:
+            if isCancelled is not None and isCancelled():
+                return
+            try:
+                if entry.is_dir():
+                    yield entry.path
+            except OSError:
+                continue
+    finally:
+        if hasattr(iterator, "close"):
+            iterator.close()
+
+
+class ScanSignals(QtCore.QObject):
+    batchReady = QtCore.Signal(object, object)
+    finished = QtCore.Signal(object)
+
+
+class ScanJob(QtCore.QRunnable):
+    """
+    List the sub folders of a path in a worker thread and send them back
+    by batches to the GUI thread.
+
+    When a DirectoryCache is given, an unchanged folder is read from it
+    instead of being listed again.
+    """
+    def __init__(self, path, signals, batchSize=64, cache=None):
+        super(ScanJob, self).__init__()
+        self.setAutoDelete(False)
+        self.path = path
+        self.signals = signals
+        self.batchSize = batchSize
+        self.cache = cache
+        self.cancelled = False
+        self.error = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def isCancelled(self):
+        return self.cancelled
+
+    def run(self):
+        batch = []
+        try:
+            if self.cache is not None:
+                folders = self.cache.get(self.path)
+                if folders is not None:
+                    for start in range(0, len(folders), self.batchSize):
+                        if self.cancelled:
+                            break
+                        self.signals.batchReady.emit(self, folders[start:start+self.batchSize])
+                    self.signals.finished.emit(self)
+                    return
+                signature = self.cache.signature(self.path)
+
+            found = []
+            for fullPath in listDirectories(self.path, self.isCancelled):
+                batch.append(fullPath)
+                found.append(fullPath)
+                if len(batch) >= self.batchSize:
+                    self.signals.batchReady.emit(self, batch)
+                    batch = []
+
+            if self.cache is not None and not self.cancelled:
+                self.cache.set(self.path, found, signature)
+        except OSError as e:
+            self.error = e
+
+        if batch and not self.cancelled:
+            self.signals.batchReady.emit(self, batch)
+        self.signals.finished.emit(self)
+
+
+class CacheLoadJob(QtCore.QRunnable):
+    """
+    Read the file of a DirectoryCache in a worker thread. The listings
+    needing the cache meanwhile wait for it in their own thread.
+    """
+    def __init__(self, cache):
+        super(CacheLoadJob, self).__init__()
+        self.setAutoDelete(False)
+        self.cache = cache
+
+    def run(self):
+        self.cache.load()
+
+
+class Scanner(QtCore.QObject):
+    """
+    Dispatch the directory listings to a pool of worker threads.
+
+    The callbacks are always called in the GUI thread, so they can safely
+    create the graphics items. Every batch is also sent by the listed
+    signal, to index the folders.
+    """
+    listed = QtCore.Signal(object)
+
+    def __init__(self, parent=None, maxThreads=4, cache=None):
+        super(Scanner, self).__init__(parent)
+        self.cache = cache
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(maxThreads)
+        self._jobs = {} # Running job -> (onBatch, onFinished)
+        self._cacheJob = None # Reads the cache file, see preloadCache()
+
+        self._signals = ScanSignals(self)
+        self._signals.batchReady.connect(self._onBatchReady)
+        self._signals.finished.connect(self._onFinished)
+
+    def scan(self, path, onBatch, onFinished=None, batchSize=64):
+        """Start to list the sub folders of path in the worker pool.
+
+        Args:
+            path (str): The folder to list
+            onBatch (callable): Called with a list of folder paths each time a batch is ready
+            onFinished (callable, optional): Called with the job once the listing is over. Defaults to None.
+            batchSize (int, optional): Number of paths sent to onBatch at once. Defaults to 64.
+
+        Returns:
+            ScanJob: The job, that can be given to cancel()
+        """
+        job = ScanJob(path, self._signals, batchSize, self.cache)
+        self._jobs[job] = (onBatch, onFinished)
+        self._pool.start(job)
+        return job
+
+    def preloadCache(self):
+        """Read the cache file in the worker pool, before the first listing needs it.
+        """
+        if self.cache is None or self._cacheJob is not None:
+            return
+        self._cacheJob = CacheLoadJob(self.cache)
+        self._pool.start(self._cacheJob)
+
+    def cancel(self, job):
+        """Stop a running job. Its callbacks will not be called anymore.
+        """
+        if job is None:
+            return
+        job.cancel()
+        self._jobs.pop(job, None)
+
+    def cancelAll(self):
+        for job in list(self._jobs):
+            self.cancel(job)
+
+    def pendingJobs(self):
+        return len(self._jobs)
+
+    def waitForDone(self, msecs=-1):
+        return self._pool.waitForDone(msecs)
+
+    def _onBatchReady(self, job, batch):
+        if job.cancelled or job not in self._jobs:
+            return
+        self.listed.emit(batch)
+        onBatch = self._jobs[job][0]
+        onBatch(batch)
+
+    def _onFinished(self, job):
+        callbacks = self._jobs.pop(job, None)
+        if job.cancelled or callbacks is None:
+            return
+        if job.error is not None:
+            print("ERROR: Unable to list {0}: {1}".format(job.path, job.error))
+        if callbacks[1] is not None:
+            callbacks[1](job)
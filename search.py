@@ -0,0 +1,366 @@
+"""
+Filter engine: an index of the names of every folder scanned by the
+application, and the queries run on it while the user types.
+
+A query is a substring by default, a glob when it contains *, ? or [, and
+a fuzzy match (the letters in this order, anything between them) when it
+starts with ~. The case is ignored.
+"""
+from Qt import QtCore
+from array import array
+import bisect
+import os
+import re
+import time
+
+SUBSTRING = "substring"
+GLOB = "glob"
+FUZZY = "fuzzy"
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+def parseQuery(text):
+    """
+    Return the (mode, pattern) of a query typed by the user, the pattern in lowercase.
+    """
+    text = text.lower()
+    if text.startswith("~"):
+        return FUZZY, text[1:]
+    if any(char in text for char in "*?["):
+        return GLOB, text
+    return SUBSTRING, text
+
+
+def regex(mode, pattern):
+    """
+    Return a regular expression finding a pattern in a name. It only uses
+    the syntax shared by the re module, QRegularExpression and QRegExp, and
+    never crosses a line, so it can run on many names joined by new lines.
+
+    :param mode: SUBSTRING, GLOB or FUZZY
+    :param pattern: The lowercase pattern
+    """
+    if mode == SUBSTRING:
+        return _escape(pattern)
+    if mode == FUZZY:
+        # "[^b]*b" instead of ".*b", so a failing match never backtracks
+        result = [_escape(char) if i == 0 else "[^{0}\\n]*{1}".format(_escapeInSet(char), _escape(char)) for i, char in enumerate(pattern)]
+        return "".join(result)
+
+    # A glob matches the whole name
+    result = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        i += 1
+        if char == "*":
+            result.append(".*")
+        elif char == "?":
+            result.append(".")
+        elif char == "[" and pattern.find("]", i + 1) != -1:
+            # A "]" right after the "[" is part of the set, as for fnmatch
+            end = pattern.find("]", i + 1)
+            content = pattern[i:end].replace("\\", "\\\\").replace("[", "\\[")
+            i = end + 1
+            if content.startswith("!"):
+                content = "^\\n" + content[1:]
+            elif content.startswith("^"):
+                content = "\\" + content
+            result.append("[" + content + "]")
+        else:
+            result.append(_escape(char))
+    return "^" + "".join(result) + "$"
+
+
+def _escape(text):
+    # re.escape of Python 2 escapes the letters too, which QRegExp does not accept
+    return "".join("\\" + char if char in ".^$*+?{}[]\\|()" else char for char in text)
+
+
+def _escapeInSet(char):
+    return "\\" + char if char in "^-]\\" else char
+
+
+def _literals(pattern):
+    """
+    Return the parts of a glob without wildcard, the longest first.
+    """
+    parts = re.split(r"\*|\?|\[[^\]]*\]", pattern)
+    return sorted(parts, key=len, reverse=True)
+
+
+class PathIndex(object):
+    """
+    Names of the scanned folders, indexed by trigram.
+
+    Adding a folder only stores it, its name is indexed later by update(),
+    usually called in idle time. The names waiting for update() are checked
+    one by one by the queries.
+
+    A substring query, and a glob with a literal part of at least 3
+    characters, only check the names sharing the rarest of its trigrams.
+    The other queries run a regular expression on all the names joined in
+    one string.
+
+    A removed folder keeps its id and its indexed name, the queries skip it.
+    """
+    def __init__(self):
+        self.paths = [] # Id -> full path, None once removed
+        self.names = [] # Id -> lowercase folder name
+        self._ids = {} # Full path -> id
+        self._trigrams = {} # Trigram -> array of the ids of the indexed names containing it
+        self._indexed = 0 # The names before this id are indexed
+        self._parts = [] # The indexed names joined by new lines, by slices, see _joined()
+        self._blob = "" # The joined parts
+        self._offsets = array("l") # Id -> offset of its name in the joined names
+        self._size = 0 # Size of the joined names
+        self._removed = 0 # Number of removed ids
+
+    def __len__(self):
+        return len(self.paths) - self._removed
+
+    def add(self, paths):
+        """
+        Store new folders, the already known ones are skipped.
+        """
+        ids = self._ids
+        for path in paths:
+            if path in ids:
+                continue
+            ids[path] = len(self.paths)
+            self.paths.append(path)
+            self.names.append(os.path.basename(path.rstrip("\\/")).lower())
+
+    def remove(self, paths):
+        """
+        Forget folders, e.g. deleted from the disk. A folder added again
+        gets a new id.
+        """
+        for path in paths:
+            nameId = self._ids.pop(path, None)
+            if nameId is not None:
+                self.paths[nameId] = None
+                self._removed += 1
+
+    def find(self, path):
+        return self._ids.get(path)
+
+    def clear(self):
+        self.__init__()
+
+    def pending(self):
+        """
+        Return the number of names not indexed yet.
+        """
+        return len(self.names) - self._indexed
+
+    def update(self, deadline=None, sliceSize=2000):
+        """
+        Index the names added since the last update.
+
+        :param deadline: clock() time at which the update stops, None to index everything
+        :return: True when all the names are indexed
+        """
+        names = self.names
+        trigrams = self._trigrams
+        offsets = self._offsets
+        while self._indexed < len(names):
+            first = self._indexed
+            last = min(first + sliceSize, len(names))
+            size = self._size
+            for nameId in range(first, last):
+                name = names[nameId]
+                offsets.append(size)
+                size += len(name) + 1
+                for trigram in set(name[i:i+3] for i in range(len(name) - 2)):
+                    postings = trigrams.get(trigram)
+                    if postings is None:
+                        postings = trigrams[trigram] = array("i")
+                    postings.append(nameId)
+            self._parts.append("\n".join(names[first:last]) + "\n")
+            self._size = size
+            self._indexed = last
+            if deadline is not None and clock() > deadline:
+                break
+        return self._indexed == len(names)
+
+    def candidates(self, literal):
+        """
+        Return the ids of the indexed names that may contain literal, None
+        if it's too short to use the index.
+        """
+        if len(literal) < 3:
+            return None
+        smallest = None
+        for i in range(len(literal) - 2):
+            postings = self._trigrams.get(literal[i:i+3])
+            if postings is None:
+                return []
+            if smallest is None or len(postings) < len(smallest):
+                smallest = postings
+        return smallest
+
+    def search(self, mode, pattern, chunkSize=500):
+        """
+        Yield the ids of the matching names, by lists of at most chunkSize
+        ids checked, so the search can be paused between two lists. The
+        folders added during the search are not searched.
+
+        :param mode: SUBSTRING, GLOB or FUZZY
+        :param pattern: The lowercase pattern, see parseQuery()
+        """
+        for ids in self._search(mode, pattern, chunkSize):
+            if self._removed:
+                paths = self.paths
+                ids = [nameId for nameId in ids if paths[nameId] is not None]
+            yield ids
+
+    def _search(self, mode, pattern, chunkSize):
+        names = self.names
+        indexed = self._indexed
+        end = len(names)
+        compiled = re.compile(regex(mode, pattern), re.MULTILINE)
+        if mode == SUBSTRING:
+            match = lambda name: pattern in name
+            literal = pattern
+        else:
+            match = compiled.search
+            literal = _literals(pattern)[0] if mode == GLOB else ""
+
+        candidates = self.candidates(literal)
+        if candidates is not None:
+            # The names indexed after the start are checked with the pending ones
+            count = len(candidates)
+            for start in range(0, count, chunkSize):
+                yield [nameId for nameId in candidates[start:min(start + chunkSize, count)] if match(names[nameId])]
+        else:
+            for ids in self._scan(compiled, indexed, chunkSize):
+                yield ids
+
+        # The names not indexed yet
+        for start in range(indexed, end, chunkSize):
+            yield [nameId for nameId in range(start, min(start + chunkSize, end)) if match(names[nameId])]
+
+    def _scan(self, compiled, indexed, chunkSize, windowSize=262144):
+        """
+        Run a regular expression on the joined names of the first indexed
+        names. The names are searched by windows of about windowSize
+        characters, a search can be paused after each window.
+        """
+        blob = self._joined()
+        offsets = self._offsets
+        size = offsets[indexed] if indexed < len(offsets) else len(blob)
+        result = []
+        position = 0
+        while position < size:
+            # The window ends on the start of a name, a name is never cut
+            windowId = bisect.bisect_left(offsets, position + windowSize)
+            windowEnd = offsets[windowId] if windowId < indexed else size
+            while position < windowEnd:
+                match = compiled.search(blob, position, windowEnd)
+                if match is None:
+                    break
+                nameId = bisect.bisect_right(offsets, match.start()) - 1
+                result.append(nameId)
+                # The next match starts on the next name
+                position = offsets[nameId + 1] if nameId + 1 < len(offsets) else size
+                if len(result) >= chunkSize:
+                    yield result
+                    result = []
+            position = windowEnd
+            yield result
+            result = []
+
+    def _joined(self):
+        if self._parts:
+            self._blob += "".join(self._parts)
+            self._parts = []
+        return self._blob
+
+
+class Search(QtCore.QObject):
+    """
+    Run the queries on a PathIndex in the GUI thread, by slices of a few
+    milliseconds, so the first results are shown while the user is still
+    typing. A new query cancels the running one.
+
+    The added folders are indexed the same way, by slices, when no query
+    is running.
+    """
+    resultsReady = QtCore.Signal(object)
+    finished = QtCore.Signal(str)
+
+    def __init__(self, index=None, parent=None, budget=4):
+        """
+        Args:
+            index (PathIndex, optional): The names to search. Defaults to a new one.
+            parent (QObject, optional): Parent of the search. Defaults to None.
+            budget (int, optional): Time in milliseconds spent searching before giving the hand back to the event loop. Defaults to 4.
+        """
+        super(Search, self).__init__(parent)
+        self.index = index if index is not None else PathIndex()
+        self.budget = budget
+        self._text = None # The running query
+        self._results = None # Generator of the running query
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._step)
+        self._indexTimer = QtCore.QTimer(self)
+        self._indexTimer.setInterval(10)
+        self._indexTimer.timeout.connect(self._indexStep)
+
+    def add(self, paths):
+        """Add folders to the index, they are searched right away and indexed in idle time.
+        """
+        self.index.add(paths)
+        if self.index.pending() and not self._indexTimer.isActive():
+            self._indexTimer.start()
+
+    def remove(self, paths):
+        """Remove folders deleted from the disk, the running query skips them too.
+        """
+        self.index.remove(paths)
+
+    def query(self, text):
+        """Start a query, resultsReady gives the ids of the matching paths as they are found.
+        An empty text matches nothing.
+        """
+        self.cancel()
+        self._text = text
+        mode, pattern = parseQuery(text)
+        if not pattern:
+            self.finished.emit(text)
+            return
+        self._results = self.index.search(mode, pattern)
+        self._timer.start()
+
+    def cancel(self):
+        self._timer.stop()
+        self._results = None
+
+    def isRunning(self):
+        return self._results is not None
+
+    def _step(self):
+        deadline = clock() + self.budget/1000.0
+        found = []
+        done = False
+        while clock() < deadline:
+            try:
+                found.extend(next(self._results))
+            except StopIteration:
+                done = True
+                break
+        if found:
+            self.resultsReady.emit(found)
+        if done:
+            self.cancel()
+            self.finished.emit(self._text)
+
+    def _indexStep(self):
+        if self._results is not None:
+            # The running query comes first
+            return
+        if self.index.update(clock() + self.budget/1000.0):
+            self._indexTimer.stop()
@@ -0,0 +1,306 @@
+from Qt import QtCore
+from collections import OrderedDict
+import os
+import threading
+import time
+
+try:
+    from os import scandir
+except ImportError:
+    # Python 2.7 without the scandir backport
+    scandir = None
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+def scanFolder(path):
+    """
+    Return the total size of the files directly in path, their number, and
+    the full paths of the sub folders. The links to folders are not
+    followed, so a walk can't loop.
+
+    :param path: The folder to read
+    """
+    size = 0
+    count = 0
+    folders = []
+    if scandir is None:
+        for name in os.listdir(path):
+            fullPath = os.path.join(path, name)
+            if os.path.islink(fullPath):
+                continue
+            if os.path.isdir(fullPath):
+                folders.append(fullPath)
+            elif os.path.isfile(fullPath):
+                size += os.path.getsize(fullPath)
+                count += 1
+        return size, count, folders
+
+    iterator = scandir(path)
+    try:
+        for entry in iterator:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    size += entry.stat(follow_symlinks=False).st_size
+                    count += 1
+            except OSError:
+                continue
+    finally:
+        if hasattr(iterator, "close"):
+            iterator.close()
+    return size, count, folders
+
+
+class FolderCache(object):
+    """
+    Keep the size of the files directly inside the already read folders.
+
+    An entry is valid as long as the mtime and the inode of the folder did
+    not change. Adding, removing or renaming a file changes the mtime of
+    its folder, rewriting a file in place does not, so the sizes of a
+    rewritten file are updated when its folder is invalidated.
+    """
+    def __init__(self, maxEntries=200000):
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # path -> [mtime, inode, size, count, [folder names]]
+        self._lock = threading.Lock()
+
+    def signature(self, path):
+        """
+        Return the (mtime, inode) used to check if a folder changed.
+        """
+        stat = os.stat(path)
+        return stat.st_mtime, stat.st_ino
+
+    def read(self, path):
+        """
+        Return (size, count, sub folders, mtime) of a folder, from the cache when possible.
+        """
+        signature = self.signature(path)
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None and entry[0] == signature[0] and entry[1] == signature[1]:
+                self._entries[path] = entry
+                self.hits += 1
+                return entry[2], entry[3], [os.path.join(path, name) for name in entry[4]], signature[0]
+            self.misses += 1
+
+        size, count, folders = scanFolder(path)
+        names = [os.path.basename(folder) for folder in folders]
+        with self._lock:
+            self._entries[path] = [signature[0], signature[1], size, count, names]
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+        return size, count, folders, signature[0]
+
+    def store(self, path, signature, size, count, names):
+        """
+        Add a folder read by someone else, like the preindex module.
+
+        :param signature: (mtime, inode) of the folder when it was read
+        :param names: Names of the sub folders, without the links
+        """
+        with self._lock:
+            self._entries.pop(path, None)
+            self._entries[path] = [signature[0], signature[1], size, count, list(names)]
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path):
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SizeSignals(QtCore.QObject):
+    progress = QtCore.Signal(object, object)
+    finished = QtCore.Signal(object)
+
+
+class SizeJob(QtCore.QRunnable):
+    """
+    Walk the subtree of a folder in a worker thread and compute the
+    cumulative size of every folder, children first.
+
+    The totals of the completed folders are sent back to the GUI thread by
+    batches, at most every interval seconds. Meanwhile, size, files and
+    folders hold the running totals of the whole subtree.
+    """
+    def __init__(self, path, signals, cache, interval=0.1):
+        super(SizeJob, self).__init__()
+        self.setAutoDelete(False)
+        self.path = path
+        self.signals = signals
+        self.cache = cache
+        self.interval = interval
+        self.cancelled = False
+        self.size = 0 # Running totals of the subtree
+        self.files = 0
+        self.folders = 0
+        self.errors = 0 # Folders that could not be read
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        own = {} # path -> (size, files, mtime) of the folders read, waiting for their children
+        children = {} # path -> sub folders
+        totals = {} # path -> (size, files, folders, mtime) of the completed folders, waiting for their parent
+        batch = []
+        nextEmit = clock() + self.interval
+
+        stack = [(self.path, False)]
+        while stack and not self.cancelled:
+            path, childrenDone = stack.pop()
+            if not childrenDone:
+                try:
+                    size, files, folders, mtime = self.cache.read(path)
+                except OSError:
+                    self.errors += 1
+                    size, files, folders, mtime = 0, 0, [], 0
+                own[path] = (size, files, mtime)
+                children[path] = folders
+                self.size += size
+                self.files += files
+                self.folders += len(folders)
+                stack.append((path, True))
+                stack.extend((folder, False) for folder in folders)
+                continue
+
+            size, files, mtime = own.pop(path)
+            folders = 0
+            for child in children.pop(path):
+                childTotal = totals.pop(child)
+                size += childTotal[0]
+                files += childTotal[1]
+                folders += childTotal[2] + 1
+            total = (size, files, folders, mtime)
+            totals[path] = total
+            batch.append((path, total))
+
+            if clock() > nextEmit:
+                self.signals.progress.emit(self, batch)
+                batch = []
+                nextEmit = clock() + self.interval
+
+        if batch and not self.cancelled:
+            self.signals.progress.emit(self, batch)
+        self.signals.finished.emit(self)
+
+
+class Aggregator(QtCore.QObject):
+    """
+    Compute the cumulative size and number of files of folders in a pool
+    of worker threads, one job per requested folder.
+
+    The results are kept by path, each folder of a walked subtree gets its
+    own totals. totalsChanged is sent in the GUI thread with the list of
+    the paths whose totals are known or updated.
+    """
+    totalsChanged = QtCore.Signal(object)
+    finished = QtCore.Signal(str)
+
+    def __init__(self, parent=None, maxThreads=2, cache=None, maxResults=200000):
+        """
+        Args:
+            parent (QObject, optional): Parent of the aggregator. Defaults to None.
+            maxThreads (int, optional): Number of folders walked at the same time. Defaults to 2.
+            cache (FolderCache, optional): Cache of the folders already read. Defaults to a new one.
+            maxResults (int, optional): Number of folder totals kept, the oldest are dropped. Defaults to 200000.
+        """
+        super(Aggregator, self).__init__(parent)
+        self.cache = cache if cache is not None else FolderCache()
+        self.maxResults = maxResults
+        self._results = OrderedDict() # path -> (size, files, folders, mtime)
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(maxThreads)
+        self._jobs = {} # Walked path -> running job
+
+        self._signals = SizeSignals(self)
+        self._signals.progress.connect(self._onProgress)
+        self._signals.finished.connect(self._onFinished)
+
+    def aggregate(self, path):
+        """Start to compute the totals of a folder and all its sub folders.
+
+        Args:
+            path (str): The folder to walk
+
+        Returns:
+            SizeJob: The job, already running if the folder was being walked
+        """
+        job = self._jobs.get(path)
+        if job is not None:
+            return job
+        job = SizeJob(path, self._signals, self.cache)
+        self._jobs[path] = job
+        self._pool.start(job)
+        return job
+
+    def cancel(self, path):
+        """Stop the walk started for path. The totals already sent are kept.
+        """
+        job = self._jobs.pop(path, None)
+        if job is not None:
+            job.cancel()
+
+    def cancelAll(self):
+        for path in list(self._jobs):
+            self.cancel(path)
+
+    def isRunning(self, path):
+        return path in self._jobs
+
+    def job(self, path):
+        """Return the running job of a folder, to read its partial totals, None if not running.
+        """
+        return self._jobs.get(path)
+
+    def total(self, path):
+        """Return (size, files, folders, mtime) of a folder, None if not computed yet.
+        """
+        return self._results.get(path)
+
+    def invalidate(self, path):
+        """Forget the totals of a folder and of its parents, and its cached content.
+        """
+        self.cache.invalidate(path)
+        while True:
+            self._results.pop(path, None)
+            parent = os.path.dirname(path)
+            if parent == path:
+                return
+            path = parent
+
+    def pendingJobs(self):
+        return len(self._jobs)
+
+    def waitForDone(self, msecs=-1):
+        return self._pool.waitForDone(msecs)
+
+    def _onProgress(self, job, batch):
+        if job.cancelled:
+            return
+        results = self._results
+        for path, total in batch:
+            results.pop(path, None)
+            results[path] = total
+        while len(results) > self.maxResults:
+            results.popitem(last=False)
+        self.totalsChanged.emit([path for path, total in batch])
+
+    def _onFinished(self, job):
+        if self._jobs.get(job.path) is job:
+            del self._jobs[job.path]
+        if job.cancelled:
+            return
+        if job.errors:
+            print("WARNING: {0} folders of {1} could not be read".format(job.errors, job.path))
+        self.finished.emit(job.path)
@@ -0,0 +1,41 @@
+"""
+Measure the startup of the application.
+
+This module is imported first, its import time is the start of the
+measures. The steps of the startup are marked as they are reached:
+
+    imports: the modules of the window are imported
+    first frame: the window has painted its first frame
+    interactive: the visible part of the last project is shown and the
+                 event loop answers within a frame
+    loaded: the whole project is loaded
+
+    python __init__.py --measure-startup [project.browser]
+
+prints the time of each step, then quits once the project is loaded.
+"""
+import time
+
+clock = getattr(time, "perf_counter", time.time)
+START = clock()
+
+marks = [] # (step, seconds since the start) of the reached steps
+measuring = False # True to print the steps as they are reached
+
+
+def mark(step):
+    """
+    Record the time a startup step is reached, only the first time.
+    """
+    if step in elapsed():
+        return
+    marks.append((step, clock() - START))
+    if measuring:
+        print("STARTUP: {0:<12} {1:8.1f} ms".format(step, marks[-1][1]*1000))
+
+
+def elapsed():
+    """
+    Return a dict {step: seconds since the start} of the reached steps.
+    """
+    return dict(marks)
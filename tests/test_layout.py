@@ -0,0 +1,134 @@
+"""
+Regression tests of the layouts applied while the nodes are listed.
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from Qt import QtWidgets
+import dirCache
+import layout
+import nodeModel
+import utils
+
+
+class LayoutOverlapTest(unittest.TestCase):
+
+    def createModel(self):
+        """
+        A seed with 60 children, 3 of them expanded with folders of their own.
+        """
+        model = nodeModel.NodeModel()
+        flags = nodeModel.CHILDREN_VISIBLE
+        rootId = model.add("/seed", flags=flags, width=80, height=80)
+        for i in range(60):
+            childId = model.add("/seed/{0}".format(i), rootId, flags=flags if i in (0, 30, 59) else 0,
+                                width=60 + i % 5*10, height=20)
+            if i in (0, 30, 59):
+                for j in range(12):
+                    model.add("/seed/{0}/{1}".format(i, j), childId, flags=0, width=70, height=20)
+        return model, rootId
+
+    def test_noOverlap(self):
+        for name in ["tidy", "columns", "radial"]:
+            model, rootId = self.createModel()
+            tree = layout.Tree(model, rootId)
+            positions, reverted = layout.create(name).compute(tree)
+            self.assertTrue(set(tree.ids) - set([rootId]) <= set(positions), name)
+
+            rects = []
+            for nodeId in tree.ids:
+                x, y = positions.get(nodeId, (model.x[nodeId], model.y[nodeId]))
+                rects.append((nodeId, x, y, x + model.widths[nodeId], y + model.heights[nodeId]))
+            for i, (first, left, top, right, bottom) in enumerate(rects):
+                for second, otherLeft, otherTop, otherRight, otherBottom in rects[i + 1:]:
+                    overlap = left < otherRight and otherLeft < right and top < otherBottom and otherTop < bottom
+                    self.assertFalse(overlap, "{0}: nodes {1} and {2} overlap".format(name, first, second))
+
+
+class CollapseDuringListingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+        self.folder = tempfile.mkdtemp()
+        self.paths = (utils.settings.path, dirCache.listingCache.path, utils.settings.layout)
+        utils.settings.path = os.path.join(self.folder, "settings.json")
+        dirCache.listingCache.path = os.path.join(self.folder, "listingCache.json")
+        dirCache.listingCache.clear()
+        utils.settings.layout = "tidy"
+        self.tree = os.path.join(self.folder, "tree")
+        for name in ["c1", "c2", "c3"]:
+            os.makedirs(os.path.join(self.tree, "a", "b", name))
+        for name in ["b2", "b3"]:
+            os.makedirs(os.path.join(self.tree, "a", name))
+        os.makedirs(os.path.join(self.tree, "d"))
+
+        # The exceptions raised in the slots are only printed by Qt
+        self.errors = []
+        self._excepthook = sys.excepthook
+        sys.excepthook = lambda kind, value, traceback: self.errors.append(value)
+
+        import graph
+        self.view = graph.View()
+
+    def tearDown(self):
+        sys.excepthook = self._excepthook
+        self.view.clear()
+        utils.settings.path, dirCache.listingCache.path, utils.settings.layout = self.paths
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def wait(self, condition, timeout=10):
+        end = time.time() + timeout
+        while condition() and time.time() < end:
+            self.app.processEvents()
+
+    def expand(self, node):
+        node._childrenVisibles = True
+        node.materializeChildren()
+        node._fillData()
+        node.updateChildrenVisibility()
+        self.wait(lambda: node._loading or self.view.layouter.pendingJobs())
+
+    def child(self, node, name):
+        return [child for child in node._childrenList if os.path.basename(child._path) == name][0]
+
+    def test_collapseParentDuringListing(self):
+        root = self.view.addRoot(self.tree)
+        self.expand(root)
+        a = self.child(root, "a")
+        self.expand(a)
+        b = self.child(a, "b")
+
+        # The listing of b finishes once its parent is collapsed
+        b._childrenVisibles = True
+        b._fillData()
+        a._childrenVisibles = False
+        a.updateChildrenVisibility()
+        self.assertFalse(b.isVisible())
+        self.wait(lambda: b._loading or self.view.layouter.pendingJobs())
+
+        self.assertEqual(self.errors, [])
+        self.assertEqual(len(b._childrenList), 3)
+
+        # Placing the hidden subtree again doesn't push its hidden siblings
+        model = self.view.model
+        siblings = [childId for childId in model.children[a._id] if childId != b._id]
+        self.assertEqual(len(siblings), 2)
+        before = [(model.x[childId], model.y[childId]) for childId in siblings]
+        self.view.layoutNode(b)
+        self.assertEqual([(model.x[childId], model.y[childId]) for childId in siblings], before)
+        self.assertEqual(self.errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
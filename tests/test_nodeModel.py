@@ -0,0 +1,152 @@
+"""
+Tests of the flat model of the nodes: the records saved in the projects,
+the cached subtree bounds and the reuse of the removed ids.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import nodeModel
+from nodeModel import CHILDREN_VISIBLE
+
+
+class RecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        # seed -> a (collapsed, with an item) -> b -> c, b and c without item
+        self.model = model = nodeModel.NodeModel()
+        self.seed = model.add("/seed", flags=CHILDREN_VISIBLE, x=0, y=0, width=10, height=10)
+        self.a = model.add("/seed/a", self.seed, flags=0, x=100, y=0, width=10, height=10)
+        self.b = model.add("/seed/a/b", self.a, flags=CHILDREN_VISIBLE, x=200, y=0, width=10, height=10)
+        self.c = model.add("/seed/a/b/c", self.b, flags=0, x=300, y=0, width=10, height=10)
+        model.items[self.seed] = object()
+        model.items[self.a] = object()
+
+    def positions(self):
+        return dict((record["_path"], tuple(record["pos"])) for record in self.model.records([self.seed]))
+
+    def test_parentsFirst(self):
+        records = list(self.model.records([self.seed]))
+        self.assertEqual([record["_path"] for record in records], ["/seed", "/seed/a", "/seed/a/b", "/seed/a/b/c"])
+        self.assertEqual([record["id"] for record in records], [0, 1, 2, 3])
+        self.assertEqual([record["parent"] for record in records], [None, 0, 1, 2])
+
+    def test_pendingOffset(self):
+        # a moved while collapsed, its children without item have not followed yet
+        self.model.addOffset(self.a, 10, 5)
+        positions = self.positions()
+        self.assertEqual(positions["/seed/a"], (100, 0))
+        self.assertEqual(positions["/seed/a/b"], (210, 5))
+        self.assertEqual(positions["/seed/a/b/c"], (310, 5))
+
+    def test_nestedPendingOffsets(self):
+        self.model.addOffset(self.a, 10, 5)
+        self.model.addOffset(self.a, 1, 1)
+        self.model.addOffset(self.b, -100, 20)
+        positions = self.positions()
+        self.assertEqual(positions["/seed/a/b"], (211, 6))
+        self.assertEqual(positions["/seed/a/b/c"], (211, 26))
+
+    def test_offsetIgnoredForMaterializedChildren(self):
+        # A child with an item has already been moved with its parent
+        self.model.items[self.b] = object()
+        self.model.addOffset(self.a, 10, 5)
+        self.assertEqual(self.positions()["/seed/a/b"], (200, 0))
+
+    def test_snapshot(self):
+        self.model.addOffset(self.a, 10, 5)
+        snapshot = self.model.snapshot()
+        expected = list(snapshot.records([self.seed]))
+        self.model.setPos(self.c, 0, 0)
+        self.model.addOffset(self.a, 10, 5)
+        self.assertEqual(list(snapshot.records([self.seed])), expected)
+        self.assertNotEqual(list(self.model.records([self.seed])), expected)
+
+
+class BoundsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = model = nodeModel.NodeModel()
+        self.seed = model.add("/seed", flags=CHILDREN_VISIBLE, x=0, y=0, width=10, height=10)
+        self.a = model.add("/seed/a", self.seed, flags=CHILDREN_VISIBLE, x=20, y=0, width=10, height=10)
+        self.b = model.add("/seed/a/b", self.a, flags=0, x=40, y=30, width=10, height=10)
+
+    def test_bounds(self):
+        self.assertEqual(self.model.subtreeBounds(self.seed), (0, 0, 50, 40))
+        self.assertEqual(self.model.subtreeBounds(self.a), (20, 0, 50, 40))
+
+    def test_setFlag(self):
+        self.model.subtreeBounds(self.seed)
+        self.model.setFlag(self.a, CHILDREN_VISIBLE, False)
+        self.assertEqual(self.model.subtreeBounds(self.seed), (0, 0, 30, 10))
+        self.model.setFlag(self.a, CHILDREN_VISIBLE, True)
+        self.assertEqual(self.model.subtreeBounds(self.seed), (0, 0, 50, 40))
+
+    def test_setPos(self):
+        self.model.subtreeBounds(self.seed)
+        self.model.setPos(self.b, 100, -50)
+        self.assertEqual(self.model.subtreeBounds(self.seed), (0, -50, 110, 10))
+        self.assertEqual(self.model.subtreeBounds(self.b), (100, -50, 110, -40))
+
+    def test_translate(self):
+        self.model.subtreeBounds(self.seed)
+        # The caller moves the descendants and invalidates the ancestors
+        self.model.translate(self.a, 5, 5)
+        self.model.translate(self.b, 5, 5)
+        self.model.invalidateBounds(self.seed)
+        self.assertEqual(self.model.subtreeBounds(self.a), (25, 5, 55, 45))
+        self.assertEqual(self.model.subtreeBounds(self.seed), (0, 0, 55, 45))
+
+    def test_add(self):
+        self.model.subtreeBounds(self.seed)
+        self.model.add("/seed/a/c", self.a, flags=0, x=-10, y=0, width=5, height=5)
+        self.assertEqual(self.model.subtreeBounds(self.seed), (-10, 0, 50, 40))
+
+
+class RemoveTest(unittest.TestCase):
+
+    def test_freeListReuse(self):
+        model = nodeModel.NodeModel()
+        seed = model.add("/seed", flags=CHILDREN_VISIBLE, width=10, height=10)
+        a = model.add("/seed/a", seed, x=20, width=10, height=10)
+        b = model.add("/seed/a/b", a, x=40, width=10, height=10)
+        other = model.add("/seed/other", seed, x=20, y=20, width=10, height=10)
+        model.addOffset(a, 1, 1)
+
+        self.assertEqual(model.remove(a), [a, b])
+        self.assertFalse(model.isValid(a))
+        self.assertFalse(model.isValid(b))
+        self.assertIsNone(model.find("/seed/a"))
+        self.assertEqual(model.children[seed], [other])
+        self.assertEqual(model.descendants(seed), [other])
+        self.assertNotIn(a, model.offsets)
+
+        # The removed ids are reused, with none of their old data
+        count = len(model.paths)
+        reused = set([model.add("/seed/new1", seed), model.add("/seed/new2", seed)])
+        self.assertEqual(reused, set([a, b]))
+        self.assertEqual(len(model.paths), count)
+        for nodeId in reused:
+            self.assertEqual(model.children[nodeId], [])
+            self.assertEqual(model.parents[nodeId], seed)
+            self.assertIsNone(model.items[nodeId])
+        self.assertEqual(model.find("/seed/new1") in reused, True)
+        self.assertEqual(model.add("/seed/new3", seed), count)
+
+    def test_removeInvalidatesBounds(self):
+        model = nodeModel.NodeModel()
+        seed = model.add("/seed", flags=CHILDREN_VISIBLE, width=10, height=10)
+        a = model.add("/seed/a", seed, x=100, width=10, height=10)
+        self.assertEqual(model.subtreeBounds(seed), (0, 0, 110, 10))
+        model.remove(a)
+        self.assertEqual(model.subtreeBounds(seed), (0, 0, 10, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Tests of the project files: the round trip of the line format, the
+migration of the nested version 1 and the files damaged by a crash.
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import project
+
+
+def node(path, x=0, y=0, children=None):
+    data = {"_path": path, "pos": [x, y], "bgColor": "#000000", "flags": 0}
+    if children is not None:
+        data["children"] = children
+    return data
+
+
+class ProjectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "test.browser")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def writeText(self, text):
+        with open(self.path, "w") as f:
+            f.write(text)
+
+    def test_roundTrip(self):
+        records = [
+            dict(node("/seed"), id=0, parent=None),
+            dict(node("/seed/a", 10, 20), id=1, parent=0),
+            dict(node("/seed/a/b", 30, 40), id=2, parent=1),
+            dict(node("/other"), id=3, parent=None),
+        ]
+        project.write(self.path, [1, 2, 3, 4], iter(records))
+        header, read = project.read(self.path)
+        self.assertEqual(header["version"], project.VERSION)
+        self.assertEqual(header["scenePos"], [1, 2, 3, 4])
+        self.assertEqual(list(read), records)
+        self.assertEqual(os.listdir(self.folder), ["test.browser"])
+
+    def test_migrateNested(self):
+        seeds = [
+            node("/seed", children=[
+                node("/seed/a", 10, 0, children=[node("/seed/a/x"), node("/seed/a/y")]),
+                node("/seed/b", 20, 0),
+            ]),
+            node("/other", children=[]),
+        ]
+        self.writeText(json.dumps({"scenePos": [5, 6, 7, 8], "nodes": seeds}, indent=4))
+        header, records = project.read(self.path)
+        records = list(records)
+        self.assertEqual(header["version"], 1)
+        self.assertEqual(header["scenePos"], [5, 6, 7, 8])
+
+        ids = dict((record["_path"], record["id"]) for record in records)
+        parents = dict((record["_path"], record["parent"]) for record in records)
+        self.assertEqual(sorted(ids.values()), list(range(6)))
+        self.assertEqual(parents, {
+            "/seed": None, "/seed/a": ids["/seed"], "/seed/a/x": ids["/seed/a"],
+            "/seed/a/y": ids["/seed/a"], "/seed/b": ids["/seed"], "/other": None})
+        # Written parents first, without the nested children
+        seen = set()
+        for record in records:
+            self.assertNotIn("children", record)
+            self.assertTrue(record["parent"] is None or record["parent"] in seen)
+            seen.add(record["id"])
+        self.assertEqual([r["_path"] for r in records if r["parent"] == ids["/seed"]], ["/seed/a", "/seed/b"])
+
+        # Saved again in the line format, it reads back the same records
+        project.write(self.path, header["scenePos"], records)
+        header, again = project.read(self.path)
+        self.assertEqual(header["version"], project.VERSION)
+        self.assertEqual(list(again), records)
+
+    def test_migrateSkipsInvalidNodes(self):
+        seeds = [node("/seed", children=[{"_path": "/seed/broken", "children": [node("/seed/broken/x")]},
+                                         node("/seed/ok")])]
+        self.writeText(json.dumps({"nodes": seeds}))
+        header, records = project.read(self.path)
+        self.assertEqual([record["_path"] for record in records], ["/seed", "/seed/ok"])
+        self.assertEqual(header["scenePos"], project.SCENE_POS)
+
+    def test_truncated(self):
+        records = [
+            dict(node("/seed"), id=0, parent=None),
+            dict(node("/seed/a"), id=1, parent=0),
+            dict(node("/seed/a/b"), id=2, parent=1),
+        ]
+        project.write(self.path, [0, 0, 10, 10], records)
+        with open(self.path, "r") as f:
+            text = f.read()
+        # A crash while the last record was written
+        self.writeText(text[:-len(json.dumps(records[-1])) // 2])
+        header, read = project.read(self.path)
+        self.assertEqual(list(read), records[:2])
+
+    def test_corruptLine(self):
+        lines = [json.dumps({"format": project.FORMAT, "version": 2}),
+                 json.dumps(dict(node("/seed"), id=0, parent=None)),
+                 "{not json",
+                 json.dumps({"id": 2, "parent": 0}),
+                 json.dumps(dict(node("/seed/a"), id=3, parent=0))]
+        self.writeText("\n".join(lines) + "\n")
+        header, read = project.read(self.path)
+        self.assertEqual([record["_path"] for record in read], ["/seed", "/seed/a"])
+        self.assertEqual(header["scenePos"], project.SCENE_POS)
+
+    def test_malformed(self):
+        for text in ("[1, 2, 3]", "{}", '{"nodes": {}}', "not json", ""):
+            self.writeText(text)
+            self.assertRaises(project.ProjectError, project.read, self.path)
+
+    def test_newerVersion(self):
+        self.writeText(json.dumps({"format": project.FORMAT, "version": project.VERSION + 1}) + "\n")
+        self.assertRaises(project.ProjectError, project.read, self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
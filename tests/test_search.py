@@ -0,0 +1,123 @@
+"""
+Tests of the filter engine: the queries on the index give the same names
+as a plain check of every name.
+
+    python -m unittest discover tests
+"""
+import fnmatch
+import os
+import random
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import search
+
+WORDS = ["render", "cache", "texture", "shot", "asset", "comp", "final", "anim", "rig", "fx", "out"]
+QUERIES = ["texture", "ren", "fi", "x", "SHOT_0", "*_v0?7_*", "[!r]ig_1*", "anim*", "*[0-3]", "re?der*",
+           "~rndtx9", "~fx", "~zzq", "~a_1"]
+
+
+def isSubsequence(pattern, name):
+    position = 0
+    for char in pattern:
+        position = name.find(char, position)
+        if position == -1:
+            return False
+        position += 1
+    return True
+
+
+def bruteForce(paths, text):
+    mode, pattern = search.parseQuery(text)
+    if mode == search.SUBSTRING:
+        match = lambda name: pattern in name
+    elif mode == search.GLOB:
+        match = lambda name: fnmatch.fnmatchcase(name, pattern)
+    else:
+        match = lambda name: isSubsequence(pattern, name)
+    return sorted(path for path in paths if match(os.path.basename(path).lower()))
+
+
+class PathIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(1)
+        self.paths = []
+        for i in range(3000):
+            words = [random.choice(WORDS) for j in range(random.randint(1, 3))]
+            name = "%s_v%03d_%d" % ("_".join(words), random.randint(0, 999), i)
+            if i % 7 == 0:
+                name = name.upper()
+            self.paths.append("/project/seq%02d/%s" % (i % 20, name))
+        self.index = search.PathIndex()
+
+    def results(self, text, chunkSize=500):
+        mode, pattern = search.parseQuery(text)
+        paths = self.index.paths
+        ids = [nameId for chunk in self.index.search(mode, pattern, chunkSize) for nameId in chunk]
+        self.assertEqual(len(ids), len(set(ids)))
+        return sorted(paths[nameId] for nameId in ids)
+
+    def check(self, paths, chunkSize=500):
+        for text in QUERIES:
+            self.assertEqual(self.results(text, chunkSize), bruteForce(paths, text), text)
+
+    def test_parseQuery(self):
+        self.assertEqual(search.parseQuery("Ab"), (search.SUBSTRING, "ab"))
+        self.assertEqual(search.parseQuery("a*"), (search.GLOB, "a*"))
+        self.assertEqual(search.parseQuery("a[bc]"), (search.GLOB, "a[bc]"))
+        self.assertEqual(search.parseQuery("~Ab*"), (search.FUZZY, "ab*"))
+
+    def test_indexed(self):
+        self.index.add(self.paths)
+        self.assertTrue(self.index.update())
+        self.check(self.paths)
+        self.check(self.paths, chunkSize=7)
+
+    def test_pending(self):
+        self.index.add(self.paths)
+        self.check(self.paths)
+        # Partly indexed, the rest is checked name by name
+        self.index.update(sliceSize=1000, deadline=0)
+        self.assertEqual(self.index.pending(), 2000)
+        self.check(self.paths)
+
+    def test_addTwice(self):
+        self.index.add(self.paths[:100])
+        self.index.update()
+        self.index.add(self.paths[50:200])
+        self.assertEqual(len(self.index), 200)
+        self.check(self.paths[:200])
+
+    def test_remove(self):
+        self.index.add(self.paths)
+        self.index.update(sliceSize=1000, deadline=0)
+        removed = self.paths[::3]
+        self.index.remove(removed + ["/unknown"])
+        kept = [path for path in self.paths if path not in set(removed)]
+        self.assertEqual(len(self.index), len(kept))
+        self.assertIsNone(self.index.find(removed[0]))
+        self.check(kept)
+        self.index.update()
+        self.check(kept)
+
+        # Added again with a new id
+        self.index.add(removed[:10])
+        self.assertEqual(self.index.find(removed[0]), len(self.paths))
+        self.check(kept + removed[:10])
+
+    def test_specialCharacters(self):
+        paths = ["/a/file.name", "/a/filexname", "/a/[draft] v1", "/a/(old)", "/a/a+b", "/a/50%", "/a/back\\slash"]
+        self.index.add(paths)
+        self.index.update()
+        for text in (".name", "[draft]*", "[[]draft]*", "(old)", "a+b", "~a+", "*\\*", "~.n"):
+            self.assertEqual(self.results(text), bruteForce(paths, text), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
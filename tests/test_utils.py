@@ -0,0 +1,77 @@
+"""
+Tests of utils.atomicWrite(): the ring of backups and the failed writes.
+
+    python -m unittest discover tests
+"""
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import utils
+
+
+class AtomicWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "file.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def content(self, path):
+        with open(path, "r") as f:
+            return f.read()
+
+    def test_write(self):
+        utils.atomicWrite(self.path, "text")
+        self.assertEqual(self.content(self.path), "text")
+        utils.atomicWrite(self.path, lambda f: f.writelines(["a\n", "b\n"]))
+        self.assertEqual(self.content(self.path), "a\nb\n")
+        self.assertEqual(os.listdir(self.folder), ["file.txt"])
+
+    def test_binary(self):
+        def writeGzip(f):
+            with gzip.GzipFile(fileobj=f, mode="wb") as output:
+                output.write(b"data")
+        utils.atomicWrite(self.path, writeGzip, mode="wb")
+        with gzip.open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"data")
+
+    def test_backups(self):
+        for version in range(5):
+            utils.atomicWrite(self.path, str(version), backups=2)
+        self.assertEqual(self.content(self.path), "4")
+        self.assertEqual(self.content(utils.backupPath(self.path, 1)), "3")
+        self.assertEqual(self.content(utils.backupPath(self.path, 2)), "2")
+        self.assertEqual(sorted(os.listdir(self.folder)), ["file.txt", "file.txt.bak1", "file.txt.bak2"])
+
+    def test_firstBackup(self):
+        utils.atomicWrite(self.path, "0", backups=3)
+        self.assertEqual(os.listdir(self.folder), ["file.txt"])
+        utils.atomicWrite(self.path, "1", backups=3)
+        self.assertEqual(sorted(os.listdir(self.folder)), ["file.txt", "file.txt.bak1"])
+        self.assertEqual(self.content(utils.backupPath(self.path, 1)), "0")
+
+    def test_failedWrite(self):
+        utils.atomicWrite(self.path, "before", backups=2)
+
+        def fail(f):
+            f.write("half")
+            raise RuntimeError("disk full")
+
+        self.assertRaises(RuntimeError, utils.atomicWrite, self.path, fail, 2)
+        self.assertEqual(self.content(self.path), "before")
+        # Neither a temporary file nor a backup of the unchanged file
+        self.assertEqual(os.listdir(self.folder), ["file.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+from Qt import QtCore, QtGui, QtWidgets
+import utils
+
+
+class Theme(QtCore.QObject):
+    """
+    Give access to the values of the stylesheet used to paint the items.
+
+    The CSS is parsed once into a dict {selector: {property: value}}. The
+    QColor, QPen and QBrush built from it are cached and shared, so painting
+    and node creation never parse any string. They are dropped when the
+    theme is reloaded, and the changed signal is emitted.
+    """
+    changed = QtCore.Signal()
+
+    def __init__(self, css=None, parent=None):
+        super(Theme, self).__init__(parent)
+        self._rules = {}
+        self._cache = {}
+        self.load(utils.css if css is None else css)
+
+    def load(self, css):
+        """
+        Replace the stylesheet and drop every cached object.
+        """
+        self._rules = utils.parseCss(css)
+        self._cache = {}
+        utils._cssRules = None
+        self.changed.emit()
+
+    def reload(self):
+        """
+        Read the CSS file again, apply it to the application and the painted items.
+        """
+        with open(utils.cssPath, "r") as f:
+            utils.css = f.read()
+        app = QtWidgets.QApplication.instance()
+        if app is not None:
+            app.setStyleSheet(utils.css)
+        self.load(utils.css)
+
+    def value(self, selector, attr, default=None):
+        """
+        Return the raw string value of a property.
+
+        :param selector: The selector name, without the leading "#"
+        :param attr: The property name
+        :param default: Returned when the property does not exist
+        """
+        return self._rules.get(selector, {}).get(attr, default)
+
+    def px(self, selector, attr, default=0):
+        """
+        Return the value of a property as an int, "12px" gives 12.
+        """
+        key = ("px", selector, attr, default)
+        if key not in self._cache:
+            value = self.value(selector, attr)
+            # The default is cached too, a missing property is not looked up again
+            self._cache[key] = default if value is None else int(float(value.replace("px", "")))
+        return self._cache[key]
+
+    def color(self, selector, attr, default="#000000"):
+        key = ("color", selector, attr)
+        if key not in self._cache:
+            self._cache[key] = QtGui.QColor(self.value(selector, attr, default))
+        return self._cache[key]
+
+    def brush(self, selector, attr):
+        key = ("brush", selector, attr)
+        if key not in self._cache:
+            self._cache[key] = QtGui.QBrush(self.color(selector, attr))
+        return self._cache[key]
+
+    def pen(self, selector, attr, width=1, style=QtCore.Qt.SolidLine):
+        """
+        Return a shared QPen of the color of a property. It must not be modified.
+
+        :param width: The pen width, 0 gives a cosmetic pen
+        :param style: The Qt.PenStyle of the pen
+        """
+        key = ("pen", selector, attr, width, style)
+        if key not in self._cache:
+            self._cache[key] = QtGui.QPen(self.color(selector, attr), width, style)
+        return self._cache[key]
+
+
+class Palette(object):
+    """
+    The colour objects derived from a node colour, shared by all the items
+    of this colour. They must not be modified.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.color = QtGui.QColor(name)
+        self.brush = QtGui.QBrush(self.color)
+        self.lighterBrush = QtGui.QBrush(self.color.lighter())
+        self.darkerBrush = QtGui.QBrush(self.color.darker())
+        self.connectionPen = QtGui.QPen(self.color, 3, QtCore.Qt.SolidLine)
+        self.linePen = QtGui.QPen(self.color, 0, QtCore.Qt.SolidLine) # Cosmetic pen, used when zoomed out
+        self._variants = None
+
+    @property
+    def variants(self):
+        """
+        Names of 8 variations of the colour, from dark to bright.
+        """
+        if self._variants is None:
+            self._variants = []
+            baseColor = self.color.getHsv()
+            for i in range(25, 101, 10):
+                hsv = list(baseColor)
+                hsv[2] = int(i*2.5)
+                variation = QtGui.QColor().fromHsv(*hsv)
+                self._variants.append(variation.name(QtGui.QColor.HexRgb))
+        return self._variants
+
+
+_palettes = {}
+
+def palette(name):
+    """
+    Return the shared Palette of a colour, it's created only once per colour.
+
+    :param name: The colour name, as given to QColor
+    """
+    result = _palettes.get(name)
+    if result is None:
+        result = _palettes[name] = Palette(name)
+    return result
+
+
+# Variables
+current = Theme()
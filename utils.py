@@ -4,56 +4,159 @@ import os
 import time
 import json
 import inspect
+import shutil
 
 # Functions
-with open(os.path.join(os.path.dirname(__file__), "dark.css"),"r") as f:
+cssPath = os.path.join(os.path.dirname(__file__), "dark.css")
+with open(cssPath, "r") as f:
     '''
         Read the content of the given css file
     '''
     css = f.read()
 
+def parseCss(text):
+    '''
+        Parse a CSS text into a dict {selector: {property: value}}
+
+        The leading "#" of the selectors is removed, so "#node" is stored as "node".
+
+        :param text: The content of a CSS file
+    '''
+    rules = {}
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.DOTALL)
+    for selectors, body in re.findall(r"([^{}]+)\{([^{}]*)\}", text):
+        properties = {}
+        for declaration in body.split(";"):
+            if ":" not in declaration:
+                continue
+            name, value = declaration.split(":", 1)
+            properties[name.strip()] = value.strip()
+        for selector in selectors.split(","):
+            selector = selector.strip().lstrip("#")
+            rules.setdefault(selector, {}).update(properties)
+    return rules
+
+_cssRules = None
+_sortedCssRules = [] # Items of _cssRules sorted by selector, built with it
+
 def getCssValue(ids, attr = None):
     '''
         Extract infos from CSS file
 
         Return these info to be usable in a QPaint or other widget that can't be
-        overwritten by CSS or custom attributes that don't exist in CSS
+        overwritten by CSS or custom attributes that don't exist in CSS.
+        The CSS is parsed only once, prefer the typed accessors of theme.current.
 
-        :param ids: List of Properties name contained in the line
+        :param ids: List of Properties name contained in the selector
         :param attr: Attr name contain in the CSS property (background, color...)
     '''
-    displayLine = False
-    content = []
-    for line in css.split("\n"):
-        if (isinstance(ids, tuple) or isinstance(ids, list)) and all(x in line for x in ids):
-            displayLine = True
-
-        if isinstance(ids, str) and ids in line:
-            displayLine = True
-
-        if "}" in line:
-            displayLine = False
-
-        if displayLine:
-            if attr and attr in line:
-                value = re.findall("[A-Za-z0-9-_#.]+", line)[1:]
-                if len(value) == 1:
-                    value = value[0]
-                return value.replace("px", "")
-            elif not attr:
-                content.append(line+"\n")
-    if content:
-        return content.replace("px", "")
-
-
-def emitTimer(emitter, interval):
-    while True:
-        emitter.emit()
-        time.sleep(1)
+    global _cssRules, _sortedCssRules
+    if _cssRules is None:
+        _cssRules = parseCss(css)
+        _sortedCssRules = sorted(_cssRules.items())
+    if isinstance(ids, str):
+        ids = [ids]
+
+    if len(ids) == 1 and ids[0] in _cssRules:
+        # The exact selector first
+        value = _cssValue(_cssRules[ids[0]], attr)
+        if value is not None:
+            return value
+    for selector, properties in _sortedCssRules:
+        if not all(x in selector for x in ids):
+            continue
+        value = _cssValue(properties, attr)
+        if value is not None:
+            return value
+
+def _cssValue(properties, attr):
+    if attr is None:
+        return dict((k, v.replace("px", "")) for k, v in properties.items())
+    if attr in properties:
+        return properties[attr].replace("px", "")
+
+def replaceFile(source, destination):
+    '''
+        Rename source to destination, replacing it atomically when the platform allows it
+
+        :param source: The file to rename
+        :param destination: The file to replace
+    '''
+    if hasattr(os, "replace"):
+        os.replace(source, destination)
+        return
+    # Python 2: rename replaces an existing file on POSIX only
+    if os.name == "nt" and os.path.exists(destination):
+        os.remove(destination)
+    os.rename(source, destination)
+
+def backupPath(path, index):
+    '''
+        Return the path of a backup of a file, 1 being the most recent one
+
+        :param path: The backed up file
+        :param index: Index of the backup in the ring
+    '''
+    return "{0}.bak{1}".format(path, index)
+
+def atomicWrite(path, content, backups=0, mode="w"):
+    '''
+        Write a file so it's never left half written: the content goes to a
+        temporary file, synced to the disk, then renamed over the target.
+
+        The content is either a string, or a function called with the open
+        temporary file, to stream a big file without holding it in memory:
+
+            atomicWrite(path, lambda f: f.writelines(lines))
+
+        The previous versions of the file are kept in a ring of backups,
+        see backupPath().
+
+        :param path: The file to write
+        :param content: The text of the file, or a function writing it into the given file
+        :param backups: Number of previous versions kept, 0 to keep none
+        :param mode: Mode the temporary file is opened with, "wb" to write bytes
+    '''
+    temporary = path + ".tmp"
+    try:
+        with open(temporary, mode) as f:
+            if callable(content):
+                content(f)
+            else:
+                f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        # Nothing is left behind, the target is untouched
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+    if backups > 0 and os.path.exists(path):
+        for index in range(backups - 1, 0, -1):
+            if os.path.exists(backupPath(path, index)):
+                replaceFile(backupPath(path, index), backupPath(path, index + 1))
+        # Copied, so the target always exists
+        shutil.copyfile(path, backupPath(path, 1))
+    replaceFile(temporary, path)
 
 def rectToList(rect):
     return [rect.x(), rect.y(), rect.width(), rect.height()]
 
+def formatSize(size):
+    '''
+        Return a size in bytes as a short human readable text, like "12.3 MB"
+
+        :param size: Number of bytes
+    '''
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if size < 1024 or unit == "TB":
+            break
+        size /= 1024.0
+    if unit == "B":
+        return "{0} B".format(int(size))
+    return "{0:.1f} {1}".format(size, unit)
+
 # Classes
 
 class Vector(object):
@@ -176,27 +279,59 @@ class Settings(object):
         self.path = os.path.join(os.path.dirname(__file__), "settings.json")
         self.recentProjects = []
         self.autoloadLastProject = True
+        self.lodNodeThreshold = 0.5 # Under this zoom level, the nodes are drawn as plain bars without text
+        self.lodConnectionThreshold = 0.3 # Under this zoom level, the connections are drawn as straight lines
+        self.dragIndexThreshold = 500 # From this number of descendants, the scene index is disabled while a node is dragged
+        self.profileConnections = False # Print the number of connection paths computed per second
+        self.profileOverlay = False # Show the profiling overlay in the HUD, toggled with F12
+        self.traceDuration = 10 # Time in seconds of the traces recorded with Shift+F12
+        self.layout = "tidy" # Layout of the children of a folder once listed: "tidy", "columns", "radial" or "" to keep them in a column
+        self.layoutThreadThreshold = 2000 # From this number of nodes, a layout is computed in a worker thread
+        self.watchLimit = 4000 # Maximum number of expanded folders watched for changes, the least recently expanded are dropped first
+        self.watchDebounce = 300 # Time in milliseconds without change on the disk before the nodes are updated
+        self.watchMaxWait = 1000 # Maximum time in milliseconds before the nodes are updated, for the folders always changing
+        self.watchPollInterval = 5000 # Time in milliseconds between two checks of the folders that can't be watched by the OS
+        self.pollingPaths = [] # The folders under these paths, like network mounts, are polled instead of watched by the OS
+        self.preindex = False # Read the tree of a new seed in background, so the expansions, the search and the sizes are served from memory
+        self.preindexDepth = 8 # Depth of the deepest folders read under a seed when it's pre-indexed
+        self.preindexBudget = 50000 # Maximum number of folders read under a seed when it's pre-indexed
+        self.preindexProcesses = 0 # Number of processes reading the folders to pre-index, 0 for one per CPU
+        self.projectBackups = 3 # Number of previous versions of a project kept next to it, as .bak1, .bak2...
+        self.autosaveInterval = 300 # Time in seconds between two automatic saves of the modified project, 0 to disable
+        self.saveDelay = 1000 # Time in milliseconds a save waits for another one before the file is written
         self.load()
 
     def load(self):
         """
-        Load the settings.json file if it exists. If not create it.
+        Load the settings.json file if it exists, it's created by save().
+        Nothing is written at startup.
         """
         if not os.path.exists(self.path):
-            json.dump(dict(), open(self.path, "w"))
-        
-        data = json.load(open(self.path, 'r'))
+            return
+
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except ValueError:
+            print("WARNING: Unable to read the settings {0}, the default ones are used".format(self.path))
+            return
         for k, v in data.items():
             setattr(self, k, v)
 
-    def save(self):
-        data = {}
-        for var in vars(self):
-            if var in ["path"]:
-                continue
-            data[var] = getattr(self, var)
+    def snapshot(self):
+        '''
+            Return a copy of the values to save, that can be written by write() in another thread.
+        '''
+        return json.loads(json.dumps(dict((var, value) for var, value in vars(self).items() if var not in ["path"])))
 
-        json.dump(data, open(self.path, "w"), indent=4)
+    def write(self, data):
+        '''
+            Write the values returned by snapshot() in the settings file.
+        '''
+        atomicWrite(self.path, json.dumps(data, indent=4))
+
+    def save(self):
+        self.write(self.snapshot())
 
     def addRecentProject(self, file):
         if file in self.recentProjects:
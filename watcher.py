@@ -0,0 +1,205 @@
+from Qt import QtCore
+from collections import OrderedDict
+import os
+import time
+
+clock = getattr(time, "perf_counter", time.time)
+
+NATIVE = "native" # Watched by the OS (inotify, ReadDirectoryChangesW, kqueue) through QFileSystemWatcher
+POLLING = "polling" # Compared to its last known state at regular intervals
+
+
+class Watcher(QtCore.QObject):
+    """
+    Watch the content of folders and report their changes.
+
+    A folder is watched by the OS when possible, and polled otherwise: when
+    the OS refuses the watch, or when it's under one of the pollingPaths,
+    like a network mount where the OS events are not reliable.
+
+    The events are debounced: the folders changed during a burst are sent
+    once, together, by the changed signal, when nothing happened for
+    debounce milliseconds, or at the latest maxWait milliseconds after the
+    first change of the burst. The number of watched folders is capped, the
+    least recently watched ones are dropped first.
+
+    The folders given to watchLater() are registered by slices in the event
+    loop, so expanding or loading many nodes doesn't stat them all at once.
+    """
+    changed = QtCore.Signal(object)
+
+    def __init__(self, parent=None, maxWatches=4000, debounce=300, pollInterval=5000, pollingPaths=None, maxWait=1000, budget=0.005):
+        """
+        Args:
+            parent (QObject, optional): Parent of the watcher. Defaults to None.
+            maxWatches (int, optional): Maximum number of watched folders. Defaults to 4000.
+            debounce (int, optional): Time in milliseconds without event before changed is sent. Defaults to 300.
+            pollInterval (int, optional): Time in milliseconds between two checks of the polled folders. Defaults to 5000.
+            pollingPaths (list, optional): The folders under these paths are always polled. Defaults to None.
+            maxWait (int, optional): Maximum time in milliseconds a change waits before changed is sent. Defaults to 1000.
+            budget (float, optional): Time in seconds spent per tick to register the folders given to watchLater(). Defaults to 0.005.
+        """
+        super(Watcher, self).__init__(parent)
+        self.maxWatches = maxWatches
+        self.debounce = debounce
+        self.maxWait = maxWait
+        self.budget = budget
+        self.pollingPaths = [os.path.normcase(os.path.abspath(path)) for path in pollingPaths or []]
+        self.evictions = 0
+        self._watches = OrderedDict() # path -> NATIVE or POLLING, the least recently watched first
+        self._signatures = {} # Polled path -> (mtime, inode) at the last check
+        self._pending = OrderedDict() # Changed paths not sent yet, used as an ordered set
+        self._pendingSince = None # Time of the first change not sent yet
+        self._queued = OrderedDict() # Paths given to watchLater() not registered yet, used as an ordered set
+
+        self._native = QtCore.QFileSystemWatcher(self)
+        self._native.directoryChanged.connect(self._onChanged)
+
+        self._debounceTimer = QtCore.QTimer(self)
+        self._debounceTimer.setSingleShot(True)
+        self._debounceTimer.timeout.connect(self.flush)
+
+        self._queueTimer = QtCore.QTimer(self)
+        self._queueTimer.setInterval(0)
+        self._queueTimer.timeout.connect(self._watchQueued)
+
+        self._pollTimer = QtCore.QTimer(self)
+        self._pollTimer.setInterval(pollInterval)
+        self._pollTimer.timeout.connect(self.poll)
+
+    def watch(self, path):
+        """Start to watch a folder, or mark it as recently used if it's already watched.
+
+        Returns:
+            str: NATIVE or POLLING, None if the folder can't be watched
+        """
+        mode = self._watches.pop(path, None)
+        if mode is not None:
+            self._watches[path] = mode
+            return mode
+
+        if not os.path.isdir(path):
+            return None
+        while len(self._watches) >= self.maxWatches:
+            self._evict()
+
+        mode = NATIVE
+        if self._isPolled(path) or not self._native.addPath(path):
+            mode = POLLING
+            try:
+                self._signatures[path] = self._signature(path)
+            except OSError:
+                return None
+            if not self._pollTimer.isActive():
+                self._pollTimer.start()
+        self._watches[path] = mode
+        return mode
+
+    def watchLater(self, path):
+        """Watch a folder from the event loop, the folders are registered by slices of budget seconds.
+        """
+        if path in self._watches:
+            self.watch(path)
+            return
+        self._queued[path] = None
+        if not self._queueTimer.isActive():
+            self._queueTimer.start()
+
+    def unwatch(self, path):
+        self._queued.pop(path, None)
+        mode = self._watches.pop(path, None)
+        self._pending.pop(path, None)
+        if mode == NATIVE:
+            self._native.removePath(path)
+        elif mode == POLLING:
+            del self._signatures[path]
+            if not self._signatures:
+                self._pollTimer.stop()
+
+    def clear(self):
+        for path in list(self._watches):
+            self.unwatch(path)
+        self._queued = OrderedDict()
+        self._queueTimer.stop()
+        self._debounceTimer.stop()
+        self._pendingSince = None
+
+    def isWatched(self, path):
+        return path in self._watches
+
+    def isQueued(self, path):
+        return path in self._queued
+
+    def mode(self, path):
+        return self._watches.get(path)
+
+    def count(self):
+        return len(self._watches)
+
+    def poll(self):
+        """Check now if the polled folders changed.
+        """
+        for path, signature in list(self._signatures.items()):
+            try:
+                current = self._signature(path)
+            except OSError:
+                current = None
+            if current != signature:
+                self._signatures[path] = current
+                self._onChanged(path)
+
+    def flush(self):
+        """Send now the changes received since the last flush.
+        """
+        self._debounceTimer.stop()
+        self._pendingSince = None
+        if not self._pending:
+            return
+        paths = list(self._pending)
+        self._pending = OrderedDict()
+        for path in paths:
+            # A deleted folder can't be watched anymore
+            if not os.path.isdir(path):
+                self.unwatch(path)
+        self.changed.emit(paths)
+
+    def _onChanged(self, path):
+        if path not in self._watches:
+            return
+        self._pending[path] = None
+        now = clock()
+        if self._pendingSince is None:
+            self._pendingSince = now
+        # Restart the timer, the changes are sent once the burst is over, or
+        # once the first change has waited maxWait for a folder always written to
+        remaining = self.maxWait - (now - self._pendingSince)*1000
+        if remaining <= 0:
+            self.flush()
+            return
+        self._debounceTimer.start(int(min(self.debounce, remaining)))
+
+    def _watchQueued(self):
+        end = clock() + self.budget
+        while self._queued:
+            path = next(iter(self._queued))
+            del self._queued[path]
+            self.watch(path)
+            if clock() > end:
+                return
+        self._queueTimer.stop()
+
+    def _evict(self):
+        path = next(iter(self._watches))
+        self.unwatch(path)
+        self.evictions += 1
+
+    def _isPolled(self, path):
+        path = os.path.normcase(os.path.abspath(path))
+        for root in self.pollingPaths:
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return True
+        return False
+
+    def _signature(self, path):
+        stat = os.stat(path)
+        return stat.st_mtime, stat.st_ino